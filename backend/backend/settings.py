@@ -1,11 +1,18 @@
+import atexit
+import json
 import logging
 import os
 import sys
-from logging.handlers import RotatingFileHandler
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from queue import SimpleQueue
+from threading import Lock, local
 
 from django.core.management.utils import get_random_secret_key
-from import_export.formats.base_formats import XLSX
 from pydantic_settings import BaseSettings
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -15,15 +22,33 @@ class Settings(BaseSettings):
     secret_key: str = get_random_secret_key()
     debug: bool = False
     sqlite: bool = False
+    sqlite_wal: bool = True
     allowed_hosts: str = '127.0.0.1, localhost'
     telegram_token: str
     vk_token: str
     vk_group_id: int
+    telegram_api_url: str = ''
+    vk_api_url: str = ''
     database_name: str = 'db'
     postgres_user: str = 'user'
     postgres_password: str = 'password'
     db_host: str = 'localhost'
     db_port: int = 5432
+    replica: str = ''
+    replica_port: int = 0
+    replica_max_lag: float = 10
+    replica_stickiness: float = 5
+    write_behind: bool = False
+    auto_answer: bool = False
+    rate_limit: float = 1
+    rate_limit_burst: int = 10
+    role_rate_limits: dict[int, tuple[float, int] | None] = {}
+    record_traffic: bool = False
+    trace_sample_rate: float = 0
+    trace_slow_threshold: float = 0
+    log_level: str = 'WARNING'
+    health_port: int = 0
+    journal_dir: str = 'journal'
 
     class Config:
         env_file = BASE_DIR.parent / '.env'
@@ -46,7 +71,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'django_object_actions',
-    'import_export',
 
     'core.apps.CoreConfig',
 ]
@@ -84,7 +108,10 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 if settings.sqlite:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': (
+                'core.sqlite'
+                if settings.sqlite_wal else 'django.db.backends.sqlite3'
+            ),
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
@@ -100,6 +127,26 @@ else:
         }
     }
 
+REPLICA_DATABASE = 'replica'
+
+if settings.replica:
+    DATABASES[REPLICA_DATABASE] = DATABASES['default'] | (
+        dict(NAME=BASE_DIR / settings.replica)
+        if settings.sqlite else
+        dict(
+            HOST=settings.replica,
+            PORT=settings.replica_port or settings.db_port,
+        )
+    ) | dict(TEST=dict(MIRROR='default'))
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,29 +177,143 @@ FILES_ROOT = BASE_DIR / FILES_URL
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-EXPORT_FORMATS = [XLSX]
-
 AUTH_USER_MODEL = 'core.AdminUser'
 
 LOG_DIR = 'logs/'
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILENAME = f'{LOG_DIR}{{platform}}.log'
-LOG_FORMAT = '%(asctime)s [%(levelname)s] %(funcName)s:%(lineno)d %(message)s'
 LOG_FILE_SIZE = 1024 * 1024
 LOG_FILE_COUNT = 5
+LOG_REPEAT_INTERVAL = 60
+LOG_REPEAT_KEYS = 1000
 
+JOURNAL_DIR = settings.journal_dir
+os.makedirs(JOURNAL_DIR, exist_ok=True)
+JOURNAL_FILENAME = os.path.join(JOURNAL_DIR, '{platform}.jsonl')
+OUTBOX_FILENAME = os.path.join(JOURNAL_DIR, '{platform}_outbox.jsonl')
 
-def get_logger(platform):
-    logging.basicConfig(
-        level=logging.ERROR,
-        format=LOG_FORMAT,
-        handlers=[
-            RotatingFileHandler(
-                filename=LOG_FILENAME.format(platform=platform),
-                maxBytes=LOG_FILE_SIZE,
-                backupCount=LOG_FILE_COUNT,
+TRACE_DIR = 'traces/'
+os.makedirs(TRACE_DIR, exist_ok=True)
+TRACE_FILENAME = f'{TRACE_DIR}{{platform}}.jsonl'
+
+TRAFFIC_DIR = 'traffic/'
+os.makedirs(TRAFFIC_DIR, exist_ok=True)
+TRAFFIC_FILENAME = (
+    f'{TRAFFIC_DIR}{{platform}}_{{date:%Y-%m-%d_%H-%M-%S}}.jsonl.gz'
+)
+
+
+log_context_data = local()
+
+
+@contextmanager
+def log_context(**fields):
+    """Adds `fields` to every record logged by this thread inside the block."""
+    previous = getattr(log_context_data, 'fields', {})
+    log_context_data.fields = previous | fields
+    try:
+        yield
+    finally:
+        log_context_data.fields = previous
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.context = getattr(log_context_data, 'fields', {})
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """Drops records repeating a recent one of the same logger and level.
+
+    The first record of a kind is passed, identical ones are counted for
+    `LOG_REPEAT_INTERVAL` seconds, and the next record after that carries
+    the number of dropped repeats.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = Lock()
+        self.recent = OrderedDict()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.getMessage())
+        current = time.monotonic()
+        with self.lock:
+            started, repeated = self.recent.pop(key, (None, 0))
+            if started is not None and current - started < LOG_REPEAT_INTERVAL:
+                self.recent[key] = (started, repeated + 1)
+                return False
+            self.recent[key] = (current, 0)
+            if len(self.recent) > LOG_REPEAT_KEYS:
+                self.recent.popitem(last=False)
+        if repeated:
+            record.repeated = repeated
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = dict(
+            time=datetime.fromtimestamp(record.created).isoformat(
+                timespec='milliseconds',
             ),
-            logging.StreamHandler(sys.stdout),
-        ],
-    )
-    return logging.getLogger(platform)
+            level=record.levelname,
+            logger=record.name,
+            thread=record.threadName,
+            function=record.funcName,
+            line=record.lineno,
+            message=record.getMessage(),
+        )
+        data.update(getattr(record, 'context', {}))
+        if getattr(record, 'repeated', None):
+            data['repeated'] = record.repeated
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LogQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Records stay in this process, the listener formats them.
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+def get_logger(platform):
+    """Returns a logger that hands records to a background writer thread.
+
+    Records are filtered and enqueued by the calling thread, the listener
+    formats them as JSON lines and writes them to the platform log file and
+    stdout. Loggers not set up here, like the ones of libraries, log to the
+    file of the first platform logger of the process.
+    """
+    logger = logging.getLogger(platform)
+    if logger.handlers:
+        return logger
+    formatter = JsonFormatter()
+    handlers = [
+        RotatingFileHandler(
+            filename=LOG_FILENAME.format(platform=platform),
+            maxBytes=LOG_FILE_SIZE,
+            backupCount=LOG_FILE_COUNT,
+        ),
+        logging.StreamHandler(sys.stdout),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    queue = SimpleQueue()
+    listener = QueueListener(queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    handler = LogQueueHandler(queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RepeatFilter())
+    logger.addHandler(handler)
+    logger.setLevel(settings.log_level)
+    logger.propagate = False
+    root = logging.getLogger()
+    if not root.handlers:
+        root.addHandler(handler)
+        root.setLevel(settings.log_level)
+    return logger
@@ -1,25 +1,34 @@
+from copy import copy
+from datetime import datetime
 from itertools import zip_longest
 
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.models import Group
-from django.db.models import BigIntegerField
+from django.core.cache import cache
+from django.db.models import BigIntegerField, DateTimeField, Value
+from django.db.models.functions import Coalesce
 from django.forms import TextInput
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, QueryDict
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 from django_object_actions import DjangoObjectActions, action
-from import_export.admin import ExportActionModelAdmin
 from prettytable import PrettyTable
 
-from core.constants import BUTTONS_PER_ROW
+from core.constants import (
+    BUTTONS_PER_ROW, MENU_PREVIEW_CACHE_KEY, MENU_PREVIEW_CACHE_TIMEOUT,
+    PLATFORMS_VERBOSE,
+)
+from core.core import publish_answer, search_questions
+from core.exports import export_csv, export_xlsx
 from core.localization import AdminPanel, MAIN_MENU, VerboseNames
 from core.models import (
-    AskAdminButton, InfoButton, MenuButton, MenuUpdate, Question,
-    ReminderButton, Role, SubButton, User,
+    AskAdminButton, DailyStats, InfoButton, MenuButton, MenuUpdate, Question,
+    Reminder, ReminderButton, Role, SubButton, User,
 )
+from core.segments import Segment, segment_index
 
 admin.site.unregister(Group)
 
@@ -63,6 +72,7 @@ class MenuInline(admin.TabularInline):
 class InfoInline(admin.StackedInline):
     model = InfoButton
     ordering = ('order',)
+    readonly_fields = ('file_name', 'file_size', 'checksum')
     extra = 0
 
 
@@ -92,9 +102,37 @@ class ModelAdminWithButton(admin.ModelAdmin):
         )
 
 
+class ModelAdminWithExport(admin.ModelAdmin):
+    export_fields = ()
+
+    def get_export_queryset(self, request):
+        changelist_request = copy(request)
+        changelist_request.GET = QueryDict(
+            request.GET.get('_changelist_filters', '')
+        )
+        return self.get_changelist_instance(changelist_request).queryset
+
+    @action(label=AdminPanel.EXPORT_CSV)
+    def export_csv(self, request, queryset):
+        return export_csv(
+            self.get_export_queryset(request),
+            self.export_fields,
+            self.model._meta.model_name,
+        )
+
+    @action(label=AdminPanel.EXPORT_XLSX)
+    def export_xlsx(self, request, queryset):
+        return export_xlsx(
+            self.get_export_queryset(request),
+            self.export_fields,
+            self.model._meta.model_name,
+        )
+
+
 @admin.register(Role)
 class RoleAdmin(DjangoObjectActions, ModelAdminWithButton):
     list_display = ('name', 'get_menu')
+    list_select_related = ('menu',)
     exclude = ('menu',)
     changelist_actions = ('update_menus',)
 
@@ -108,14 +146,56 @@ class RoleAdmin(DjangoObjectActions, ModelAdminWithButton):
         return super().save_model(request, role, form, change)
 
 
+def get_filter_date(filters, name):
+    value = filters.get(name)
+    return datetime.fromisoformat(value) if value else None
+
+
+def get_filter_flag(filters, name):
+    value = filters.get(name)
+    return value == '1' if value else None
+
+
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(DjangoObjectActions, admin.ModelAdmin):
     list_display = (
         'platform', 'platform_id', 'role', 'is_subscribed', 'is_blocked',
     )
+    list_select_related = ('role',)
     list_editable = ('is_blocked',)
     list_display_links = None
-    list_filter = ('platform', 'role', 'is_subscribed', 'is_blocked')
+    list_filter = (
+        'platform', 'role', 'is_subscribed', 'is_blocked', 'date_subscribed',
+    )
+    changelist_actions = ('preview_audience',)
+
+    @action(label=AdminPanel.PREVIEW_AUDIENCE)
+    def preview_audience(self, request, queryset):
+        filters = QueryDict(request.GET.get('_changelist_filters', ''))
+        role_id = filters.get('role__id__exact')
+        segment = Segment(
+            platform=filters.get('platform__exact'),
+            role_id=int(role_id) if role_id else None,
+            is_subscribed=get_filter_flag(filters, 'is_subscribed__exact'),
+            is_blocked=get_filter_flag(filters, 'is_blocked__exact'),
+            subscribed_from=get_filter_date(filters, 'date_subscribed__gte'),
+            subscribed_to=get_filter_date(filters, 'date_subscribed__lt'),
+        )
+        if 'date_subscribed__isnull' in filters:
+            segment &= Segment(
+                is_subscribed=filters['date_subscribed__isnull'] == 'False',
+            )
+        counts = segment_index.count(segment)
+        self.message_user(request, AdminPanel.AUDIENCE.format(
+            total=sum(counts.values()),
+            platforms=', '.join(
+                f'{PLATFORMS_VERBOSE[platform]}: {count}'
+                for platform, count in counts.items()
+            ),
+        ))
+        return HttpResponseRedirect('{}?{}'.format(
+            reverse('admin:core_user_changelist'), filters.urlencode(),
+        ))
 
     def save_model(self, request, user, form, change):
         if user.is_blocked:
@@ -135,11 +215,20 @@ class SubscriberStats(User):
 
 
 @admin.register(SubscriberStats)
-class SubscriberStatsAdmin(ExportActionModelAdmin):
+class SubscriberStatsAdmin(DjangoObjectActions, ModelAdminWithExport):
     date_hierarchy = 'date_subscribed'
     list_display = ('id', 'platform', 'platform_id', 'role', 'date_subscribed')
+    list_select_related = ('role',)
     list_filter = ('platform', 'role')
     readonly_fields = list_display
+    changelist_actions = ('export_csv', 'export_xlsx')
+    export_fields = (
+        ('id', 'ID'),
+        ('platform', VerboseNames.User.PLATFORM),
+        ('platform_id', VerboseNames.User.PLATFORM_ID),
+        ('role__name', VerboseNames.User.ROLE),
+        ('date_subscribed', VerboseNames.User.DATE_SUBSCRIBED),
+    )
 
     def get_queryset(self, request):
         return (
@@ -178,6 +267,17 @@ class MenuAdmin(DjangoObjectActions, ModelAdminWithButton):
     save_on_top = True
     changelist_actions = ('update_menus',)
 
+    def get_queryset(self, request):
+        return (
+            super(MenuAdmin, self)
+            .get_queryset(request)
+            .select_related('parent')
+            .prefetch_related(
+                'menubuttons', 'infobuttons', 'subbuttons', 'reminderbuttons',
+                'askadminbuttons',
+            )
+        )
+
     @admin.display(description=AdminPanel.PARENT_LINKS)
     def get_parent_links(self, menu: MenuButton):
         if menu.parent is None:
@@ -186,10 +286,15 @@ class MenuAdmin(DjangoObjectActions, ModelAdminWithButton):
 
     @admin.display(description=AdminPanel.MENU_PREVIEW)
     def get_buttons(self, menu: MenuButton):
-        return menu_preview(
-            buttons=[button.name for button in menu.get_children()],
-            submenu=False if menu.parent is None else True,
-        )
+        key = MENU_PREVIEW_CACHE_KEY.format(menu_id=menu.id)
+        preview = cache.get(key)
+        if preview is None:
+            preview = menu_preview(
+                buttons=[button.name for button in menu.get_children()],
+                submenu=False if menu.parent_id is None else True,
+            )
+            cache.set(key, preview, MENU_PREVIEW_CACHE_TIMEOUT)
+        return mark_safe(preview)
 
     def get_inlines(self, request, menu):
         inlines = [MenuInline, InfoInline]
@@ -215,12 +320,26 @@ class MenuUpdateAdmin(DjangoObjectActions, ModelAdminWithButton):
         return False
 
 
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = (
+        'text', 'time', 'user', 'role', 'is_active', 'telegram', 'vk',
+    )
+    list_select_related = ('user', 'role')
+    list_editable = ('is_active',)
+    list_filter = ('is_active', 'role', 'user__platform')
+    raw_id_fields = ('user',)
+    readonly_fields = ('telegram', 'vk')
+
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'question', 'answer', 'created')
+    list_select_related = ('user',)
     list_editable = ('answer',)
     readonly_fields = (
         'id', 'user', 'question', 'created', 'answered', 'answer_sent',
+        'claimed_by', 'claimed_at',
     )
     list_display_links = None
 
@@ -232,8 +351,11 @@ class QuestionAdmin(admin.ModelAdmin):
         )
 
     def save_model(self, request, question, form, change):
-        question.answered = now()
+        question.answered = Coalesce(
+            'answered', Value(now(), output_field=DateTimeField()),
+        )
         super().save_model(request, question, form, change)
+        publish_answer(question)
 
     def has_add_permission(self, request):
         return False
@@ -242,6 +364,11 @@ class QuestionAdmin(admin.ModelAdmin):
         return False
 
 
+class QuestionSearchMixin:
+    def get_search_results(self, request, queryset, search_term):
+        return search_questions(search_term, queryset), False
+
+
 class ClosedQuestion(Question):
 
     class Meta:
@@ -252,14 +379,18 @@ class ClosedQuestion(Question):
 
 
 @admin.register(ClosedQuestion)
-class ClosedQuestionAdmin(admin.ModelAdmin):
+class ClosedQuestionAdmin(QuestionSearchMixin, admin.ModelAdmin):
     list_display = (
         'id', 'user', 'get_user_role', 'question', 'answer', 'created',
         'answered',
     )
-    list_filter = ('user__platform', 'user__role')
+    list_select_related = ('user__role',)
+    list_filter = (
+        'user__platform', 'user__role', 'is_auto_answered', 'answer_failed',
+    )
     readonly_fields = (
         'id', 'user', 'question', 'answer', 'created', 'answered',
+        'is_auto_answered', 'answer_failed',
     )
     search_fields = ('question', 'answer')
 
@@ -293,12 +424,26 @@ class QuestionStats(Question):
 
 
 @admin.register(QuestionStats)
-class QuestionStatsAdmin(ExportActionModelAdmin):
+class QuestionStatsAdmin(
+    DjangoObjectActions, QuestionSearchMixin, ModelAdminWithExport,
+):
     date_hierarchy = 'created'
     list_display = ('id', 'user', 'question', 'answer', 'created', 'answered')
+    list_select_related = ('user',)
     list_filter = ('user__platform', 'user__role')
     readonly_fields = list_display
     search_fields = ('question', 'answer')
+    changelist_actions = ('export_csv', 'export_xlsx')
+    export_fields = (
+        ('id', 'ID'),
+        ('user__platform', VerboseNames.User.PLATFORM),
+        ('user__platform_id', VerboseNames.User.PLATFORM_ID),
+        ('user__role__name', VerboseNames.User.ROLE),
+        ('question', VerboseNames.Question.QUESTION),
+        ('answer', VerboseNames.Question.ANSWER),
+        ('created', VerboseNames.Question.CREATED),
+        ('answered', VerboseNames.Question.CLOSED),
+    )
 
     def get_actions(self, request):
         return None
@@ -311,3 +456,25 @@ class QuestionStatsAdmin(ExportActionModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         return False
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    date_hierarchy = 'date'
+    list_display = (
+        'date', 'platform', 'role', 'questions_asked', 'questions_answered',
+        'median_answer_time', 'p90_answer_time', 'new_subscribers',
+        'unsubscribes',
+    )
+    list_select_related = ('role',)
+    list_filter = ('platform', 'role')
+    list_display_links = None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
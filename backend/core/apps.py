@@ -6,3 +6,6 @@ from core.localization import APP_NAME
 class CoreConfig(AppConfig):
     name = 'core'
     verbose_name = APP_NAME
+
+    def ready(self):
+        from core import signals  # noqa: F401
@@ -0,0 +1,156 @@
+import re
+import time
+from threading import Lock, Thread
+
+import numpy as np
+from django.db import connection
+from scipy.sparse import csr_matrix, vstack
+
+from backend.settings import get_logger
+from core.constants import (
+    AUTO_ANSWER_NGRAM, AUTO_ANSWER_REBUILD_GROWTH, AUTO_ANSWER_THRESHOLD,
+    Errors, PLATFORMS_VERBOSE, Pooling,
+)
+from core.models import Question
+
+NOT_WORD = re.compile(r'\W+')
+
+
+def get_ngrams(text):
+    ngrams = {}
+    for word in NOT_WORD.sub(' ', text.lower().replace('ё', 'е')).split():
+        word = f' {word} '
+        for start in range(max(len(word) - AUTO_ANSWER_NGRAM, 0) + 1):
+            ngram = word[start:start + AUTO_ANSWER_NGRAM]
+            ngrams[ngram] = ngrams.get(ngram, 0) + 1
+    return ngrams
+
+
+def get_idf(documents, document_frequency):
+    return np.log((1 + documents) / (1 + document_frequency)) + 1
+
+
+def vectorize(documents, vocabulary, idf):
+    rows, columns, values = [], [], []
+    for row, ngrams in enumerate(documents):
+        for ngram, count in ngrams.items():
+            column = vocabulary.get(ngram)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+                values.append((1 + np.log(count)) * idf[column])
+    vectors = csr_matrix(
+        (values, (rows, columns)), shape=(len(documents), len(vocabulary)),
+    )
+    norms = np.sqrt(vectors.multiply(vectors).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return csr_matrix(vectors.multiply(1 / norms[:, None]))
+
+
+class AnswerIndex:
+    """Character n-gram TF-IDF index of answered questions.
+
+    Rows are weighted with the IDF known when they were added: new answers
+    are appended every `Pooling.AUTO_ANSWER` seconds and the whole index is
+    rebuilt once the archive grows by `AUTO_ANSWER_REBUILD_GROWTH`.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.thread = None
+        self.logger = None
+        self.last_answered = None
+        self.built = 0
+        self.questions = []
+        self.answers = []
+        self.vocabulary = {}
+        self.document_frequency = np.zeros(0)
+        self.idf = np.zeros(0)
+        self.matrix = csr_matrix((0, 0))
+        self.index = csr_matrix((0, 0))
+
+    def start(self, platform):
+        if self.thread is None:
+            self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.update()
+            except Exception as error:
+                self.logger.error(Errors.AUTO_ANSWER.format(
+                    error_type=type(error).__name__,
+                    error=error,
+                ))
+                connection.close()
+            time.sleep(Pooling.AUTO_ANSWER)
+
+    def update(self):
+        questions = Question.objects.filter(
+            answered__isnull=False, is_auto_answered=False,
+        ).exclude(answer='').order_by('answered')
+        if self.last_answered is not None:
+            questions = questions.filter(answered__gt=self.last_answered)
+        rows = list(questions.values_list('question', 'answer', 'answered'))
+        if not rows:
+            return
+        documents = [get_ngrams(question) for question, _, _ in rows]
+        questions = self.questions + [question for question, _, _ in rows]
+        vocabulary = dict(self.vocabulary)
+        for ngrams in documents:
+            for ngram in ngrams:
+                vocabulary.setdefault(ngram, len(vocabulary))
+        document_frequency = np.zeros(len(vocabulary))
+        document_frequency[:len(self.document_frequency)] = (
+            self.document_frequency
+        )
+        for ngrams in documents:
+            for ngram in ngrams:
+                document_frequency[vocabulary[ngram]] += 1
+        idf = get_idf(len(questions), document_frequency)
+        built = self.built
+        if len(questions) > built * (1 + AUTO_ANSWER_REBUILD_GROWTH):
+            built = len(questions)
+            matrix = vectorize(
+                [get_ngrams(question) for question in questions],
+                vocabulary,
+                idf,
+            )
+        else:
+            matrix = self.matrix.copy()
+            matrix.resize((matrix.shape[0], len(vocabulary)))
+            matrix = vstack(
+                (matrix, vectorize(documents, vocabulary, idf)),
+                format='csr',
+            )
+        index = matrix.T.tocsr()
+        with self.lock:
+            self.last_answered = rows[-1][2]
+            self.built = built
+            self.questions = questions
+            self.answers = self.answers + [answer for _, answer, _ in rows]
+            self.vocabulary = vocabulary
+            self.document_frequency = document_frequency
+            self.idf = idf
+            self.matrix = matrix
+            self.index = index
+
+    def find(self, text):
+        with self.lock:
+            answers, vocabulary, idf, index = (
+                self.answers, self.vocabulary, self.idf, self.index,
+            )
+        if not answers:
+            return None
+        scores = (
+            vectorize([get_ngrams(text)], vocabulary, idf) @ index
+        ).toarray().ravel()
+        best = int(scores.argmax())
+        if scores[best] < AUTO_ANSWER_THRESHOLD:
+            return None
+        return answers[best]
+
+
+answer_index = AnswerIndex()
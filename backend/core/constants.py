@@ -13,10 +13,22 @@ class ButtonTypes:
     REMINDER = 'ReminderButton'
 
 
+class Events:
+    ANSWER = 'answer'
+    REMINDERS = 'reminders'
+    QUESTION = 'question'
+
+
 class Pooling:
     MENU_UPDATE = 15 * 60
     USER_ROLES = 5 * 60
-    ANSWERS = 5 * 60
+    EVENTS = 3
+    EVENTS_FALLBACK = 5 * 60
+    WRITE_BEHIND = 5
+    AUTO_ANSWER = 60
+    HEALTH = 5
+    REMINDERS = 60
+    REPLICA_LAG = 5
 
 
 PLATFORMS = (
@@ -35,18 +47,107 @@ MENU_UPDATES = {
     Platforms.TELEGRAM: 'telegram',
     Platforms.VK: 'vk',
 }
+MENU_PREVIEW_CACHE_KEY = 'menu_preview_{menu_id}'
+MENU_PREVIEW_CACHE_TIMEOUT = 24 * 60 * 60
+EXPORT_CHUNK_SIZE = 2000
+SEARCH_CONFIG = 'russian'
+SEARCH_DOCUMENT = "coalesce(question, '') || ' ' || coalesce(answer, '')"
+STATS_LAG = 60
+QUESTION_BURST_WINDOW = 2 * 60
+QUESTION_DUPLICATE_WINDOW = 60 * 60
+QUESTION_DELIMITER = '\n\n'
+ADMIN_BATCH_SIZE = 5
+ADMIN_BATCH_QUESTION_LENGTH = 600
+ADMIN_BATCH_CLAIM = '{platform}:{admin_id}'
+ADMIN_BATCH_CLAIM_TIMEOUT = 30 * 60
+ADMIN_NOTIFICATION_INTERVAL = 60
+SEGMENTS_REBUILD_INTERVAL = 60 * 60
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30 * 1000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+WRITER_BATCH = 100
+AUTO_ANSWER_NGRAM = 3
+AUTO_ANSWER_THRESHOLD = 0.8
+AUTO_ANSWER_REBUILD_GROWTH = 0.1
 BUTTON_MAX_LENGTH = 22
 BUTTONS_PER_ROW = 2
-SEND_MESSAGE_INTERVAL = 1
+MESSAGES_PER_SECOND = {
+    Platforms.TELEGRAM: 30,
+    Platforms.VK: 20,
+}
+DELIVERY_WORKERS = 4
+OUTBOX_BACKOFF = 1
+OUTBOX_MAX_BACKOFF = 5 * 60
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_SENT_KEYS = 10000
+OUTBOX_COMPACT_RECORDS = 10000
+THROTTLE_BUCKETS = 100000
+FILE_MAX_SIZE = 50 * 1024 * 1024
+FILE_CHUNK_SIZE = 64 * 1024
+FILE_PREPROCESSING_WORKERS = 2
+FILE_CLEANUP_MIN_AGE = 60 * 60
+VK_UPLOAD_WORKERS = 4
+TRAFFIC_FLUSH_RECORDS = 100
+PERCENTILES = (50, 90, 99)
+TEST_USER_IDS = 10 ** 12
+REPLAY_USER_ID_OFFSET = TEST_USER_IDS
+BENCHMARK_USER_ID_OFFSET = 2 * TEST_USER_IDS
+REPLAY_DRAIN_TIMEOUT = 60
+LOAD_TEST_USER_ID_OFFSET = 3 * TEST_USER_IDS
+LOAD_TEST_USER_TIMEOUT = 30
+LOAD_TEST_POLL_INTERVAL = 0.5
+TRACE_SERVICE_NAME = 'speech-therapy-bots'
+TRACE_STATEMENT_LENGTH = 1000
+TELEGRAM_WORKERS = 4
+HEALTH_PORT_OFFSETS = {
+    Platforms.TELEGRAM: 0,
+    Platforms.VK: 1,
+}
+HEALTH_POLL_TIMEOUT = 45
+HEALTH_MAX_OUTBOX = 1000
+HEALTH_MAX_JOB_LATENESS = 60
+SCHEDULER_WORKERS = 2
+SCHEDULER_JITTER = 5
+SCHEDULER_MISFIRE_GRACE = 60
+REMINDERS_SENT = {
+    Platforms.TELEGRAM: 'telegram',
+    Platforms.VK: 'vk',
+}
+REMINDER_DEFAULT_HOUR = 10
+REMINDER_BATCH = 500
+REMINDER_CATCH_UP = 6 * 60 * 60
 
 
 class Errors:
     ALREADY_SUBSCRIBED = 'User {platform}#{platform_id} is already subscribed'
     NOT_SUBSCRIBED = 'User {platform}#{platform_id} is not subscribed'
     ALREADY_BLOCKED = 'User {platform}#{platform_id} is already blocked'
+    USER_NOT_FOUND = 'User {platform}#{platform_id} does not exist'
+    ROLE_NOT_FOUND = 'Role {role_id} does not exist'
     CANNOT_UPLOAD_FILE = 'Cannot upload file {file}: {error}'
     MENU_NO_BUTTONS = 'Menu for role {role} has no buttons'
     SUBSCRIBE = 'Unexpected error while subscribing: {error}'
     UNSUBSCRIBE = 'Unexpected error while unsubscribing: {error}'
     RUNTIME = 'Unexpected error led to bot crash: {error_type}: {error}'
     TELEGRAM = 'Update {update} caused an error {error}'
+    VK_EVENT = 'Event {event} caused an error {error_type}: {error}'
+    EVENTS = 'Event listener lost database connection: {error}'
+    OUTBOX = 'Cannot send {method} to {chat_id}: {error}'
+    THROTTLED = 'User {platform}#{platform_id} is throttled'
+    REPLICA = 'Replica is not used: {error}'
+    SQLITE_BENCHMARK = 'The benchmark requires SQLITE=True'
+    LOAD_TEST_BOT = 'The bot exited with code {code} after {seconds} seconds'
+    FILE_PREPROCESSING = 'Cannot preprocess file {file}: {error}'
+    WRITE_BEHIND = 'Cannot flush {count} pending user writes: {error}'
+    WRITE_BEHIND_DROPPED = (
+        'Dropped pending writes of user {platform_id}: {error}'
+    )
+    HEALTH = 'No long-poll response for {seconds} seconds'
+    JOB = 'Job {job} failed: {error_type}: {error}'
+    REMINDERS = 'Cannot send {count} reminders: {error}'
+    AUTO_ANSWER = (
+        'Cannot update the auto-answer index: {error_type}: {error}'
+    )
@@ -1,15 +1,215 @@
-from datetime import datetime
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from threading import Lock, RLock, Timer
 
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField, Count, Exists, F, Max, Q, Value,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat
 from django.utils.timezone import now
 
-from core.constants import ADMIN_PLATFORMS, Errors, MENU_UPDATES
-from core.models import MenuButton, MenuUpdate, Question, Role, User
+from backend.settings import settings
+from core import events
+from core.auto_answer import answer_index
+from core.constants import (
+    ADMIN_BATCH_CLAIM, ADMIN_BATCH_CLAIM_TIMEOUT, ADMIN_BATCH_QUESTION_LENGTH,
+    ADMIN_BATCH_SIZE, ADMIN_NOTIFICATION_INTERVAL, ADMIN_PLATFORMS, Errors,
+    Events, MENU_UPDATES, PLATFORMS_VERBOSE, QUESTION_BURST_WINDOW,
+    QUESTION_DELIMITER, QUESTION_DUPLICATE_WINDOW, SEARCH_CONFIG,
+    SEARCH_DOCUMENT,
+)
+from core.health import Health
+from core.localization import ChatMessages
+from core.outbox import Outbox, Priorities
+from core.reminders import ReminderEngine
+from core.routers import mark_write, read_from_replica
+from core.throttle import get_throttle
+from core.tracing import traced, tracer
+from core.traffic import TrafficRecorder
+from core.models import (
+    MenuButton, MenuUpdate, Question, Reminder, Role, Subscription, User,
+)
+from core.write_behind import WriteBehind
+from core.writer import serialized, writer
 
 AdminUser = get_user_model()
 
 BLOCKED_USER_ROLE_ID = -1
 ADMIN_ROLE_ID = 0
+NOT_WORD = re.compile(r'\W+')
+QUESTION_ID = re.compile(
+    re.escape(ChatMessages.QUESTION.split('{question_id}')[0]) + r'(\d+)'
+)
+ANSWER_QUESTION_ID = re.compile(r'\s*#(\d+)\s*')
+INSERT_QUESTION = (
+    f'INSERT INTO {Question._meta.db_table} '
+    '(user_id, question, answer, created, answered, answer_sent, '
+    'is_auto_answered) '
+    f'SELECT id, %s, %s, %s, %s, %s, %s FROM {User._meta.db_table} '
+    'WHERE platform = %s AND platform_id = %s AND NOT is_blocked '
+    'RETURNING id'
+)
+INSERT_USER = (
+    f'INSERT INTO {User._meta.db_table} '
+    '(platform, platform_id, role_id, is_subscribed, is_blocked, updated) '
+    f'SELECT %s, %s, id, %s, %s, %s FROM {Role._meta.db_table} '
+    'WHERE id = %s'
+)
+LOG_SUBSCRIPTION = (
+    f'INSERT INTO {Subscription._meta.db_table} '
+    '(user_id, is_subscribed, date) '
+    f'SELECT id, %s, %s FROM {User._meta.db_table} '
+    'WHERE platform = %s AND platform_id = %s'
+)
+ANSWER_QUESTION = (
+    f'UPDATE {Question._meta.db_table} '
+    'SET answer = %s, answered = COALESCE(answered, %s) '
+    'WHERE id = %s '
+    f'RETURNING (SELECT platform FROM {User._meta.db_table} '
+    f'WHERE {User._meta.db_table}.id = {Question._meta.db_table}.user_id)'
+)
+
+
+class QuestionBuffer:
+    """Remembers the last open question of every user who asked recently.
+
+    Entries are kept in the order of their last update, so expired ones
+    are evicted from the front.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.questions = OrderedDict()
+
+    def expire(self):
+        expired = time.monotonic() - QUESTION_DUPLICATE_WINDOW
+        while self.questions:
+            key, (_, updated, _) = next(iter(self.questions.items()))
+            if updated > expired:
+                return
+            del self.questions[key]
+
+    def get(self, key):
+        with self.lock:
+            self.expire()
+            return self.questions.get(key)
+
+    def set(self, key, question_id, texts):
+        with self.lock:
+            self.questions.pop(key, None)
+            self.questions[key] = (question_id, time.monotonic(), texts)
+
+    def remove(self, key):
+        with self.lock:
+            self.questions.pop(key, None)
+
+
+question_buffer = QuestionBuffer()
+
+
+class QuestionBatches:
+    """Open questions shown to every admin answering them in batches.
+
+    Batches are claimed in the database, so questions shown to one admin
+    are not shown to the others, on any platform, until the claim expires.
+    While an admin answers a batch, the next one is claimed in the
+    background.
+    """
+
+    def __init__(self, platform):
+        self.platform = platform
+        self.lock = Lock()
+        self.batches = {}
+        self.pool = ThreadPoolExecutor(1)
+
+    def get_admin(self, admin_id):
+        return ADMIN_BATCH_CLAIM.format(
+            platform=self.platform, admin_id=admin_id,
+        )
+
+    def next(self, admin_id):
+        admin = self.get_admin(admin_id)
+        with self.lock:
+            skipped, prefetch = self.batches.pop(admin_id, ({}, None))
+        if skipped:
+            release_questions(admin, list(skipped))
+        questions = []
+        if prefetch is not None:
+            questions = prefetch.result()
+            renewed = renew_claims(
+                admin, [question['id'] for question in questions],
+            )
+            questions = [
+                question for question in questions
+                if question['id'] in renewed
+            ]
+        if not questions:
+            questions = claim_open_questions(admin, ADMIN_BATCH_SIZE)
+        questions = {question['id']: question for question in questions}
+        with self.lock:
+            self.batches[admin_id] = (
+                questions,
+                self.pool.submit(
+                    claim_open_questions, admin, ADMIN_BATCH_SIZE,
+                ) if questions else None,
+            )
+        return list(questions.values())
+
+    def answer(self, admin_id, answer, quoted=None):
+        """Answers a question of the admin batch and returns the reply.
+
+        The question is the one whose number starts the answer, the one
+        quoted by the admin or the first unanswered one of the batch. A
+        quote of several questions is ambiguous and answers none of them.
+        """
+        match = ANSWER_QUESTION_ID.match(answer)
+        quoted_ids = set(QUESTION_ID.findall(quoted or ''))
+        if not match and len(quoted_ids) > 1:
+            return ChatMessages.AMBIGUOUS_REPLY
+        with self.lock:
+            questions, _ = self.batches.get(admin_id, ({}, None))
+            if match:
+                question_id = int(match[1])
+                answer = answer[match.end():]
+            elif quoted_ids:
+                question_id = int(quoted_ids.pop())
+            elif questions:
+                question_id = next(iter(questions))
+            else:
+                return ChatMessages.NO_QUESTIONS
+            question = questions.pop(question_id, None)
+            remaining = len(questions)
+        if question is None:
+            return ChatMessages.QUESTION_NOT_IN_BATCH.format(
+                question_id=question_id,
+            )
+        if not answer_open_question(
+            question_id, question['user__platform'], answer,
+        ):
+            return ChatMessages.QUESTION_CLOSED.format(question_id=question_id)
+        return ChatMessages.BATCH_ANSWER_ACCEPTED.format(
+            question_id=question_id, remaining=remaining,
+        )
+
+    def is_done(self, admin_id):
+        with self.lock:
+            return not self.batches.get(admin_id, ({}, None))[0]
+
+    def discard(self, admin_id):
+        with self.lock:
+            questions, prefetch = self.batches.pop(admin_id, ({}, None))
+        held = list(questions)
+        if prefetch is not None:
+            held += [question['id'] for question in prefetch.result()]
+        if held:
+            release_questions(self.get_admin(admin_id), held)
 
 
 class Button:
@@ -18,24 +218,62 @@ class Button:
             setattr(self, key, value)
 
 
+@traced
+@read_from_replica
 def get_roles():
     return {role.id: role.name for role in Role.objects.all()}
 
 
+def get_missing_user(platform, platform_id):
+    return User.DoesNotExist(
+        Errors.USER_NOT_FOUND.format(
+            platform=platform, platform_id=platform_id,
+        )
+    )
+
+
+def get_missing_role(role_id):
+    return Role.DoesNotExist(Errors.ROLE_NOT_FOUND.format(role_id=role_id))
+
+
+def fetch_returning(sql, params):
+    mark_write()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+@traced
+@serialized
 def change_role(platform, platform_id, new_role_id):
-    user = User.objects.get(platform=platform, platform_id=platform_id)
-    user.role = Role.objects.get(pk=new_role_id)
-    user.save()
+    users = User.objects.filter(platform=platform, platform_id=platform_id)
+    if not users.filter(
+        Exists(Role.objects.filter(pk=new_role_id)),
+    ).update(role_id=new_role_id, updated=now()):
+        if not users.exists():
+            raise get_missing_user(platform, platform_id)
+        raise get_missing_role(new_role_id)
 
 
+@traced
+@serialized
 def add_user(platform, platform_id, role_id):
-    User.objects.create(
-        platform=platform,
-        platform_id=platform_id,
-        role=Role.objects.get(pk=role_id),
-    )
+    mark_write()
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_USER, (
+            platform,
+            platform_id,
+            False,
+            False,
+            connection.ops.adapt_datetimefield_value(now()),
+            role_id,
+        ))
+        if not cursor.rowcount:
+            raise get_missing_role(role_id)
 
 
+@traced
+@read_from_replica
 def get_users(platform):
     admin_field = ADMIN_PLATFORMS[platform]
     return {
@@ -50,6 +288,8 @@ def get_users(platform):
     }
 
 
+@traced
+@read_from_replica
 def get_menus():
     return {
         menu.id: Button(dict(
@@ -63,22 +303,29 @@ def get_menus():
     }
 
 
+@traced
 def check_menu_updates(platform):
     return set(MenuUpdate.objects.filter(
         **{'{}__isnull'.format(MENU_UPDATES[platform]): True}
     ).values_list('id', flat=True))
 
 
+@traced
+@serialized
 def complete_menu_updates(platform, update_ids):
     MenuUpdate.objects.filter(id__in=update_ids).update(
         **{f'{MENU_UPDATES[platform]}': datetime.now()}
     )
 
 
+@traced
+@read_from_replica
 def get_main_menu_links():
     return {role.id: role.menu.id for role in Role.objects.all()}
 
 
+@traced
+@read_from_replica
 def get_subscribers(platform, role_id=None):
     if role_id is not None:
         return set(
@@ -93,32 +340,76 @@ def get_subscribers(platform, role_id=None):
     )
 
 
+def log_subscription(platform, platform_id, is_subscribed, date):
+    with connection.cursor() as cursor:
+        cursor.execute(LOG_SUBSCRIPTION, (
+            is_subscribed,
+            connection.ops.adapt_datetimefield_value(date),
+            platform,
+            platform_id,
+        ))
+
+
+@traced
+@serialized
 def subscribe(platform, platform_id):
-    user = User.objects.get(platform=platform, platform_id=platform_id)
-    if user.is_subscribed:
+    users = User.objects.filter(platform=platform, platform_id=platform_id)
+    current_time = now()
+    with transaction.atomic():
+        if users.filter(is_subscribed=False).update(
+            is_subscribed=True,
+            date_subscribed=current_time,
+            updated=current_time,
+        ):
+            log_subscription(platform, platform_id, True, current_time)
+            return
+    if users.exists():
         raise ValueError(
             Errors.ALREADY_SUBSCRIBED.format(
                 platform=platform, platform_id=platform_id,
             )
         )
-    user.is_subscribed = True
-    user.date_subscribed = now()
-    user.save()
+    raise get_missing_user(platform, platform_id)
 
 
+@traced
+@serialized
 def unsubscribe(platform, platform_id):
-    user = User.objects.get(platform=platform, platform_id=platform_id)
-    if not user.is_subscribed:
+    users = User.objects.filter(platform=platform, platform_id=platform_id)
+    current_time = now()
+    with transaction.atomic():
+        if users.filter(is_subscribed=True).update(
+            is_subscribed=False,
+            date_subscribed=None,
+            date_unsubscribed=current_time,
+            updated=current_time,
+        ):
+            log_subscription(platform, platform_id, False, current_time)
+            return
+    if users.exists():
         raise ValueError(
             Errors.NOT_SUBSCRIBED.format(
                 platform=platform, platform_id=platform_id,
             )
         )
-    user.is_subscribed = False
-    user.date_subscribed = None
-    user.save()
+    raise get_missing_user(platform, platform_id)
+
+
+@traced
+@serialized
+def toggle_reminder(platform, platform_id, button):
+    reminder, created = Reminder.objects.get_or_create(
+        user=User.objects.get(platform=platform, platform_id=platform_id),
+        button_id=button.id,
+        defaults=dict(text=button.text, time=button.time),
+    )
+    if not created:
+        reminder.is_active = not reminder.is_active
+        reminder.save()
+    return reminder.is_active
 
 
+@traced
 def get_blocked_users(platform):
     return set(
         User.objects.filter(
@@ -127,69 +418,471 @@ def get_blocked_users(platform):
     )
 
 
+@traced
+@serialized
 def block(platform, platform_id):
-    user = User.objects.get(platform=platform, platform_id=platform_id)
-    if user.is_blocked:
-        raise ValueError(
-            Errors.ALREADY_BLOCKED.format(
-                platform=platform, platform_id=platform_id,
-            )
-        )
-    user.is_blocked = True
-    user.questions.all().delete()
-    user.save()
-
-
+    users = User.objects.filter(platform=platform, platform_id=platform_id)
+    with transaction.atomic():
+        if not users.filter(is_blocked=False).update(
+            is_blocked=True, updated=now(),
+        ):
+            if users.exists():
+                raise ValueError(
+                    Errors.ALREADY_BLOCKED.format(
+                        platform=platform, platform_id=platform_id,
+                    )
+                )
+            raise get_missing_user(platform, platform_id)
+        Question.objects.filter(user__in=users).delete()
+
+
+def normalize_question(question):
+    return NOT_WORD.sub(' ', question.lower()).strip()
+
+
+def merge_question(key, question):
+    recent = question_buffer.get(key)
+    if recent is None:
+        return False
+    question_id, updated, texts = recent
+    text = normalize_question(question)
+    open_question = Question.objects.filter(
+        id=question_id, answered__isnull=True,
+    )
+    if text in texts:
+        if open_question.exists():
+            return True
+    elif time.monotonic() - updated < QUESTION_BURST_WINDOW:
+        if open_question.update(question=Concat(
+            F('question'), Value(QUESTION_DELIMITER), Value(question),
+        )):
+            question_buffer.set(key, question_id, texts | {text})
+            return True
+    question_buffer.remove(key)
+    return False
+
+
+@traced
 def add_question(platform, platform_id, question):
-    user = User.objects.get(platform=platform, platform_id=platform_id)
-    if not user.is_blocked:
-        Question.objects.create(user=user, question=question)
+    """Stores the question of a user who is not blocked.
+
+    Returns the automatic answer if the question got one, `None` otherwise.
+    """
+    return save_question(
+        platform,
+        platform_id,
+        question,
+        answer_index.find(question) if settings.auto_answer else None,
+    )
 
 
+@serialized
+def save_question(platform, platform_id, question, answer):
+    if answer is None:
+        key = (platform, platform_id)
+        if merge_question(key, question):
+            return None
+        answered = None
+    else:
+        answered = now()
+    adapt = connection.ops.adapt_datetimefield_value
+    row = fetch_returning(INSERT_QUESTION, (
+        question,
+        answer or '',
+        adapt(now()),
+        adapt(answered),
+        adapt(answered),
+        answer is not None,
+        platform,
+        platform_id,
+    ))
+    if row is None:
+        if not User.objects.filter(
+            platform=platform, platform_id=platform_id,
+        ).exists():
+            raise get_missing_user(platform, platform_id)
+        return None
+    if answer is not None:
+        return answer
+    question_buffer.set(key, row[0], {normalize_question(question)})
+    for admin_platform in ADMIN_PLATFORMS:
+        events.publish(Events.QUESTION, admin_platform)
+    return None
+
+
+@traced
 def get_open_question():
     return Question.objects.filter(
-        answered__isnull=True,
+        get_unclaimed(), answered__isnull=True,
     ).values(
         'id', 'user__platform', 'user__platform_id', 'user__role', 'question',
     ).first()
 
 
+@traced
+def get_last_question_id():
+    return Question.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+@traced
+def get_new_questions(after_id):
+    return Question.objects.filter(
+        id__gt=after_id, answered__isnull=True,
+    ).aggregate(count=Count('id'), last_id=Max('id'))
+
+
+def get_unclaimed():
+    return Q(claimed_at__isnull=True) | Q(
+        claimed_at__lt=now() - timedelta(seconds=ADMIN_BATCH_CLAIM_TIMEOUT),
+    )
+
+
+@traced
+@serialized
+def claim_open_questions(admin, limit):
+    """Claims up to `limit` open questions nobody holds for `admin`.
+
+    The claim is a conditional update, so a question claimed at once by
+    admins of several bots goes to one of them.
+    """
+    open_questions = Question.objects.filter(answered__isnull=True)
+    while True:
+        question_ids = list(open_questions.filter(
+            get_unclaimed(),
+        ).values_list('id', flat=True)[:limit])
+        if not question_ids:
+            return []
+        claimed_at = now()
+        if open_questions.filter(
+            get_unclaimed(), id__in=question_ids,
+        ).update(claimed_by=admin, claimed_at=claimed_at):
+            return list(open_questions.filter(
+                id__in=question_ids, claimed_by=admin, claimed_at=claimed_at,
+            ).values(
+                'id', 'user__platform', 'user__platform_id', 'user__role',
+                'question',
+            ))
+
+
+@traced
+@serialized
+def renew_claims(admin, question_ids):
+    questions = Question.objects.filter(
+        id__in=question_ids, claimed_by=admin, answered__isnull=True,
+    )
+    questions.update(claimed_at=now())
+    return set(questions.values_list('id', flat=True))
+
+
+@traced
+@serialized
+def release_questions(admin, question_ids):
+    Question.objects.filter(
+        id__in=question_ids, claimed_by=admin, answered__isnull=True,
+    ).update(claimed_by='', claimed_at=None)
+
+
+@traced
 def get_answered_questions(platform):
     return set(
         Question.objects.filter(
             user__platform=platform,
             answered__isnull=False,
             answer_sent=None,
+            answer_failed=False,
         ).values_list('id', 'user__platform_id', 'answer')
     )
 
 
+@traced
+def search_questions(query, queryset=None):
+    if queryset is None:
+        queryset = Question.objects.all()
+    if not query.strip():
+        return queryset
+    match connection.vendor:
+        case 'postgresql':
+            found = queryset.filter(RawSQL(
+                f"to_tsvector('{SEARCH_CONFIG}', {SEARCH_DOCUMENT}) @@ "
+                f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)",
+                (query,),
+                output_field=BooleanField(),
+            ))
+            if found.exists():
+                return found
+            pattern = (
+                query.replace('\\', '\\\\')
+                .replace('%', '\\%')
+                .replace('_', '\\_')
+            )
+            return queryset.filter(RawSQL(
+                f'({SEARCH_DOCUMENT}) ILIKE %s',
+                (f'%{pattern}%',),
+                output_field=BooleanField(),
+            ))
+        case 'sqlite':
+            terms = ' '.join(
+                '"{}"*'.format(term.replace('"', '""'))
+                for term in query.split()
+            )
+            return queryset.filter(id__in=RawSQL(
+                'SELECT rowid FROM core_question_fts '
+                'WHERE core_question_fts MATCH %s',
+                (terms,),
+            ))
+    return queryset.filter(
+        Q(question__icontains=query) | Q(answer__icontains=query)
+    )
+
+
+@traced
+@serialized
 def answer_question(question_id, answer):
-    question = Question.objects.get(id=question_id)
-    question.answer = answer
-    question.answered = now()
-    question.save()
+    row = fetch_returning(ANSWER_QUESTION, (
+        answer, connection.ops.adapt_datetimefield_value(now()), question_id,
+    ))
+    if row is None:
+        raise Question.DoesNotExist
+    events.publish(Events.ANSWER, row[0])
+
 
+@traced
+@serialized
+def answer_open_question(question_id, platform, answer):
+    if not Question.objects.filter(
+        id=question_id, answered__isnull=True,
+    ).update(answer=answer, answered=now()):
+        return False
+    events.publish(Events.ANSWER, platform)
+    return True
 
+
+def publish_answer(question):
+    events.publish(Events.ANSWER, question.user.platform)
+
+
+@traced
+@serialized
 def confirm_answer_sent(question_ids):
     Question.objects.filter(id__in=question_ids).update(answer_sent=now())
 
 
+@traced
+@serialized
+def mark_answer_failed(question_ids):
+    Question.objects.filter(id__in=question_ids).update(answer_failed=True)
+
+
 class GenericBot:
+    STATIC_MENU_LINKS = {}
+
     def __init__(self, platform):
         self.platform = platform
+        tracer.start(platform)
+        writer.start()
         self.roles = None
         self.users = None
         self.subscribers = None
         self.main_menu_links = None
         self.current_menus = None
+        self.state_lock = RLock()
+        self.outbox = None
+        self.health = Health(platform)
+        self.reminders = ReminderEngine(self)
+        self.question_batches = QuestionBatches(platform)
+        self.notification_lock = Lock()
+        self.notification_timer = None
+        self.last_notification = 0
+        self.last_question_id = get_last_question_id()
+        self.throttle = get_throttle(platform, (ADMIN_ROLE_ID,))
+        self.recorder = None
+        self.write_behind = None
+        self.start_recorder()
+        self.start_write_behind()
+        if settings.auto_answer:
+            answer_index.start(platform)
         self.get_data()
 
     def get_data(self):
-        self.roles = get_roles()
-        self.users = get_users(self.platform)
-        self.subscribers = {
-            role: get_subscribers(self.platform, role) for role in self.roles
+        self.set_data(self.load_data())
+
+    def load_data(self):
+        self.flush_writes()
+        roles = get_roles()
+        return {
+            'roles': roles,
+            'users': get_users(self.platform),
+            'subscribers': {
+                role: get_subscribers(self.platform, role) for role in roles
+            },
+            'main_menu_links': (
+                get_main_menu_links() | self.STATIC_MENU_LINKS
+            ),
+            'current_menus': {},
         }
-        self.main_menu_links = get_main_menu_links()
-        self.current_menus = {}
+
+    def set_data(self, data):
+        """Swaps in the state built by another thread.
+
+        Handlers hold `state_lock` for a whole update, so they never see
+        the state of the bot half replaced.
+        """
+        with self.state_lock:
+            for name, value in data.items():
+                setattr(self, name, value)
+
+    def start_event_listener(self):
+        events.EventListener(
+            self.platform,
+            {
+                Events.ANSWER: self.deliver_answers,
+                Events.REMINDERS: self.reminders.sync,
+                Events.QUESTION: self.notify_admins,
+            },
+        )
+
+    def start_reminders(self):
+        self.reminders.start()
+
+    def start_recorder(self):
+        if settings.record_traffic:
+            self.recorder = TrafficRecorder(self.platform)
+
+    def start_write_behind(self, filename=None):
+        if settings.write_behind:
+            self.write_behind = WriteBehind(self.platform, filename)
+
+    def start_outbox(self, filename=None):
+        self.outbox = Outbox(
+            self.platform, self.send_now, self.get_retry_delay, filename,
+        )
+
+    def start_health(self):
+        self.health.start(self.outbox, self.throttle)
+
+    def send_now(self, method, params):
+        raise NotImplementedError
+
+    @staticmethod
+    def get_retry_delay(error):
+        raise NotImplementedError
+
+    def send_message(self, user_id, message, keyboard=None, **options):
+        raise NotImplementedError
+
+    def deliver_answers(self):
+        for question_id, user_id, answer in get_answered_questions(
+            self.platform,
+        ):
+            self.send_message(
+                user_id,
+                ChatMessages.ANSWER.format(answer=answer),
+                priority=Priorities.ANSWER,
+                key=f'answer#{question_id}',
+                callback=partial(confirm_answer_sent, (question_id,)),
+                failure_callback=partial(mark_answer_failed, (question_id,)),
+            )
+
+    def is_answering(self, admin_id):
+        raise NotImplementedError
+
+    def notify_admins(self):
+        """Tells admins on the platform how many questions were asked.
+
+        The first new question is reported at once, later ones are
+        collected for up to `ADMIN_NOTIFICATION_INTERVAL` seconds and
+        reported with one message. Admins already answering questions are
+        not notified.
+        """
+        with self.notification_lock:
+            if self.notification_timer is not None:
+                return
+            questions = get_new_questions(self.last_question_id)
+            if not questions['count']:
+                return
+            delay = (
+                self.last_notification + ADMIN_NOTIFICATION_INTERVAL
+                - time.monotonic()
+            )
+            if delay > 0:
+                self.notification_timer = Timer(
+                    delay, self.send_delayed_notification,
+                )
+                self.notification_timer.daemon = True
+                self.notification_timer.start()
+                return
+            self.last_question_id = questions['last_id']
+            self.last_notification = time.monotonic()
+        for admin_id, role_id in list(self.users.items()):
+            if role_id == ADMIN_ROLE_ID and not self.is_answering(admin_id):
+                self.send_message(
+                    admin_id,
+                    ChatMessages.NEW_QUESTIONS.format(
+                        count=questions['count'],
+                    ),
+                    priority=Priorities.ANSWER,
+                    key=f'new_questions#{questions["last_id"]}#{admin_id}',
+                )
+
+    def send_delayed_notification(self):
+        with self.notification_lock:
+            self.notification_timer = None
+        try:
+            self.notify_admins()
+        finally:
+            connection.close()
+
+    def flush_writes(self):
+        if self.write_behind:
+            self.write_behind.flush()
+
+    def toggle_reminder(self, user_id, button):
+        self.flush_writes()
+        if toggle_reminder(self.platform, user_id, button):
+            return button.answer
+        return ChatMessages.REMINDER_OFF
+
+    def format_question_batch(self, questions):
+        """Returns the batch as messages, one per question to reply to."""
+        return [ChatMessages.QUESTION_BATCH] + [
+            ChatMessages.QUESTION.format(
+                question_id=question['id'],
+                user_platform=PLATFORMS_VERBOSE[question['user__platform']],
+                user_id=question['user__platform_id'],
+                user_role=self.roles[question['user__role']],
+                question=(
+                    question['question'][:ADMIN_BATCH_QUESTION_LENGTH] + '…'
+                    if len(question['question']) > ADMIN_BATCH_QUESTION_LENGTH
+                    else question['question']
+                ),
+            )
+            for question in questions
+        ]
+
+    def refresh_users(self):
+        self.flush_writes()
+        self.set_data({'users': get_users(self.platform)})
+
+    def add_user(self, user_id, role_id):
+        if self.write_behind:
+            self.write_behind.add_user(user_id, role_id)
+        else:
+            add_user(self.platform, user_id, role_id)
+
+    def change_role(self, user_id, role_id):
+        if self.write_behind:
+            self.write_behind.change_role(user_id, role_id)
+        else:
+            change_role(self.platform, user_id, role_id)
+
+    def subscribe(self, user_id):
+        if self.write_behind:
+            self.write_behind.subscribe(user_id)
+        else:
+            subscribe(self.platform, user_id)
+
+    def unsubscribe(self, user_id):
+        if self.write_behind:
+            self.write_behind.unsubscribe(user_id)
+        else:
+            unsubscribe(self.platform, user_id)
@@ -0,0 +1,94 @@
+import select
+import time
+from threading import Thread
+
+from django.db import DatabaseError, connection, transaction
+
+from backend.settings import get_logger
+from core.constants import Errors, PLATFORMS_VERBOSE, Pooling
+
+CHANNEL = '{event}_{platform}'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def publish(event, platform):
+    if not is_supported():
+        return
+    channel = CHANNEL.format(event=event, platform=platform)
+
+    def notify():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', (channel, ''))
+
+    transaction.on_commit(notify)
+
+
+class EventListener:
+    """Calls back a bot as soon as an event for its platform is published.
+
+    On PostgreSQL events are delivered with LISTEN/NOTIFY, callbacks are
+    also run every `Pooling.EVENTS_FALLBACK` seconds in case a notification
+    was missed. Other databases have no notifications, so callbacks are
+    run every `Pooling.EVENTS` seconds instead.
+    """
+
+    def __init__(self, platform, callbacks):
+        self.platform = platform
+        self.callbacks = callbacks
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.channels = {
+            CHANNEL.format(event=event, platform=platform): event
+            for event in callbacks
+        }
+        Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                if is_supported():
+                    self.listen()
+                else:
+                    self.poll()
+            except DatabaseError as error:
+                self.logger.error(Errors.EVENTS.format(error=error))
+                connection.close()
+                time.sleep(Pooling.EVENTS)
+
+    def poll(self):
+        while True:
+            self.dispatch(self.callbacks)
+            time.sleep(Pooling.EVENTS)
+
+    def listen(self):
+        with connection.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f'LISTEN "{channel}"')
+        pg_connection = connection.connection
+        while True:
+            if select.select(
+                [pg_connection], [], [], Pooling.EVENTS_FALLBACK,
+            ) == ([], [], []):
+                self.dispatch(self.callbacks)
+                continue
+            pg_connection.poll()
+            events = {
+                self.channels[notify.channel]
+                for notify in pg_connection.notifies
+            }
+            pg_connection.notifies.clear()
+            self.dispatch(events)
+
+    def dispatch(self, events):
+        for event in events:
+            try:
+                self.callbacks[event]()
+            except DatabaseError:
+                raise
+            except Exception as error:
+                self.logger.error(Errors.RUNTIME.format(
+                    error_type=type(error).__name__,
+                    error=error,
+                ))
@@ -0,0 +1,179 @@
+import csv
+import re
+from datetime import date, datetime
+from itertools import chain
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from django.http import StreamingHttpResponse
+from django.utils.timezone import now
+
+from core.constants import EXPORT_CHUNK_SIZE
+
+EXPORT_FILENAME = '{name}_{date:%Y-%m-%d_%H-%M}.{extension}'
+CSV_CONTENT_TYPE = 'text/csv'
+CSV_BOM = '\ufeff'
+XLSX_CONTENT_TYPE = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+)
+XLSX_EPOCH = datetime(1899, 12, 30)
+XLSX_ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+XLSX_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XLSX_RELATIONSHIPS = (
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+)
+XLSX_PACKAGE = 'http://schemas.openxmlformats.org/package/2006'
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        f'<Types xmlns="{XLSX_PACKAGE}/content-types">'
+        '<Default Extension="rels" ContentType="application/'
+        'vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType='
+        '"application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        f'<Relationships xmlns="{XLSX_PACKAGE}/relationships">'
+        f'<Relationship Id="rId1" Type="{XLSX_RELATIONSHIPS}/officeDocument"'
+        ' Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        f'<workbook xmlns="{XLSX_MAIN}" xmlns:r="{XLSX_RELATIONSHIPS}">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        f'<Relationships xmlns="{XLSX_PACKAGE}/relationships">'
+        f'<Relationship Id="rId1" Type="{XLSX_RELATIONSHIPS}/worksheet"'
+        ' Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{XLSX_RELATIONSHIPS}/styles"'
+        ' Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        f'<styleSheet xmlns="{XLSX_MAIN}">'
+        '<fonts count="1"><font/></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill>'
+        '</fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/>'
+        '<xf numFmtId="22" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1">'
+        '<cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+XLSX_SHEET = 'xl/worksheets/sheet1.xml'
+XLSX_SHEET_START = f'<worksheet xmlns="{XLSX_MAIN}"><sheetData>'
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class Buffer:
+    """Collects bytes written by `ZipFile` until they are taken."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def get_rows(queryset, fields):
+    yield [label for _, label in fields]
+    yield from queryset.values_list(
+        *(lookup for lookup, _ in fields)
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def get_filename(name, extension):
+    return EXPORT_FILENAME.format(name=name, date=now(), extension=extension)
+
+
+def get_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, date):
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.min.time())
+        serial = (value.replace(tzinfo=None) - XLSX_EPOCH).total_seconds()
+        return f'<c s="1"><v>{serial / (24 * 60 * 60)}</v></c>'
+    text = escape(XLSX_ILLEGAL_CHARACTERS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def get_xlsx(rows):
+    """Yields an XLSX file with `rows` in one sheet as it is zipped.
+
+    The sheet is written row by row into a zip entry with a data
+    descriptor, so neither the rows nor the file are held in memory.
+    """
+    buffer = Buffer()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as archive:
+        for name, part in XLSX_PARTS.items():
+            archive.writestr(name, part)
+        with archive.open(XLSX_SHEET, 'w') as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            for index, row in enumerate(rows, 1):
+                sheet.write(
+                    f'<row>{"".join(map(get_cell, row))}</row>'.encode()
+                )
+                if index % EXPORT_CHUNK_SIZE == 0:
+                    yield buffer.take()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.take()
+
+
+def get_response(content, content_type, name, extension):
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{get_filename(name, extension)}"'
+    )
+    return response
+
+
+def export_csv(queryset, fields, name):
+    writer = csv.writer(Echo())
+    return get_response(
+        chain(
+            (CSV_BOM,),
+            (writer.writerow(row) for row in get_rows(queryset, fields)),
+        ),
+        CSV_CONTENT_TYPE,
+        name,
+        'csv',
+    )
+
+
+def export_xlsx(queryset, fields, name):
+    return get_response(
+        get_xlsx(get_rows(queryset, fields)),
+        XLSX_CONTENT_TYPE,
+        name,
+        'xlsx',
+    )
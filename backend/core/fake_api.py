@@ -0,0 +1,471 @@
+import heapq
+import json
+import random
+import sys
+import time
+from collections import Counter
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Condition, Lock, Thread
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from core.constants import (
+    LOAD_TEST_USER_ID_OFFSET, LOAD_TEST_USER_TIMEOUT, PERCENTILES,
+)
+
+QUESTION = 'Вопрос #{number} от пользователя {user_id}'
+FIRST_MESSAGE = 'Привет'
+
+
+class Actions:
+    TEXT = 'text'
+    BUTTON = 'button'
+
+
+class SimulatedUsers:
+    """Closed-loop users of a fake platform.
+
+    Every user waits for the bot to reply, thinks for up to `think_time`
+    seconds and then presses a random button of the last keyboard it was
+    sent or, with `question_rate` probability, types a question. A user
+    that got no reply in `LOAD_TEST_USER_TIMEOUT` seconds acts again.
+    """
+
+    def __init__(self, users, think_time, question_rate, send_update):
+        self.think_time = think_time
+        self.question_rate = question_rate
+        self.send_update = send_update
+        self.condition = Condition()
+        self.options = {}
+        self.waiting = {}
+        self.schedule = []
+        self.due = {}
+        self.questions = count(1)
+        self.latencies = []
+        self.counters = Counter()
+        for number in range(users):
+            self.plan(
+                LOAD_TEST_USER_ID_OFFSET + number,
+                time.monotonic() + random.uniform(0, think_time),
+            )
+        Thread(target=self.run, daemon=True).start()
+
+    def plan(self, user_id, due):
+        self.due[user_id] = due
+        heapq.heappush(self.schedule, (due, user_id))
+
+    def take(self):
+        with self.condition:
+            while True:
+                current = time.monotonic()
+                if self.schedule and self.schedule[0][0] <= current:
+                    due, user_id = heapq.heappop(self.schedule)
+                    if self.due.get(user_id) != due:
+                        continue
+                    if user_id in self.waiting:
+                        self.counters['timeouts'] += 1
+                    self.waiting[user_id] = current
+                    self.plan(user_id, current + LOAD_TEST_USER_TIMEOUT)
+                    self.counters['updates'] += 1
+                    return user_id, self.choose_action(user_id)
+                self.condition.wait(
+                    self.schedule[0][0] - current if self.schedule else None
+                )
+
+    def run(self):
+        while True:
+            user_id, action = self.take()
+            self.send_update(user_id, *action)
+
+    def choose_action(self, user_id):
+        options = self.options.get(user_id)
+        if not options:
+            return Actions.TEXT, FIRST_MESSAGE
+        if random.random() < self.question_rate:
+            return Actions.TEXT, QUESTION.format(
+                number=next(self.questions), user_id=user_id,
+            )
+        return random.choice(options)
+
+    def receive(self, user_id, options=None):
+        with self.condition:
+            self.counters['messages'] += 1
+            if options is not None:
+                self.options[user_id] = options
+            started = self.waiting.pop(user_id, None)
+            if started is None:
+                return
+            self.latencies.append(time.monotonic() - started)
+            self.plan(
+                user_id, time.monotonic() + random.uniform(0, self.think_time),
+            )
+            self.condition.notify()
+
+    def get_report(self, duration):
+        with self.condition:
+            latencies = np.array(self.latencies or [0]) * 1000
+            counters = dict(self.counters)
+        return dict(
+            updates=counters.get('updates', 0),
+            replies=len(self.latencies),
+            messages=counters.get('messages', 0),
+            timeouts=counters.get('timeouts', 0),
+            updates_per_second=round(
+                counters.get('updates', 0) / duration, 1,
+            ),
+            messages_per_second=round(
+                counters.get('messages', 0) / duration, 1,
+            ),
+            **{
+                f'latency_p{percentile}_ms': round(float(value), 1)
+                for percentile, value in zip(
+                    PERCENTILES,
+                    np.percentile(latencies, PERCENTILES),
+                )
+            },
+        )
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_params(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        if content_type.startswith('application/json'):
+            params |= json.loads(body or b'{}')
+        elif content_type.startswith('multipart/form-data'):
+            message = BytesParser().parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+            )
+            for part in message.get_payload():
+                if part.get_filename() is None:
+                    name = part.get_param('name', header='content-disposition')
+                    params[name] = part.get_payload(decode=True).decode()
+        elif body:
+            params |= dict(parse_qsl(body.decode()))
+        return params
+
+    def respond(self, data, status=HTTPStatus.OK):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        path = urlsplit(self.path).path
+        params = self.read_params()
+        method = path.rstrip('/').rsplit('/', 1)[-1]
+        self.server.count(method)
+        response = self.server.inject_error(method)
+        if response is None:
+            response = self.server.call(method, params)
+        self.respond(*response)
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """Local stand-in for a messaging platform API.
+
+    Every method call waits for `latency` seconds. Calls above `rate_limit`
+    per second are rejected with the platform flood control error and
+    `failure_rate` of calls fail with a server error. Long polling methods
+    are never delayed or rejected.
+    """
+
+    daemon_threads = True
+    polling_methods = ()
+
+    def __init__(self, port, latency=0, rate_limit=None, failure_rate=0):
+        super().__init__(('127.0.0.1', port), FakeApiHandler)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.lock = Lock()
+        self.updates = Condition()
+        self.queue = []
+        self.next_update_id = count(1)
+        self.counters = Counter()
+        self.window = (0, 0)
+        self.users = None
+        Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def inject_error(self, method):
+        if method in self.polling_methods:
+            return None
+        time.sleep(self.latency)
+        if self.rate_limit:
+            with self.lock:
+                second, calls = self.window
+                current = int(time.monotonic())
+                if second != current:
+                    second, calls = current, 0
+                self.window = (second, calls + 1)
+            if calls >= self.rate_limit:
+                self.count('rate_limited')
+                return self.get_rate_limit_error()
+        if random.random() < self.failure_rate:
+            self.count('failed')
+            return self.get_failure()
+        return None
+
+    def push_update(self, update):
+        with self.updates:
+            self.queue.append(dict(update, id=next(self.next_update_id)))
+            self.updates.notify_all()
+
+    def wait_updates(self, after, timeout):
+        deadline = time.monotonic() + timeout
+        with self.updates:
+            while True:
+                updates = [
+                    update for update in self.queue if update['id'] > after
+                ]
+                remaining = deadline - time.monotonic()
+                if updates or remaining <= 0:
+                    break
+                self.updates.wait(remaining)
+            self.queue = updates
+            return updates
+
+    def call(self, method, params):
+        raise NotImplementedError
+
+    def get_rate_limit_error(self):
+        raise NotImplementedError
+
+    def get_failure(self):
+        raise NotImplementedError
+
+    def get_report(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+class FakeTelegramServer(FakeApiServer):
+    """Telegram Bot API subset used by `TelegramBot`."""
+
+    polling_methods = ('getUpdates', 'deleteWebhook', 'getMe')
+
+    @property
+    def api_url(self):
+        return f'{self.url}/bot'
+
+    def send_update(self, user_id, action, value):
+        self.push_update(dict(
+            message=dict(
+                message_id=0,
+                date=int(time.time()),
+                chat=dict(id=user_id, type='private'),
+                text=value,
+            ) | {'from': dict(id=user_id, is_bot=False, first_name='User')},
+        ))
+
+    @staticmethod
+    def get_options(reply_markup):
+        if reply_markup is None:
+            return None
+        if isinstance(reply_markup, str):
+            reply_markup = json.loads(reply_markup)
+        return [
+            (
+                Actions.TEXT,
+                button['text'] if isinstance(button, dict) else button,
+            )
+            for row in reply_markup.get('keyboard', ())
+            for button in row
+        ]
+
+    def get_message(self, params, **fields):
+        chat_id = int(params['chat_id'])
+        self.users.receive(
+            chat_id, self.get_options(params.get('reply_markup')),
+        )
+        return dict(
+            message_id=self.counters['sendMessage'],
+            date=int(time.time()),
+            chat=dict(id=chat_id, type='private'),
+            **fields,
+        )
+
+    def call(self, method, params):
+        match method:
+            case 'getMe':
+                result = dict(
+                    id=1, is_bot=True, first_name='Bot', username='bot',
+                )
+            case 'deleteWebhook':
+                result = True
+            case 'getUpdates':
+                offset = int(params.get('offset') or 1)
+                result = [
+                    dict(update_id=update['id'], message=update['message'])
+                    for update in self.wait_updates(
+                        offset - 1, float(params.get('timeout') or 0),
+                    )
+                ]
+            case 'sendMessage':
+                result = self.get_message(params, text=params.get('text'))
+            case 'sendDocument':
+                result = self.get_message(
+                    params,
+                    document=dict(file_id='document', file_unique_id='doc'),
+                )
+            case _:
+                return dict(
+                    ok=False, error_code=404, description='Not Found',
+                ), HTTPStatus.NOT_FOUND
+        return dict(ok=True, result=result), HTTPStatus.OK
+
+    def get_rate_limit_error(self):
+        return dict(
+            ok=False,
+            error_code=429,
+            description='Too Many Requests: retry after 1',
+            parameters=dict(retry_after=1),
+        ), HTTPStatus.TOO_MANY_REQUESTS
+
+    def get_failure(self):
+        return dict(
+            ok=False, error_code=502, description='Bad Gateway',
+        ), HTTPStatus.BAD_GATEWAY
+
+
+class FakeVkServer(FakeApiServer):
+    """VK API subset used by `VKBot`, including Bots Long Poll and docs."""
+
+    polling_methods = ('longpoll', 'groups.getLongPollServer', 'upload')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.random_ids = set()
+
+    @property
+    def api_url(self):
+        return f'{self.url}/method/'
+
+    def send_update(self, user_id, action, value):
+        if action == Actions.BUTTON:
+            self.push_update(dict(
+                type='message_event',
+                object=dict(
+                    user_id=user_id,
+                    peer_id=user_id,
+                    event_id=str(self.counters['longpoll']),
+                    payload=dict(callback_data=value),
+                ),
+            ))
+            return
+        self.push_update(dict(
+            type='message_new',
+            object=dict(
+                message=dict(
+                    id=0,
+                    date=int(time.time()),
+                    from_id=user_id,
+                    peer_id=user_id,
+                    text=value,
+                ),
+                client_info={},
+            ),
+        ))
+
+    @staticmethod
+    def get_options(keyboard):
+        if not keyboard:
+            return None
+        return [
+            (
+                Actions.BUTTON,
+                json.loads(button['action']['payload'])['callback_data'],
+            )
+            for row in json.loads(keyboard).get('buttons', ())
+            for button in row
+            if button['action'].get('type') == 'callback'
+        ]
+
+    def long_poll(self, params):
+        after = int(params.get('ts') or 0)
+        updates = self.wait_updates(after, float(params.get('wait') or 0))
+        return dict(
+            ts=str(updates[-1]['id'] if updates else after),
+            updates=[
+                dict(
+                    type=update['type'],
+                    object=update['object'],
+                    group_id=1,
+                    event_id=str(update['id']),
+                )
+                for update in updates
+            ],
+        )
+
+    def call(self, method, params):
+        match method:
+            case 'longpoll':
+                return self.long_poll(params), HTTPStatus.OK
+            case 'upload':
+                return dict(file='file'), HTTPStatus.OK
+            case 'groups.getLongPollServer':
+                with self.updates:
+                    ts = self.queue[-1]['id'] if self.queue else 0
+                result = dict(key='key', server=f'{self.url}/longpoll', ts=ts)
+            case 'messages.send':
+                with self.lock:
+                    if params['random_id'] in self.random_ids:
+                        self.counters['duplicates'] += 1
+                    self.random_ids.add(params['random_id'])
+                self.users.receive(
+                    int(params['user_id']),
+                    self.get_options(params.get('keyboard')),
+                )
+                result = self.counters['messages.send']
+            case 'messages.sendMessageEventAnswer':
+                result = 1
+            case 'docs.getMessagesUploadServer':
+                result = dict(upload_url=f'{self.url}/upload')
+            case 'docs.save':
+                result = dict(type='doc', doc=dict(owner_id=-1, id=1))
+            case _:
+                return self.get_error(3, 'Unknown method'), HTTPStatus.OK
+        return dict(response=result), HTTPStatus.OK
+
+    @staticmethod
+    def get_error(code, message):
+        return dict(error=dict(
+            error_code=code, error_msg=message, request_params=[],
+        ))
+
+    def get_rate_limit_error(self):
+        return self.get_error(9, 'Flood control'), HTTPStatus.OK
+
+    def get_failure(self):
+        return self.get_error(10, 'Internal server error'), HTTPStatus.OK
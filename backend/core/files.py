@@ -0,0 +1,160 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from core.constants import (
+    FILE_CHUNK_SIZE, FILE_MAX_SIZE, FILE_PREPROCESSING_WORKERS,
+)
+from core.localization import AdminPanel
+
+try:
+    from PIL import Image, PngImagePlugin
+except ImportError:
+    Image = None
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+PDF_EXTENSION = '.pdf'
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png')
+PNG_OPTIONS = ('dpi', 'exif', 'gamma', 'icc_profile', 'transparency')
+
+pool = None
+
+
+def get_checksum(file):
+    checksum = hashlib.sha256()
+    if hasattr(file, 'chunks'):
+        for chunk in file.chunks(FILE_CHUNK_SIZE):
+            checksum.update(chunk)
+    else:
+        for chunk in iter(lambda: file.read(FILE_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def get_name(directory, checksum, extension):
+    return posixpath.join(directory, checksum[:2], checksum + extension)
+
+
+def validate_file_size(file):
+    if file.size > FILE_MAX_SIZE:
+        raise ValidationError(AdminPanel.FILE_TOO_LARGE.format(
+            size=FILE_MAX_SIZE // 1024 // 1024,
+        ))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores files under the SHA-256 of their content.
+
+    Equal files uploaded to different buttons share a single stored file,
+    the original file name is kept by the model.
+    """
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        name = get_name(
+            directory,
+            get_checksum(content),
+            os.path.splitext(filename)[1].lower(),
+        )
+        if self.exists(name):
+            return name
+        content.seek(0)
+        return super()._save(name, content)
+
+
+def optimize_image(data):
+    """Recompresses a still PNG image, other images are left as they are.
+
+    Pixels, text chunks, EXIF and the color profile of the image are kept.
+    """
+    with Image.open(BytesIO(data)) as image:
+        metadata = dict(width=image.width, height=image.height)
+        if image.format != 'PNG' or getattr(image, 'is_animated', False):
+            return None, metadata
+        info = PngImagePlugin.PngInfo()
+        for key, value in image.text.items():
+            info.add_text(key, value)
+        output = BytesIO()
+        image.save(
+            output,
+            'PNG',
+            optimize=True,
+            pnginfo=info,
+            **{
+                option: image.info[option]
+                for option in PNG_OPTIONS
+                if option in image.info
+            },
+        )
+    return output.getvalue(), metadata
+
+
+def optimize_pdf(data):
+    with pikepdf.open(BytesIO(data)) as pdf:
+        metadata = dict(pages=len(pdf.pages))
+        output = BytesIO()
+        pdf.save(
+            output,
+            compress_streams=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+    return output.getvalue(), metadata
+
+
+def preprocess_file(root, directory, name):
+    """Extracts metadata of a stored file and recompresses it losslessly.
+
+    Runs in a worker process, so it only works with the file system. If the
+    recompressed file is smaller, it is stored next to the original one and
+    its name is returned instead of the original name. The original is
+    deleted by the caller once no button refers to it.
+    """
+    with open(os.path.join(root, name), 'rb') as file:
+        data = file.read()
+    extension = os.path.splitext(name)[1].lower()
+    metadata = dict(content_type=mimetypes.guess_type(name)[0])
+    optimized = None
+    try:
+        if Image and extension in IMAGE_EXTENSIONS:
+            optimized, extra = optimize_image(data)
+            metadata |= extra
+        elif pikepdf and extension == PDF_EXTENSION:
+            optimized, extra = optimize_pdf(data)
+            metadata |= extra
+    except Exception as error:
+        metadata['error'] = str(error)
+    if optimized and len(optimized) < len(data):
+        checksum = hashlib.sha256(optimized).hexdigest()
+        new_name = get_name(directory, checksum, extension)
+        path = os.path.join(root, new_name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(optimized)
+            os.replace(f'{path}.tmp', path)
+        return new_name, checksum, len(optimized), metadata
+    return name, hashlib.sha256(data).hexdigest(), len(data), metadata
+
+
+def preprocess(file):
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(FILE_PREPROCESSING_WORKERS)
+    return pool.submit(
+        preprocess_file,
+        file.storage.location,
+        posixpath.normpath(file.field.upload_to),
+        file.name,
+    )
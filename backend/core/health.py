@@ -0,0 +1,217 @@
+import json
+import os
+import socket
+import time
+from functools import wraps
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock, Thread
+
+from django.db import DatabaseError, connection
+
+from backend.settings import get_logger, settings
+from core.constants import (
+    Errors, HEALTH_MAX_JOB_LATENESS, HEALTH_MAX_OUTBOX, HEALTH_POLL_TIMEOUT,
+    HEALTH_PORT_OFFSETS, PLATFORMS_VERBOSE, Pooling,
+)
+
+LIVE_PATH = '/live'
+READY_PATH = '/ready'
+
+
+def notify_systemd(state):
+    """Sends `state` to systemd if the process runs as a notify service."""
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notify_socket:
+        notify_socket.sendto(state.encode(), address)
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = self.server.health.status
+        if self.path == LIVE_PATH:
+            ok = status['live']
+        elif self.path == READY_PATH:
+            ok = status['ready']
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = json.dumps(status).encode()
+        self.send_response(
+            HTTPStatus.OK if ok else HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Health:
+    """Tracks whether a bot makes progress.
+
+    The bot reports every long-poll response, every handled update and every
+    run of its periodic jobs. Every `Pooling.HEALTH` seconds a background
+    thread checks the database connection and computes the status: the bot
+    is live while long-poll responses keep coming, and ready while it is
+    live, the database is reachable, the outbox is not overflowing and no
+    job is late. The status also reports the counters of the throttle. It
+    is served at `/live` and `/ready` on `HEALTH_PORT`, shifted by the
+    offset of the platform, and a live bot pings the systemd watchdog.
+    """
+
+    def __init__(self, platform):
+        self.platform = platform
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.lock = Lock()
+        self.started = time.monotonic()
+        self.last_poll = self.started
+        self.last_update = None
+        self.update_lag = None
+        self.jobs = {}
+        self.outbox = None
+        self.throttle = None
+        self.status = dict(live=True, ready=False)
+
+    def polled(self):
+        self.last_poll = time.monotonic()
+
+    def handled(self, created=None):
+        self.last_update = time.monotonic()
+        if created is not None:
+            self.update_lag = max(time.time() - created, 0)
+
+    def track(self, name, interval, function):
+        """Wraps the periodic job `function` to record its runs."""
+        job = self.jobs[name] = dict(
+            interval=interval,
+            last_run=time.monotonic(),
+            lateness=0,
+            duration=None,
+            running=False,
+            runs=0,
+            errors=0,
+            missed=0,
+            skipped=0,
+        )
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            with self.lock:
+                job['lateness'] = max(
+                    started - job['last_run'] - job['interval'], 0,
+                )
+                job['last_run'] = started
+                job['running'] = True
+                job['runs'] += 1
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                with self.lock:
+                    job['errors'] += 1
+                raise
+            finally:
+                with self.lock:
+                    job['duration'] = time.monotonic() - started
+                    job['running'] = False
+        return wrapper
+
+    def count(self, name, counter):
+        with self.lock:
+            self.jobs[name][counter] += 1
+
+    def start(self, outbox, throttle=None):
+        self.outbox = outbox
+        self.throttle = throttle
+        self.check()
+        Thread(target=self.run, daemon=True).start()
+        if settings.health_port:
+            server = HTTPServer(
+                (
+                    '127.0.0.1',
+                    settings.health_port + HEALTH_PORT_OFFSETS[self.platform],
+                ),
+                HealthHandler,
+            )
+            server.health = self
+            Thread(target=server.serve_forever, daemon=True).start()
+        notify_systemd('READY=1')
+
+    def run(self):
+        while True:
+            time.sleep(Pooling.HEALTH)
+            was_live = self.status['live']
+            self.check()
+            if self.status['live']:
+                notify_systemd('WATCHDOG=1')
+            elif was_live:
+                self.logger.error(Errors.HEALTH.format(
+                    seconds=round(self.status['poll_age']),
+                ))
+
+    def check_database(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except DatabaseError:
+            connection.close()
+            return False
+
+    def check(self):
+        current = time.monotonic()
+        with self.lock:
+            jobs = {
+                name: dict(
+                    interval=job['interval'],
+                    age=current - job['last_run'],
+                    lateness=max(
+                        job['lateness'],
+                        current - job['last_run'] - job['interval'],
+                    ),
+                    duration=job['duration'],
+                    running=job['running'],
+                    runs=job['runs'],
+                    errors=job['errors'],
+                    missed=job['missed'],
+                    skipped=job['skipped'],
+                )
+                for name, job in self.jobs.items()
+            }
+        poll_age = current - self.last_poll
+        database = self.check_database()
+        outbox = len(self.outbox) if self.outbox is not None else 0
+        live = poll_age < HEALTH_POLL_TIMEOUT
+        self.status = dict(
+            live=live,
+            ready=(
+                live
+                and database
+                and outbox < HEALTH_MAX_OUTBOX
+                and all(
+                    job['lateness'] < HEALTH_MAX_JOB_LATENESS
+                    for job in jobs.values()
+                )
+            ),
+            uptime=current - self.started,
+            poll_age=poll_age,
+            update_age=(
+                current - self.last_update
+                if self.last_update is not None else None
+            ),
+            update_lag=self.update_lag,
+            database=database,
+            outbox=outbox,
+            jobs=jobs,
+            throttle=(
+                self.throttle.get_counters()
+                if self.throttle is not None else {}
+            ),
+        )
@@ -11,6 +11,7 @@ class Defaults:
 
 class VerboseNames:
     CREATED = 'время создания'
+    UPDATED = 'время изменения'
 
     class AdminUser:
         TELEGRAM_ID = 'Telegram ID'
@@ -30,13 +31,29 @@ class VerboseNames:
         ASK_ADMIN = 'вопрос админу'
         MENU = 'меню'
         FILE = 'файл'
+        FILE_NAME = 'имя файла'
+        FILE_SIZE = 'размер файла'
+        FILE_METADATA = 'метаданные файла'
+        CHECKSUM = 'контрольная сумма'
         ON_NAME = 'текст на кнопке при подписке'
         OFF_NAME = 'текст на кнопке при отписке'
         IS_SUBSCRIBER = 'сообщение если пользователь подписан'
         IS_NOT_SUBSCRIBER = 'сообщение если пользователь не подписан'
         REMINDER_TEXT = 'текст напоминания'
+        REMINDER_TIME = 'время напоминания'
         RECEIVED_ANSWER = 'ответ при получении вопроса'
 
+    class Reminder:
+        USER = 'пользователь'
+        ROLE = 'роль'
+        BUTTON = 'кнопка'
+        TEXT = 'текст'
+        TIME = 'время'
+        IS_ACTIVE = 'активно'
+        SENT = 'отправлено в {platform}'
+        REMINDER = 'напоминание'
+        REMINDERS = 'напоминания'
+
     class Question:
         USER = 'пользователь'
         QUESTION = 'вопрос'
@@ -49,6 +66,10 @@ class VerboseNames:
         CLOSED_QUESTIONS = 'архив вопросов'
         QUESTION_STATS = 'статистика вопросов/ответов'
         ANSWER_SENT = 'ответ отправлен пользователю'
+        IS_AUTO_ANSWERED = 'ответ дан автоматически'
+        ANSWER_FAILED = 'ответ не удалось доставить'
+        CLAIMED_BY = 'в работе у администратора'
+        CLAIMED_AT = 'дата и время взятия в работу'
 
     class User:
         PLATFORM = 'платформа'
@@ -56,6 +77,7 @@ class VerboseNames:
         ROLE = 'роль'
         IS_SUBSCRIBED = 'подписан'
         DATE_SUBSCRIBED = 'дата подписки'
+        DATE_UNSUBSCRIBED = 'дата отписки'
         SUBSCRIBER_STATS = 'статистика активных подписчиков'
         IS_BLOCKED = 'заблокировать'
         USER = 'пользователь'
@@ -71,6 +93,34 @@ class VerboseNames:
         MenuUpdate = 'обновление меню'
         MenuUpdates = 'обновления меню'
 
+    class DailyStats:
+        DATE = 'дата'
+        PLATFORM = 'платформа'
+        ROLE = 'роль'
+        QUESTIONS_ASKED = 'задано вопросов'
+        QUESTIONS_ANSWERED = 'отвечено вопросов'
+        MEDIAN_ANSWER_TIME = 'медианное время ответа'
+        P90_ANSWER_TIME = 'время ответа (90-й перцентиль)'
+        NEW_SUBSCRIBERS = 'новых подписчиков'
+        UNSUBSCRIBES = 'отписок'
+        DAILY_STATS = 'статистика за день'
+        DAILY_STATS_PLURAL = 'статистика по дням'
+
+    class StatsWatermark:
+        QUESTION_ID = 'последний учтённый вопрос'
+        ANSWERED = 'время последнего учтённого ответа'
+        SUBSCRIPTION_ID = 'последняя учтённая подписка'
+        UNSUBSCRIPTION_ID = 'последняя учтённая отписка'
+        STATS_WATERMARK = 'отметка статистики'
+        STATS_WATERMARKS = 'отметки статистики'
+
+    class Subscription:
+        USER = 'пользователь'
+        IS_SUBSCRIBED = 'подписка'
+        DATE = 'дата и время'
+        SUBSCRIPTION = 'подписка или отписка'
+        SUBSCRIPTIONS = 'подписки и отписки'
+
 
 class AdminPanel:
     PARENT_LINKS = 'Родительское меню'
@@ -79,11 +129,23 @@ class AdminPanel:
     UPDATE_MENUS = 'Обновить меню ботов'
     UPDATING = 'Обновляется...'
     QUESTION = 'Вопрос #{id} от {user}'
+    EXPORT_CSV = 'Экспорт в CSV'
+    EXPORT_XLSX = 'Экспорт в XLSX'
+    FILE_TOO_LARGE = 'Размер файла не должен превышать {size} МБ'
+    REMINDER = 'Напоминание в {time} для {recipient}'
+    PREVIEW_AUDIENCE = 'Размер аудитории'
+    AUDIENCE = 'Пользователей в выборке: {total} ({platforms})'
+    STATS_WATERMARK = 'Статистика учтена до {answered}'
+    SUBSCRIBED = 'Подписка'
+    UNSUBSCRIBED = 'Отписка'
+    SUBSCRIPTION = '{action}: {user}, {date:%d.%m.%Y %H:%M}'
 
 
 class ButtonLabels:
     START = 'Начать'
     ANSWER = 'Ответить на вопрос'
+    ANSWER_BATCH = 'Ответить на несколько'
+    NEXT_BATCH = 'Следующие вопросы'
     CANCEL = 'Отмена'
     BLOCK = 'Заблокировать'
     CONFIRM_BLOCK = 'Подтвердить'
@@ -103,10 +165,31 @@ class ChatMessages:
     NO_QUESTIONS = 'Вопросы от пользователей отсутствуют'
     BLOCK_USER = 'Пользователь {platform}#{id} ({role}) заблокирован'
     ANSWER_ACCEPTED = 'Ответ принят. Следующий вопрос:'
+    QUESTION_BATCH = (
+        'Чтобы ответить на конкретный вопрос, ответьте на его сообщение или '
+        'начните ответ с его номера (#123). Ответ без номера получит первый '
+        'неотвеченный вопрос списка.'
+    )
+    AMBIGUOUS_REPLY = (
+        'В цитате несколько вопросов. Ответьте на сообщение с одним вопросом '
+        'или начните ответ с его номера (#123)'
+    )
+    BATCH_ANSWER_ACCEPTED = (
+        'Ответ на вопрос #{question_id} принят. Осталось в списке: '
+        '{remaining}'
+    )
+    QUESTION_CLOSED = 'На вопрос #{question_id} уже ответили'
+    QUESTION_NOT_IN_BATCH = (
+        'Вопроса #{question_id} нет в списке или на него уже ответили'
+    )
     UNKNOWN_COMMAND = 'Неизвестная команда. Пожалуйста, пользуйтесь меню'
     QUESTION = (
         'Вопрос #{question_id} от {user_platform}#{user_id} '
         '({user_role}):\n\n{question}'
     )
+    NEW_QUESTIONS = 'Новые вопросы от пользователей: {count}'
     ANSWER = 'Ответ на Ваш вопрос администратору:\n\n{answer}'
-    NOT_IMPLEMENTED = 'Функционал находится в разработке'
+    AUTO_ANSWER = (
+        'На похожий вопрос администратор уже отвечал:\n\n{answer}'
+    )
+    REMINDER_OFF = 'Напоминание отключено'
@@ -0,0 +1,41 @@
+import os
+import posixpath
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.constants import FILE_CLEANUP_MIN_AGE
+from core.models import InfoButton
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored button files no button refers to. Files changed '
+        'within the last hour are kept, as they may belong to an upload '
+        'in progress.'
+    )
+
+    def handle(self, *args, **options):
+        field = InfoButton._meta.get_field('file')
+        storage = field.storage
+        directory = posixpath.normpath(field.upload_to)
+        used = set(
+            InfoButton.objects.exclude(file='').values_list('file', flat=True)
+        )
+        base = storage.path(directory)
+        deleted = 0
+        for root, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                name = posixpath.join(
+                    directory,
+                    os.path.relpath(path, base).replace(os.sep, '/'),
+                )
+                if (
+                    name not in used
+                    and time.time() - os.path.getmtime(path)
+                    > FILE_CLEANUP_MIN_AGE
+                ):
+                    storage.delete(name)
+                    deleted += 1
+        self.stdout.write(f'Deleted files: {deleted}')
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.settings import BASE_DIR
+from core.constants import Errors, LOAD_TEST_POLL_INTERVAL, Platforms
+from core.fake_api import FakeTelegramServer, FakeVkServer, SimulatedUsers
+
+BOTS = {
+    Platforms.TELEGRAM: (
+        FakeTelegramServer,
+        'telegram_bot',
+        {'TELEGRAM_API_URL': '{url}', 'TELEGRAM_TOKEN': '100:load-test'},
+    ),
+    Platforms.VK: (
+        FakeVkServer,
+        'vk_bot',
+        {'VK_API_URL': '{url}', 'VK_TOKEN': 'load-test', 'VK_GROUP_ID': '1'},
+    ),
+}
+
+
+ISOLATED_VARIABLES = {
+    'HEALTH_PORT': '0',
+    'RECORD_TRAFFIC': 'False',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a bot against a fake platform API with simulated users. '
+        'Users are written to the configured database, so run it against '
+        'a copy of the production database. The bot keeps its journals in '
+        'a temporary directory and does not serve its health status. The '
+        'command fails if the bot exits before the end of the run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'platform', choices=(Platforms.TELEGRAM, Platforms.VK),
+        )
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--duration', type=float, default=60, help='Seconds',
+        )
+        parser.add_argument(
+            '--think-time',
+            type=float,
+            default=5,
+            help='Maximum pause of a user between actions in seconds',
+        )
+        parser.add_argument('--question-rate', type=float, default=0.05)
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Platform API latency in seconds',
+        )
+        parser.add_argument(
+            '--rate-limit',
+            type=int,
+            default=None,
+            help='Platform API calls per second before flood control errors',
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0,
+            help='Share of platform API calls failing with a server error',
+        )
+        parser.add_argument('--port', type=int, default=0)
+
+    def handle(self, *args, **options):
+        server_class, command, variables = BOTS[options['platform']]
+        server = server_class(
+            options['port'],
+            options['latency'],
+            options['rate_limit'],
+            options['failure_rate'],
+        )
+        with TemporaryDirectory() as journal_dir:
+            bot = subprocess.Popen(
+                (sys.executable, BASE_DIR / 'manage.py', command),
+                env=os.environ | ISOLATED_VARIABLES | {
+                    'JOURNAL_DIR': journal_dir,
+                } | {
+                    name: value.format(url=server.api_url)
+                    for name, value in variables.items()
+                },
+            )
+            server.users = SimulatedUsers(
+                options['users'],
+                options['think_time'],
+                options['question_rate'],
+                server.send_update,
+            )
+            started = time.monotonic()
+            try:
+                code = self.wait(bot, started + options['duration'])
+            finally:
+                bot.terminate()
+                bot.wait()
+        duration = time.monotonic() - started
+        report = server.users.get_report(duration)
+        report |= server.get_report()
+        for name, value in report.items():
+            self.stdout.write(f'{name}: {value}')
+        if code is not None:
+            raise CommandError(Errors.LOAD_TEST_BOT.format(
+                code=code, seconds=round(duration, 1),
+            ))
+
+    @staticmethod
+    def wait(bot, deadline):
+        """Returns the exit code of the bot if it exits before `deadline`."""
+        while time.monotonic() < deadline:
+            code = bot.poll()
+            if code is not None:
+                return code
+            time.sleep(LOAD_TEST_POLL_INTERVAL)
+        return None
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.constants import Platforms
+from core.replay import replay_traffic
+
+SPEEDS = {'1x': 1, '10x': 10, 'max': None}
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay recorded traffic against fake platform clients. '
+        'Updates are written to the configured database, so run it '
+        'against a copy of the production database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'platform', choices=(Platforms.TELEGRAM, Platforms.VK),
+        )
+        parser.add_argument('filename')
+        parser.add_argument('--speed', choices=SPEEDS, default='1x')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Simulated platform API latency in seconds',
+        )
+
+    def handle(self, *args, **options):
+        report = replay_traffic(
+            options['platform'],
+            options['filename'],
+            SPEEDS[options['speed']],
+            options['latency'],
+        )
+        for name, value in report.items():
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from itertools import count
+from threading import Lock, Thread
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from backend.settings import BASE_DIR, settings
+from core import core
+from core.constants import (
+    BENCHMARK_USER_ID_OFFSET, Errors, PERCENTILES, Platforms, TEST_USER_IDS,
+)
+from core.models import Question, Role, User
+from core.writer import writer
+
+ADMIN = 'admin'
+BENCHMARK_USER_IDS = (
+    BENCHMARK_USER_ID_OFFSET, BENCHMARK_USER_ID_OFFSET + TEST_USER_IDS - 1,
+)
+WORKERS = (ADMIN, Platforms.TELEGRAM, Platforms.VK)
+MODES = {
+    'default': ('DELETE', 'False'),
+    'wal': ('WAL', 'True'),
+}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = Lock()
+        self.latencies = []
+        self.errors = 0
+
+    def measure(self, function, *args):
+        started = time.monotonic()
+        try:
+            function(*args)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            connection.close()
+            return
+        with self.lock:
+            self.latencies.append(time.monotonic() - started)
+
+    def get_report(self, duration):
+        latencies = np.array(self.latencies or [0]) * 1000
+        return dict(
+            operations=len(self.latencies),
+            errors=self.errors,
+            operations_per_second=round(len(self.latencies) / duration, 1),
+            **{
+                f'latency_p{percentile}_ms': round(float(value), 1)
+                for percentile, value in zip(
+                    PERCENTILES,
+                    np.percentile(latencies, PERCENTILES),
+                )
+            },
+        )
+
+
+def run_bot(platform, stats, deadline, user_ids, role_ids):
+    while time.monotonic() < deadline:
+        user_id = next(user_ids)
+        stats.measure(core.add_user, platform, user_id, role_ids[0])
+        stats.measure(core.subscribe, platform, user_id)
+        stats.measure(
+            core.add_question, platform, user_id, f'Вопрос {user_id}',
+        )
+        stats.measure(core.change_role, platform, user_id, role_ids[-1])
+        stats.measure(core.unsubscribe, platform, user_id)
+    connection.close()
+
+
+def delete_users():
+    User.objects.filter(platform_id__range=BENCHMARK_USER_IDS).delete()
+
+
+def answer_question():
+    with transaction.atomic():
+        question = Question.objects.filter(
+            answered__isnull=True,
+            user__platform_id__range=BENCHMARK_USER_IDS,
+        ).first()
+        if question is not None:
+            question.answer = question.question
+            question.answered = core.now()
+            question.save()
+        User.objects.filter(is_subscribed=True).count()
+
+
+def run_admin(stats, deadline):
+    while time.monotonic() < deadline:
+        stats.measure(answer_question)
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure throughput of the admin and both bots sharing the '
+        'SQLite database, with the default journal and in the WAL mode. '
+        'Benchmark users are written to the configured database and '
+        'deleted afterwards, so run it against a copy of the production '
+        'database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duration', type=float, default=30, help='Seconds per mode',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4, help='Threads per process',
+        )
+        parser.add_argument('--worker', choices=WORKERS)
+
+    def handle(self, *args, **options):
+        if not settings.sqlite:
+            raise CommandError(Errors.SQLITE_BENCHMARK)
+        if options['worker']:
+            self.run_worker(
+                options['worker'], options['duration'], options['threads'],
+            )
+            return
+        try:
+            for mode, (journal_mode, sqlite_wal) in MODES.items():
+                delete_users()
+                connection.close()
+                with sqlite3.connect(BASE_DIR / 'db.sqlite3') as database:
+                    database.execute(f'PRAGMA journal_mode = {journal_mode}')
+                workers = {
+                    worker: subprocess.Popen(
+                        (
+                            sys.executable, BASE_DIR / 'manage.py',
+                            'sqlite_benchmark',
+                            '--worker', worker,
+                            '--duration', str(options['duration']),
+                            '--threads', str(options['threads']),
+                        ),
+                        env=os.environ | {'SQLITE_WAL': sqlite_wal},
+                        stdout=subprocess.PIPE,
+                        text=True,
+                    )
+                    for worker in WORKERS
+                }
+                for worker, process in workers.items():
+                    report = json.loads(
+                        process.communicate()[0].splitlines()[-1]
+                    )
+                    for name, value in report.items():
+                        self.stdout.write(f'{mode}.{worker}.{name}: {value}')
+        finally:
+            delete_users()
+
+    def run_worker(self, worker, duration, threads):
+        stats = Stats()
+        deadline = time.monotonic() + duration
+        if worker == ADMIN:
+            targets = [(run_admin, (stats, deadline))] * threads
+        else:
+            writer.start()
+            role_ids = list(Role.objects.values_list('id', flat=True))
+            user_ids = count(BENCHMARK_USER_ID_OFFSET)
+            targets = [(
+                run_bot, (worker, stats, deadline, user_ids, role_ids),
+            )] * threads
+        started = time.monotonic()
+        pool = [Thread(target=target, args=args) for target, args in targets]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        self.stdout.write(json.dumps(
+            stats.get_report(time.monotonic() - started)
+        ))
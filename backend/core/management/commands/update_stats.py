@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import update_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Update daily statistics rollups'
+
+    def handle(self, *args, **options):
+        update_daily_stats()
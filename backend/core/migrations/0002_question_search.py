@@ -0,0 +1,82 @@
+from django.db import migrations
+
+DOCUMENT = "coalesce(question, '') || ' ' || coalesce(answer, '')"
+
+POSTGRESQL = (
+    (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        None,
+    ),
+    (
+        'CREATE INDEX core_question_fts ON core_question '
+        f"USING gin (to_tsvector('russian', {DOCUMENT}))",
+        'DROP INDEX IF EXISTS core_question_fts',
+    ),
+    (
+        'CREATE INDEX core_question_trigram ON core_question '
+        f'USING gin (({DOCUMENT}) gin_trgm_ops)',
+        'DROP INDEX IF EXISTS core_question_trigram',
+    ),
+)
+
+SQLITE = (
+    (
+        'CREATE VIRTUAL TABLE core_question_fts USING fts5('
+        "question, answer, content='core_question', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        'DROP TABLE IF EXISTS core_question_fts',
+    ),
+    (
+        'CREATE TRIGGER core_question_fts_insert AFTER INSERT ON core_question '
+        'BEGIN INSERT INTO core_question_fts(rowid, question, answer) '
+        'VALUES (new.id, new.question, new.answer); END',
+        'DROP TRIGGER IF EXISTS core_question_fts_insert',
+    ),
+    (
+        'CREATE TRIGGER core_question_fts_delete AFTER DELETE ON core_question '
+        'BEGIN INSERT INTO core_question_fts'
+        '(core_question_fts, rowid, question, answer) '
+        "VALUES ('delete', old.id, old.question, old.answer); END",
+        'DROP TRIGGER IF EXISTS core_question_fts_delete',
+    ),
+    (
+        'CREATE TRIGGER core_question_fts_update AFTER UPDATE OF question, '
+        'answer ON core_question BEGIN INSERT INTO core_question_fts'
+        '(core_question_fts, rowid, question, answer) '
+        "VALUES ('delete', old.id, old.question, old.answer); "
+        'INSERT INTO core_question_fts(rowid, question, answer) '
+        'VALUES (new.id, new.question, new.answer); END',
+        'DROP TRIGGER IF EXISTS core_question_fts_update',
+    ),
+    (
+        "INSERT INTO core_question_fts(core_question_fts) VALUES ('rebuild')",
+        None,
+    ),
+)
+
+STATEMENTS = {
+    'postgresql': POSTGRESQL,
+    'sqlite': SQLITE,
+}
+
+
+def create_search_index(apps, schema_editor):
+    for sql, _ in STATEMENTS.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for _, sql in reversed(STATEMENTS.get(schema_editor.connection.vendor, ())):
+        if sql:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.8 on 2026-10-19 14:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_question_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_id', models.BigIntegerField(blank=True, null=True)),
+                ('answered', models.DateTimeField(blank=True, null=True)),
+                ('date_subscribed', models.DateTimeField(blank=True, null=True)),
+                ('date_unsubscribed', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='date_unsubscribed',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='дата отписки'),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='answered',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='дата и время ответа'),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='дата и время публикации'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='date_subscribed',
+            field=models.DateTimeField(blank=True, db_index=True, default=None, null=True, verbose_name='дата подписки'),
+        ),
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='дата')),
+                ('platform', models.CharField(choices=[('tg', 'Telegram'), ('vk', 'VK')], max_length=2, verbose_name='платформа')),
+                ('questions_asked', models.PositiveIntegerField(default=0, verbose_name='задано вопросов')),
+                ('questions_answered', models.PositiveIntegerField(default=0, verbose_name='отвечено вопросов')),
+                ('median_answer_time', models.DurationField(blank=True, null=True, verbose_name='медианное время ответа')),
+                ('p90_answer_time', models.DurationField(blank=True, null=True, verbose_name='время ответа (90-й перцентиль)')),
+                ('new_subscribers', models.PositiveIntegerField(default=0, verbose_name='новых подписчиков')),
+                ('unsubscribes', models.PositiveIntegerField(default=0, verbose_name='отписок')),
+                ('role', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.role', verbose_name='роль')),
+            ],
+            options={
+                'verbose_name': 'статистика за день',
+                'verbose_name_plural': 'статистика по дням',
+                'ordering': ('-date', 'platform', 'role'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailystats',
+            constraint=models.UniqueConstraint(fields=('date', 'platform', 'role'), name='unique_daily_stats'),
+        ),
+    ]
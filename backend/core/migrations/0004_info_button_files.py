@@ -0,0 +1,55 @@
+# Generated by Django 4.2.8 on 2026-10-19 15:02
+
+import os
+
+import core.files
+from django.db import migrations, models
+
+
+def fill_file_checksums(apps, schema_editor):
+    InfoButton = apps.get_model('core', 'InfoButton')
+    for button in InfoButton.objects.exclude(file='').exclude(file=None):
+        try:
+            with button.file.open('rb') as file:
+                button.checksum = core.files.get_checksum(file)
+            button.file_size = button.file.size
+        except OSError:
+            continue
+        button.file_name = os.path.basename(button.file.name)
+        button.save(update_fields=('file_name', 'file_size', 'checksum'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='infobutton',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='контрольная сумма'),
+        ),
+        migrations.AddField(
+            model_name='infobutton',
+            name='file_metadata',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='метаданные файла'),
+        ),
+        migrations.AddField(
+            model_name='infobutton',
+            name='file_name',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='имя файла'),
+        ),
+        migrations.AddField(
+            model_name='infobutton',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name='размер файла'),
+        ),
+        migrations.AlterField(
+            model_name='infobutton',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=core.files.ContentAddressedStorage(), upload_to='files/', validators=[core.files.validate_file_size], verbose_name='файл'),
+        ),
+        migrations.RunPython(fill_file_checksums, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.8 on 2026-10-19 15:24
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_info_button_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderbutton',
+            name='time',
+            field=models.TimeField(default=datetime.time(10, 0), verbose_name='время напоминания'),
+        ),
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(verbose_name='текст')),
+                ('time', models.TimeField(verbose_name='время')),
+                ('is_active', models.BooleanField(default=True, verbose_name='активно')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='время создания')),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True, verbose_name='время изменения')),
+                ('telegram', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='отправлено в Telegram')),
+                ('vk', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='отправлено в VK')),
+                ('button', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='core.reminderbutton', verbose_name='кнопка')),
+                ('role', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='core.role', verbose_name='роль')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='core.user', verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'напоминание',
+                'verbose_name_plural': 'напоминания',
+                'ordering': ('time',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reminder',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('role__isnull', True), ('user__isnull', False)), models.Q(('role__isnull', False), ('user__isnull', True)), _connector='OR'), name='reminder_user_or_role'),
+        ),
+        migrations.AddConstraint(
+            model_name='reminder',
+            constraint=models.UniqueConstraint(fields=('user', 'button'), name='unique_user_reminder'),
+        ),
+    ]
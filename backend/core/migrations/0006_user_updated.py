@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_reminders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='время изменения'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.8 on 2026-10-19 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def log_subscriptions(apps, schema_editor):
+    """Seeds the log with the last subscription dates of every user.
+
+    Events the rollups have already counted stay behind the watermark.
+    """
+    User = apps.get_model('core', 'User')
+    Subscription = apps.get_model('core', 'Subscription')
+    StatsWatermark = apps.get_model('core', 'StatsWatermark')
+    watermark = StatsWatermark.objects.filter(pk=1).first()
+    for is_subscribed, field, mark in (
+        (True, 'date_subscribed', 'subscription_id'),
+        (False, 'date_unsubscribed', 'unsubscription_id'),
+    ):
+        Subscription.objects.bulk_create(
+            Subscription(user_id=user_id, is_subscribed=is_subscribed, date=date)
+            for user_id, date in User.objects.filter(
+                **{f'{field}__isnull': False},
+            ).order_by(field, 'id').values_list('id', field)
+        )
+        if watermark is None or getattr(watermark, field) is None:
+            continue
+        setattr(watermark, mark, Subscription.objects.filter(
+            is_subscribed=is_subscribed,
+            date__lte=getattr(watermark, field),
+        ).aggregate(value=models.Max('id'))['value'])
+    if watermark is not None:
+        watermark.save()
+
+
+def delete_orphaned_stats(apps, schema_editor):
+    apps.get_model('core', 'DailyStats').objects.filter(
+        role__isnull=True,
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_subscribed', models.BooleanField()),
+                ('date', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='core.user')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='statswatermark',
+            name='subscription_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='statswatermark',
+            name='unsubscription_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(log_subscriptions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='statswatermark',
+            name='date_subscribed',
+        ),
+        migrations.RemoveField(
+            model_name='statswatermark',
+            name='date_unsubscribed',
+        ),
+        migrations.RunPython(delete_orphaned_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailystats',
+            name='role',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.role', verbose_name='роль'),
+        ),
+    ]
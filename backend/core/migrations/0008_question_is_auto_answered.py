@@ -0,0 +1,26 @@
+# Generated by Django 4.2.8 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+def mark_auto_answers(apps, schema_editor):
+    """Auto-answers are the only questions sent as they are answered."""
+    apps.get_model('core', 'Question').objects.filter(
+        answered__isnull=False, answer_sent=models.F('answered'),
+    ).update(is_auto_answered=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='is_auto_answered',
+            field=models.BooleanField(default=False, verbose_name='ответ дан автоматически'),
+        ),
+        migrations.RunPython(mark_auto_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_question_is_auto_answered'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, default=None, null=True, verbose_name='дата и время взятия в работу'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=64, verbose_name='в работе у администратора'),
+        ),
+    ]
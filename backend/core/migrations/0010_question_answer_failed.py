@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-19 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_question_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answer_failed',
+            field=models.BooleanField(default=False, verbose_name='ответ не удалось доставить'),
+        ),
+    ]
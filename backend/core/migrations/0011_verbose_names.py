@@ -0,0 +1,57 @@
+# Generated by Django 4.2.8 on 2026-10-19 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_question_answer_failed'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='statswatermark',
+            options={'verbose_name': 'отметка статистики', 'verbose_name_plural': 'отметки статистики'},
+        ),
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'verbose_name': 'подписка или отписка', 'verbose_name_plural': 'подписки и отписки'},
+        ),
+        migrations.AlterField(
+            model_name='statswatermark',
+            name='answered',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='время последнего учтённого ответа'),
+        ),
+        migrations.AlterField(
+            model_name='statswatermark',
+            name='question_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='последний учтённый вопрос'),
+        ),
+        migrations.AlterField(
+            model_name='statswatermark',
+            name='subscription_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='последняя учтённая подписка'),
+        ),
+        migrations.AlterField(
+            model_name='statswatermark',
+            name='unsubscription_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='последняя учтённая отписка'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='date',
+            field=models.DateTimeField(verbose_name='дата и время'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='is_subscribed',
+            field=models.BooleanField(verbose_name='подписка'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='core.user', verbose_name='пользователь'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from datetime import time
 from itertools import chain
 from operator import attrgetter
 
@@ -7,7 +8,9 @@ from django.db import models
 from backend.settings import FILES_URL
 from core.constants import (
     BUTTON_MAX_LENGTH, PLATFORMS, PLATFORMS_VERBOSE, Platforms,
+    REMINDER_DEFAULT_HOUR,
 )
+from core.files import ContentAddressedStorage, validate_file_size
 from core.localization import AdminPanel, Defaults, VerboseNames
 
 PLATFORM_MAX_LENGTH = max(len(platform) for platform, _ in PLATFORMS)
@@ -117,9 +120,36 @@ class InfoButton(BasicButton):
     file = models.FileField(
         VerboseNames.Buttons.FILE,
         upload_to=FILES_URL,
+        storage=ContentAddressedStorage(),
+        validators=(validate_file_size,),
         blank=True,
         null=True,
     )
+    file_name = models.CharField(
+        VerboseNames.Buttons.FILE_NAME,
+        max_length=255,
+        blank=True,
+        editable=False,
+    )
+    file_size = models.PositiveBigIntegerField(
+        VerboseNames.Buttons.FILE_SIZE,
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    file_metadata = models.JSONField(
+        VerboseNames.Buttons.FILE_METADATA,
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    checksum = models.CharField(
+        VerboseNames.Buttons.CHECKSUM,
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
 
     class Meta(BasicButton.Meta):
         verbose_name = VerboseNames.Buttons.INFO
@@ -153,6 +183,10 @@ class SubButton(GenericButton):
 
 class ReminderButton(BasicButton):
     text = models.TextField(VerboseNames.Buttons.REMINDER_TEXT)
+    time = models.TimeField(
+        VerboseNames.Buttons.REMINDER_TIME,
+        default=time(REMINDER_DEFAULT_HOUR),
+    )
 
     class Meta(BasicButton.Meta):
         verbose_name = VerboseNames.Buttons.REMINDER
@@ -186,11 +220,24 @@ class User(models.Model):
         blank=True,
         null=True,
         default=None,
+        db_index=True,
+    )
+    date_unsubscribed = models.DateTimeField(
+        VerboseNames.User.DATE_UNSUBSCRIBED,
+        blank=True,
+        null=True,
+        default=None,
+        db_index=True,
     )
     is_blocked = models.BooleanField(
         VerboseNames.User.IS_BLOCKED,
         default=False,
     )
+    updated = models.DateTimeField(
+        VerboseNames.UPDATED,
+        auto_now=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = VerboseNames.User.USER
@@ -206,6 +253,81 @@ class User(models.Model):
         return f'{PLATFORMS_VERBOSE[self.platform]}#{self.platform_id}'
 
 
+class Reminder(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseNames.Reminder.USER,
+        related_name='reminders',
+        blank=True,
+        null=True,
+    )
+    role = models.ForeignKey(
+        Role,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseNames.Reminder.ROLE,
+        related_name='reminders',
+        blank=True,
+        null=True,
+    )
+    button = models.ForeignKey(
+        ReminderButton,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseNames.Reminder.BUTTON,
+        related_name='reminders',
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    text = models.TextField(VerboseNames.Reminder.TEXT)
+    time = models.TimeField(VerboseNames.Reminder.TIME)
+    is_active = models.BooleanField(
+        VerboseNames.Reminder.IS_ACTIVE,
+        default=True,
+    )
+    created = models.DateTimeField(VerboseNames.CREATED, auto_now_add=True)
+    updated = models.DateTimeField(
+        VerboseNames.UPDATED,
+        auto_now=True,
+        db_index=True,
+    )
+    telegram = models.DateTimeField(
+        VerboseNames.Reminder.SENT.format(platform=Platforms.TELEGRAM_FULL),
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    vk = models.DateTimeField(
+        VerboseNames.Reminder.SENT.format(platform=Platforms.VK_FULL),
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
+    class Meta:
+        verbose_name = VerboseNames.Reminder.REMINDER
+        verbose_name_plural = VerboseNames.Reminder.REMINDERS
+        ordering = ('time',)
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(user__isnull=False, role__isnull=True)
+                    | models.Q(user__isnull=True, role__isnull=False)
+                ),
+                name='reminder_user_or_role',
+            ),
+            models.UniqueConstraint(
+                fields=('user', 'button'),
+                name='unique_user_reminder',
+            ),
+        ]
+
+    def __str__(self):
+        return AdminPanel.REMINDER.format(
+            time=self.time, recipient=self.user or self.role,
+        )
+
+
 class Question(models.Model):
     user = models.ForeignKey(
         User,
@@ -218,12 +340,14 @@ class Question(models.Model):
     created = models.DateTimeField(
         VerboseNames.Question.CREATED,
         auto_now_add=True,
+        db_index=True,
     )
     answered = models.DateTimeField(
         VerboseNames.Question.CLOSED,
         blank=True,
         null=True,
         default=None,
+        db_index=True,
     )
     answer_sent = models.DateTimeField(
         VerboseNames.Question.ANSWER_SENT,
@@ -231,6 +355,25 @@ class Question(models.Model):
         null=True,
         default=None,
     )
+    is_auto_answered = models.BooleanField(
+        VerboseNames.Question.IS_AUTO_ANSWERED,
+        default=False,
+    )
+    answer_failed = models.BooleanField(
+        VerboseNames.Question.ANSWER_FAILED,
+        default=False,
+    )
+    claimed_by = models.CharField(
+        VerboseNames.Question.CLAIMED_BY,
+        max_length=64,
+        blank=True,
+    )
+    claimed_at = models.DateTimeField(
+        VerboseNames.Question.CLAIMED_AT,
+        blank=True,
+        null=True,
+        default=None,
+    )
 
     class Meta:
         verbose_name = VerboseNames.Question.QUESTION
@@ -256,3 +399,114 @@ class MenuUpdate(models.Model):
 
     def __str__(self):
         return f'{self.__class__.__name__}#{self.id}'
+
+
+class DailyStats(models.Model):
+    date = models.DateField(VerboseNames.DailyStats.DATE)
+    platform = models.CharField(
+        VerboseNames.DailyStats.PLATFORM,
+        choices=PLATFORMS,
+        max_length=PLATFORM_MAX_LENGTH,
+    )
+    role = models.ForeignKey(
+        Role,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseNames.DailyStats.ROLE,
+    )
+    questions_asked = models.PositiveIntegerField(
+        VerboseNames.DailyStats.QUESTIONS_ASKED,
+        default=0,
+    )
+    questions_answered = models.PositiveIntegerField(
+        VerboseNames.DailyStats.QUESTIONS_ANSWERED,
+        default=0,
+    )
+    median_answer_time = models.DurationField(
+        VerboseNames.DailyStats.MEDIAN_ANSWER_TIME,
+        blank=True,
+        null=True,
+    )
+    p90_answer_time = models.DurationField(
+        VerboseNames.DailyStats.P90_ANSWER_TIME,
+        blank=True,
+        null=True,
+    )
+    new_subscribers = models.PositiveIntegerField(
+        VerboseNames.DailyStats.NEW_SUBSCRIBERS,
+        default=0,
+    )
+    unsubscribes = models.PositiveIntegerField(
+        VerboseNames.DailyStats.UNSUBSCRIBES,
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = VerboseNames.DailyStats.DAILY_STATS
+        verbose_name_plural = VerboseNames.DailyStats.DAILY_STATS_PLURAL
+        ordering = ('-date', 'platform', 'role')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('date', 'platform', 'role'),
+                name='unique_daily_stats',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {PLATFORMS_VERBOSE[self.platform]} {self.role}'
+
+
+class StatsWatermark(models.Model):
+    question_id = models.BigIntegerField(
+        VerboseNames.StatsWatermark.QUESTION_ID,
+        blank=True,
+        null=True,
+    )
+    answered = models.DateTimeField(
+        VerboseNames.StatsWatermark.ANSWERED,
+        blank=True,
+        null=True,
+    )
+    subscription_id = models.BigIntegerField(
+        VerboseNames.StatsWatermark.SUBSCRIPTION_ID,
+        blank=True,
+        null=True,
+    )
+    unsubscription_id = models.BigIntegerField(
+        VerboseNames.StatsWatermark.UNSUBSCRIPTION_ID,
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = VerboseNames.StatsWatermark.STATS_WATERMARK
+        verbose_name_plural = VerboseNames.StatsWatermark.STATS_WATERMARKS
+
+    def __str__(self):
+        return AdminPanel.STATS_WATERMARK.format(answered=self.answered)
+
+
+class Subscription(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseNames.Subscription.USER,
+        related_name='subscriptions',
+    )
+    is_subscribed = models.BooleanField(
+        VerboseNames.Subscription.IS_SUBSCRIBED,
+    )
+    date = models.DateTimeField(VerboseNames.Subscription.DATE)
+
+    class Meta:
+        verbose_name = VerboseNames.Subscription.SUBSCRIPTION
+        verbose_name_plural = VerboseNames.Subscription.SUBSCRIPTIONS
+
+    def __str__(self):
+        return AdminPanel.SUBSCRIPTION.format(
+            action=(
+                AdminPanel.SUBSCRIBED if self.is_subscribed
+                else AdminPanel.UNSUBSCRIBED
+            ),
+            user=self.user,
+            date=self.date,
+        )
@@ -0,0 +1,261 @@
+import heapq
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import count
+from threading import Condition, Lock, Thread
+
+from backend.settings import OUTBOX_FILENAME, get_logger, log_context
+from core.constants import (
+    DELIVERY_WORKERS, Errors, MESSAGES_PER_SECOND, OUTBOX_BACKOFF,
+    OUTBOX_COMPACT_RECORDS, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_BACKOFF,
+    OUTBOX_SENT_KEYS, PLATFORMS_VERBOSE,
+)
+from core.tracing import SpanKinds, tracer
+
+
+class Priorities:
+    INTERACTIVE = 0
+    ANSWER = 1
+    BROADCAST = 2
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.lock = Lock()
+        self.next_call = 0
+
+    def wait(self):
+        with self.lock:
+            current = time.monotonic()
+            delay = self.next_call - current
+            self.next_call = max(self.next_call, current) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Outbox:
+    """Persistent priority queue of outgoing messages of a bot.
+
+    Messages to the same chat are sent in the order they were added, chats
+    are served by priority. Every message has an idempotency key: a message
+    with the key of a pending or recently sent one is not sent twice.
+    Failed messages are retried with exponential backoff, or after the
+    delay requested by the platform, in which case the whole outbox pauses.
+
+    `send` is called with the method and params of a message and returns
+    nothing, `get_retry_delay` is called with the raised exception and
+    returns a `(delay, pause_all)` tuple, or `None` if the message cannot
+    be delivered. The `callback` of a message is called once it is sent,
+    its `failure_callback` once it turns out it cannot be delivered.
+    """
+
+    def __init__(self, platform, send, get_retry_delay, filename=None):
+        self.send_now = send
+        self.get_retry_delay = get_retry_delay
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.rate_limiter = RateLimiter(MESSAGES_PER_SECOND[platform])
+        self.condition = Condition()
+        self.sequence = count()
+        self.ready = []
+        self.delayed = []
+        self.chats = {}
+        self.busy_chats = set()
+        self.pending = {}
+        self.callbacks = {}
+        self.failure_callbacks = {}
+        self.sent = OrderedDict()
+        self.paused_until = 0
+        self.records = 0
+        self.journal = open(
+            filename or OUTBOX_FILENAME.format(platform=platform), 'a+',
+        )
+        self.replay()
+        for _ in range(DELIVERY_WORKERS):
+            Thread(target=self.run, daemon=True).start()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def send(
+        self, chat_id, method, params, priority=Priorities.INTERACTIVE,
+        key=None, callback=None, failure_callback=None, fallback=None,
+        error=None,
+    ):
+        message = dict(
+            key=key or uuid.uuid4().hex,
+            chat_id=chat_id,
+            method=method,
+            params=params,
+            priority=priority,
+            fallback=fallback,
+            error=error,
+            trace=tracer.get_context(),
+        )
+        with self.condition:
+            if message['key'] in self.sent:
+                if callback:
+                    callback()
+                return
+            if message['key'] not in self.pending:
+                self.write_record(add=message)
+                self.add(message)
+            if callback:
+                self.callbacks[message['key']] = callback
+            if failure_callback:
+                self.failure_callbacks[message['key']] = failure_callback
+
+    def add(self, message):
+        message.setdefault('attempt', 0)
+        message.setdefault('due', 0)
+        self.pending[message['key']] = message
+        chat = self.chats.setdefault(message['chat_id'], deque())
+        chat.append(message)
+        if len(chat) == 1 and message['chat_id'] not in self.busy_chats:
+            self.push(message)
+
+    def push(self, message):
+        if message['due'] > time.monotonic():
+            heapq.heappush(
+                self.delayed, (message['due'], next(self.sequence), message),
+            )
+        else:
+            heapq.heappush(
+                self.ready,
+                (message['priority'], next(self.sequence), message),
+            )
+        self.condition.notify()
+
+    def write_record(self, **record):
+        self.journal.write(json.dumps(record) + '\n')
+        self.journal.flush()
+        self.records += 1
+
+    def replay(self):
+        self.journal.seek(0)
+        messages = OrderedDict()
+        for line in self.journal:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'add' in record:
+                messages[record['add']['key']] = record['add']
+            else:
+                messages.pop(record['done'], None)
+        with self.condition:
+            for message in messages.values():
+                message['due'] = 0
+                self.add(message)
+            self.compact()
+
+    def compact(self):
+        self.journal.seek(0)
+        self.journal.truncate()
+        self.records = 0
+        for message in self.pending.values():
+            self.write_record(add=message)
+
+    def take(self):
+        with self.condition:
+            while True:
+                current = time.monotonic()
+                while self.delayed and self.delayed[0][0] <= current:
+                    message = heapq.heappop(self.delayed)[-1]
+                    heapq.heappush(
+                        self.ready,
+                        (message['priority'], next(self.sequence), message),
+                    )
+                if self.paused_until > current:
+                    wait = self.paused_until - current
+                elif self.ready:
+                    message = heapq.heappop(self.ready)[-1]
+                    self.busy_chats.add(message['chat_id'])
+                    return message
+                elif self.delayed:
+                    wait = self.delayed[0][0] - current
+                else:
+                    wait = None
+                self.condition.wait(wait)
+
+    def run(self):
+        while True:
+            message = self.take()
+            self.rate_limiter.wait()
+            with log_context(
+                chat_id=message['chat_id'],
+                method=message['method'],
+                key=message['key'],
+            ):
+                self.deliver(message)
+
+    def deliver(self, message):
+        try:
+            with tracer.trace(
+                message['method'],
+                message.get('trace'),
+                SpanKinds.CLIENT,
+                chat_id=message['chat_id'],
+                attempt=message['attempt'],
+            ):
+                self.send_now(message['method'], message['params'])
+        except Exception as error:
+            self.retry(message, error)
+        else:
+            self.done(message, sent=True)
+
+    def retry(self, message, error):
+        retry = self.get_retry_delay(error)
+        message['attempt'] += 1
+        if retry is None or message['attempt'] >= OUTBOX_MAX_ATTEMPTS:
+            self.logger.error(message['error'] or Errors.OUTBOX.format(
+                method=message['method'],
+                chat_id=message['chat_id'],
+                error=error,
+            ))
+            self.done(message, sent=False, failed=retry is None)
+            if message['fallback']:
+                self.send(
+                    message['chat_id'], message['method'],
+                    message['fallback'], message['priority'],
+                )
+            return
+        delay, pause_all = retry
+        if delay is None:
+            delay = min(
+                OUTBOX_BACKOFF * 2 ** (message['attempt'] - 1),
+                OUTBOX_MAX_BACKOFF,
+            )
+        with self.condition:
+            message['due'] = time.monotonic() + delay
+            if pause_all:
+                self.paused_until = max(self.paused_until, message['due'])
+            self.busy_chats.discard(message['chat_id'])
+            self.push(message)
+
+    def done(self, message, sent, failed=False):
+        with self.condition:
+            key = message['key']
+            chat = self.chats[message['chat_id']]
+            chat.popleft()
+            if chat:
+                chat[0]['due'] = 0
+                self.push(chat[0])
+            else:
+                del self.chats[message['chat_id']]
+            self.busy_chats.discard(message['chat_id'])
+            del self.pending[key]
+            callback = self.callbacks.pop(key, None)
+            failure_callback = self.failure_callbacks.pop(key, None)
+            if sent:
+                self.sent[key] = True
+                if len(self.sent) > OUTBOX_SENT_KEYS:
+                    self.sent.popitem(last=False)
+            self.write_record(done=key)
+            if not self.pending or self.records > OUTBOX_COMPACT_RECORDS:
+                self.compact()
+        if sent and callback:
+            callback()
+        if failed and failure_callback:
+            failure_callback()
@@ -0,0 +1,194 @@
+import heapq
+import time
+from datetime import datetime, timedelta
+from threading import Condition, Thread
+from zoneinfo import ZoneInfo
+
+from django.db import connection
+from django.db.models import Q
+
+from backend.settings import TIME_ZONE, get_logger
+from core.constants import (
+    Errors, PLATFORMS_VERBOSE, Pooling, REMINDER_BATCH, REMINDER_CATCH_UP,
+    REMINDERS_SENT,
+)
+from core.models import Reminder
+from core.outbox import Priorities
+from core.writer import serialized
+
+ZONE = ZoneInfo(TIME_ZONE)
+
+
+@serialized
+def mark_sent(field, reminder_ids):
+    Reminder.objects.filter(id__in=reminder_ids).update(
+        **{field: datetime.now()}
+    )
+
+
+def get_timestamp(moment):
+    """Converts naive local time to a timestamp.
+
+    A wall-clock time skipped by a forward DST transition is shifted forward
+    by the transition, one repeated by a backward transition is taken at
+    its first occurrence.
+    """
+    return moment.replace(tzinfo=ZONE).timestamp()
+
+
+def get_next_run(reminder_time, after):
+    """Returns the timestamp of the first `reminder_time` after `after`."""
+    day = datetime.fromtimestamp(after, ZONE).date()
+    while True:
+        timestamp = get_timestamp(datetime.combine(day, reminder_time))
+        if timestamp > after:
+            return timestamp
+        day += timedelta(days=1)
+
+
+class ReminderEngine:
+    """Sends reminders of a platform when they are due.
+
+    Active reminders are loaded once into a min-heap keyed by their next
+    run, so the engine thread sleeps until the earliest one is due and
+    takes O(log n) to schedule a reminder. Changed reminders are picked up
+    by `sync` by their update time. The outdated heap entry of a
+    rescheduled or deactivated reminder is left in place and skipped when
+    popped.
+
+    Due reminders are sent in batches of up to `REMINDER_BATCH` through the
+    outbox of the bot, and their send time is stored per platform. After a
+    downtime every reminder missed within `REMINDER_CATCH_UP` seconds is
+    sent once, older runs are skipped.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.field = REMINDERS_SENT[bot.platform]
+        self.logger = get_logger(PLATFORMS_VERBOSE[bot.platform].lower())
+        self.condition = Condition()
+        self.heap = []
+        self.reminders = {}
+        self.updated = None
+
+    def get_queryset(self):
+        return Reminder.objects.filter(
+            Q(role__isnull=False) | Q(user__platform=self.bot.platform),
+        )
+
+    def start(self):
+        self.sync()
+        Thread(target=self.run, daemon=True).start()
+
+    def sync(self):
+        reminders = self.get_queryset()
+        if self.updated is not None:
+            reminders = reminders.filter(updated__gt=self.updated)
+        else:
+            reminders = reminders.filter(is_active=True)
+        rows = list(reminders.values_list(
+            'id', 'time', 'is_active', 'created', 'updated', self.field,
+        ))
+        if not rows:
+            if self.updated is None:
+                self.updated = datetime.min
+            return
+        current = time.time()
+        with self.condition:
+            entries = []
+            for reminder_id, reminder_time, is_active, created, _, sent in (
+                rows
+            ):
+                if not is_active:
+                    self.reminders.pop(reminder_id, None)
+                    continue
+                reminder = self.reminders.get(reminder_id)
+                if reminder is not None and reminder[0] == reminder_time:
+                    continue
+                due = get_next_run(
+                    reminder_time,
+                    max(
+                        get_timestamp(sent or created),
+                        current - REMINDER_CATCH_UP,
+                    ),
+                )
+                self.reminders[reminder_id] = (reminder_time, due)
+                entries.append((due, reminder_id))
+            if self.heap:
+                for entry in entries:
+                    heapq.heappush(self.heap, entry)
+            else:
+                self.heap = entries
+                heapq.heapify(self.heap)
+            self.updated = max(updated for _, _, _, _, updated, _ in rows)
+            self.condition.notify()
+
+    def take(self):
+        with self.condition:
+            while True:
+                current = time.time()
+                batch = []
+                while (
+                    self.heap
+                    and self.heap[0][0] <= current
+                    and len(batch) < REMINDER_BATCH
+                ):
+                    due, reminder_id = heapq.heappop(self.heap)
+                    reminder = self.reminders.get(reminder_id)
+                    if reminder is not None and reminder[1] == due:
+                        batch.append((reminder_id, due))
+                if batch:
+                    return batch
+                self.condition.wait(
+                    min(self.heap[0][0] - current, Pooling.REMINDERS)
+                    if self.heap else Pooling.REMINDERS
+                )
+
+    def run(self):
+        while True:
+            batch = self.take()
+            try:
+                self.send(batch)
+            except Exception as error:
+                self.logger.error(Errors.REMINDERS.format(
+                    count=len(batch), error=error,
+                ))
+                connection.close()
+            self.reschedule(batch)
+
+    def send(self, batch):
+        dues = dict(batch)
+        sent = []
+        for reminder_id, text, role_id, user_id, is_blocked in (
+            Reminder.objects.filter(
+                id__in=dues, is_active=True,
+            ).values_list(
+                'id', 'text', 'role_id', 'user__platform_id',
+                'user__is_blocked',
+            )
+        ):
+            if role_id is not None:
+                recipients = list(self.bot.subscribers.get(role_id, ()))
+            else:
+                recipients = [] if is_blocked else [user_id]
+            key = f'reminder#{reminder_id}#{dues[reminder_id]:.0f}'
+            for recipient in recipients:
+                self.bot.send_message(
+                    recipient,
+                    text,
+                    priority=Priorities.BROADCAST,
+                    key=f'{key}#{recipient}',
+                )
+            sent.append(reminder_id)
+        if sent:
+            mark_sent(self.field, sent)
+
+    def reschedule(self, batch):
+        with self.condition:
+            for reminder_id, due in batch:
+                reminder = self.reminders.get(reminder_id)
+                if reminder is None or reminder[1] != due:
+                    continue
+                next_run = get_next_run(reminder[0], due)
+                self.reminders[reminder_id] = (reminder[0], next_run)
+                heapq.heappush(self.heap, (next_run, reminder_id))
@@ -0,0 +1,297 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from itertools import count
+from threading import Lock
+from types import SimpleNamespace
+
+import numpy as np
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.utils.timezone import now
+from vk_api.bot_longpoll import VkBotEventType
+
+from core.constants import (
+    PERCENTILES, Platforms, REPLAY_DRAIN_TIMEOUT, REPLAY_USER_ID_OFFSET,
+)
+from core.models import Role, User
+from core.telegram_bot import TelegramBot
+from core.throttle import Throttle
+from core.traffic import Updates
+from core.vk_bot import VKBot
+
+
+class ReplayStats:
+    """Counts the updates, messages and queries of a replay.
+
+    Queries are counted on every connection of the process once
+    `counting` is set, including the ones of the writer and the outbox.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counting = False
+        self.updates = 0
+        self.errors = 0
+        self.latencies = []
+        self.queries = 0
+        self.db_time = 0
+        self.sent = 0
+        self.duration = 0
+        self.drain_time = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        if not self.counting:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.queries += 1
+                self.db_time += time.perf_counter() - started
+
+    def watch(self, sender, connection, **kwargs):
+        if self.count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self.count_query)
+
+    def get_report(self):
+        latencies = np.array(self.latencies or [0]) * 1000
+        return dict(
+            updates=self.updates,
+            errors=self.errors,
+            duration=round(self.duration, 3),
+            throughput=round(self.updates / (self.duration or 1), 1),
+            **{
+                f'latency_p{percentile}_ms': round(float(value), 2)
+                for percentile, value in zip(
+                    PERCENTILES,
+                    np.percentile(latencies, PERCENTILES),
+                )
+            },
+            latency_max_ms=round(float(latencies.max()), 2),
+            queries=self.queries,
+            queries_per_update=round(
+                self.queries / (self.updates or 1), 2,
+            ),
+            db_time=round(self.db_time, 3),
+            messages_sent=self.sent,
+            drain_time=round(self.drain_time, 3),
+        )
+
+
+class FakeTelegramClient:
+    def __init__(self, stats, latency=0):
+        self.stats = stats
+        self.latency = latency
+        self.message_ids = count(1)
+
+    def send(self, **params):
+        time.sleep(self.latency)
+        self.stats.sent += 1
+        message_id = next(self.message_ids)
+        return SimpleNamespace(
+            message_id=message_id,
+            document=SimpleNamespace(file_id=f'file{message_id}'),
+        )
+
+    send_message = send
+
+    def send_document(self, document, **params):
+        return self.send(**params)
+
+
+class FakeVkClient:
+    def __init__(self, stats, latency=0):
+        self.stats = stats
+        self.latency = latency
+
+    def method(self, method, values=None):
+        time.sleep(self.latency)
+        self.stats.sent += 1
+        return 1
+
+
+def get_temporary_filename():
+    descriptor, filename = tempfile.mkstemp(suffix='.jsonl')
+    os.close(descriptor)
+    return filename
+
+
+class ReplayMixin:
+    """Runs a bot against a fake platform client.
+
+    The outbox and write-behind journals are kept in temporary files, no
+    traffic is recorded and inbound updates are not throttled, so replay
+    does not interfere with a running bot and time-compressed traffic is
+    not dropped.
+    """
+
+    def __init__(self, platform, client):
+        self.client = client
+        super().__init__(platform)
+        self.throttle = Throttle(platform, {}, None)
+
+    def start_recorder(self):
+        pass
+
+    def start_write_behind(self, filename=None):
+        super().start_write_behind(get_temporary_filename())
+
+    def start_outbox(self, filename=None):
+        super().start_outbox(get_temporary_filename())
+
+
+class ReplayTelegramBot(ReplayMixin, TelegramBot):
+    def start(self):
+        self.bot = self.client
+        self.start_outbox()
+
+    def replay(self, record):
+        self.answer(
+            SimpleNamespace(
+                update_id=None,
+                effective_user=SimpleNamespace(id=record['user_id']),
+                message=SimpleNamespace(
+                    text=record.get('text', ''),
+                    date=datetime.now(),
+                    reply_to_message=None,
+                ),
+            ),
+            None,
+        )
+
+
+class ReplayVKBot(ReplayMixin, VKBot):
+    """Replays VK updates without the background jobs of the bot.
+
+    Menu and role updates, reminders, the event listener and the health
+    server are not started, so the replay does not bind the health port of
+    a running bot or send reminders.
+    """
+
+    def start_outbox(self, filename=None):
+        self.vk = self.client
+        super().start_outbox(filename)
+
+    def schedule_updates(self):
+        pass
+
+    def start_reminders(self):
+        pass
+
+    def start_event_listener(self):
+        pass
+
+    def start_health(self):
+        pass
+
+    def upload_file(self, button, peer_id):
+        return f'doc0_{button.id}'
+
+    def vk_bot(self):
+        pass
+
+    def replay(self, record):
+        if record['type'] == Updates.BUTTON:
+            self.handle_event(SimpleNamespace(
+                type=VkBotEventType.MESSAGE_EVENT,
+                raw={},
+                object=SimpleNamespace(
+                    user_id=record['user_id'],
+                    peer_id=record['user_id'],
+                    event_id=None,
+                    event_data=None,
+                    payload={'callback_data': record['callback_data']},
+                ),
+            ))
+        else:
+            self.handle_event(SimpleNamespace(
+                type=VkBotEventType.MESSAGE_NEW,
+                raw={},
+                message=SimpleNamespace(
+                    from_id=record['user_id'],
+                    text=record['text'],
+                    date=int(time.time()),
+                    reply_message=None,
+                    fwd_messages=None,
+                ),
+            ))
+
+
+REPLAY_BOTS = {
+    Platforms.TELEGRAM: (ReplayTelegramBot, FakeTelegramClient),
+    Platforms.VK: (ReplayVKBot, FakeVkClient),
+}
+
+
+def read_records(filename):
+    with gzip.open(filename, 'rt') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                record['user_id'] += REPLAY_USER_ID_OFFSET
+                yield record
+
+
+def restore_users(platform, filename):
+    """Creates the users of the recording snapshot by their role names."""
+    roles = dict(Role.objects.values_list('name', 'id'))
+    users = []
+    for record in read_records(filename):
+        if record['type'] != Updates.USER:
+            break
+        if record['role'] in roles:
+            users.append(User(
+                platform=platform,
+                platform_id=record['user_id'],
+                role_id=roles[record['role']],
+                is_subscribed=record['is_subscribed'],
+                date_subscribed=now() if record['is_subscribed'] else None,
+                is_blocked=record['is_blocked'],
+            ))
+    User.objects.bulk_create(users, ignore_conflicts=True)
+
+
+def replay_traffic(platform, filename, speed=None, latency=0):
+    """Feeds recorded updates to a bot wired to a fake platform client.
+
+    Users of the snapshot at the start of the recording are created first.
+    Updates are sent at their recorded offsets divided by `speed`, or as
+    fast as the bot handles them if `speed` is `None`. Latency of an
+    update is counted from the moment it was due, so a bot that falls
+    behind the recorded traffic shows it in the percentiles.
+    """
+    stats = ReplayStats()
+    bot_class, client_class = REPLAY_BOTS[platform]
+    restore_users(platform, filename)
+    connection.execute_wrappers.append(stats.count_query)
+    connection_created.connect(stats.watch)
+    bot = bot_class(platform, client_class(stats, latency))
+    stats.counting = True
+    started = time.monotonic()
+    for record in read_records(filename):
+        if record['type'] == Updates.USER:
+            continue
+        due = started + record['time'] / speed if speed else time.monotonic()
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            bot.replay(record)
+        except Exception:
+            stats.errors += 1
+        stats.latencies.append(time.monotonic() - due)
+        stats.updates += 1
+    stats.duration = time.monotonic() - started
+    while len(bot.outbox) and (
+        time.monotonic() - started - stats.duration < REPLAY_DRAIN_TIMEOUT
+    ):
+        time.sleep(0.1)
+    stats.drain_time = time.monotonic() - started - stats.duration
+    stats.counting = False
+    connection_created.disconnect(stats.watch)
+    return stats.get_report()
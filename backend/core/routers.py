@@ -0,0 +1,174 @@
+import time
+from functools import wraps
+from threading import Lock, local
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Max
+from django.utils.timezone import now
+
+from backend.settings import REPLICA_DATABASE, get_logger, settings
+from core.constants import Errors, Pooling
+from core.models import Question, User
+
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE WHEN '
+        'pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+        'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM '
+        'now() - pg_last_xact_replay_timestamp()), 0) END'
+    ),
+}
+WATERMARKS = (
+    (User, ('updated',)),
+    (Question, ('created', 'answered')),
+)
+
+state = local()
+
+
+class Replica:
+    """Tells whether the replica has the writes of this process.
+
+    The lag of the replica is measured at most every `Pooling.REPLICA_LAG`
+    seconds, an unreachable replica lags infinitely. Replicas other than
+    PostgreSQL ones are compared with the primary by their latest indexed
+    write times, a replica that is behind lags since its latest write. The
+    replica is usable while it lags no more than `REPLICA_MAX_LAG` seconds
+    and the last write of the process is older than the lag.
+
+    The lag only covers writes the replica knows of, so writes of other
+    processes announced by events must be read from the primary.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.checked = None
+        self.lag = 0
+        self.last_write = float('-inf')
+
+    def written(self):
+        self.last_write = time.monotonic()
+
+    def is_usable(self):
+        with self.lock:
+            current = time.monotonic()
+            if (
+                self.checked is None
+                or current - self.checked > Pooling.REPLICA_LAG
+            ):
+                self.checked = current
+                self.lag = self.measure()
+            return (
+                self.lag <= settings.replica_max_lag
+                and current - self.last_write > self.lag
+            )
+
+    @staticmethod
+    def get_watermark(alias):
+        return max(
+            (
+                value
+                for model, fields in WATERMARKS
+                for value in model.objects.using(alias).aggregate(
+                    *(Max(field) for field in fields)
+                ).values()
+                if value is not None
+            ),
+            default=None,
+        )
+
+    @classmethod
+    def measure(cls):
+        replica = connections[REPLICA_DATABASE]
+        query = LAG_QUERIES.get(replica.vendor)
+        try:
+            if query is None:
+                primary = cls.get_watermark(DEFAULT_DB_ALIAS)
+                watermark = cls.get_watermark(REPLICA_DATABASE)
+                if primary is None or (
+                    watermark is not None and watermark >= primary
+                ):
+                    return 0
+                if watermark is None:
+                    return float('inf')
+                return (now() - watermark).total_seconds()
+            with replica.cursor() as cursor:
+                cursor.execute(query)
+                return float(cursor.fetchone()[0])
+        except DatabaseError as error:
+            get_logger(REPLICA_DATABASE).error(
+                Errors.REPLICA.format(error=error)
+            )
+            replica.close()
+            return float('inf')
+
+
+replica = Replica()
+
+
+def read_from_replica(function):
+    """Lets the reads of `function` go to the replica."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        state.replica_reads = getattr(state, 'replica_reads', 0) + 1
+        try:
+            return function(*args, **kwargs)
+        finally:
+            state.replica_reads -= 1
+    return wrapper
+
+
+def read_from_primary(function):
+    """Keeps all reads of `function` on the primary.
+
+    Used for reads triggered by writes of other processes, which the
+    replica may not have yet.
+    """
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        state.primary_reads = getattr(state, 'primary_reads', 0) + 1
+        try:
+            return function(*args, **kwargs)
+        finally:
+            state.primary_reads -= 1
+    return wrapper
+
+
+def mark_write():
+    """Keeps reads on the primary until the write reaches the replica."""
+    state.last_write = time.monotonic()
+    replica.written()
+
+
+class ReplicaRouter:
+    """Sends reads of functions marked by `read_from_replica` to the replica.
+
+    Reads stay on the primary inside transactions and functions marked by
+    `read_from_primary`, for `REPLICA_STICKINESS` seconds after the thread
+    writes and while the replica is not usable.
+    Everything else uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            not getattr(state, 'replica_reads', 0)
+            or getattr(state, 'primary_reads', 0)
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or time.monotonic() - getattr(state, 'last_write', float('-inf'))
+            < settings.replica_stickiness
+            or not replica.is_usable()
+        ):
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DATABASE
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, first, second, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
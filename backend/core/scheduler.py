@@ -0,0 +1,68 @@
+from apscheduler.events import (
+    EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED,
+)
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from backend.settings import TIME_ZONE, get_logger
+from core.constants import (
+    Errors, PLATFORMS_VERBOSE, SCHEDULER_JITTER, SCHEDULER_MISFIRE_GRACE,
+    SCHEDULER_WORKERS,
+)
+
+
+class Scheduler:
+    """Runs periodic jobs of a bot on background threads.
+
+    Every job runs every `interval` seconds plus up to `SCHEDULER_JITTER`
+    seconds, regardless of inbound traffic. A run is skipped while the
+    previous one is still running, runs missed by more than
+    `SCHEDULER_MISFIRE_GRACE` seconds are dropped and the rest are
+    coalesced into one. Runs, lateness and durations are recorded by the
+    health of the bot, skipped and missed runs are counted there too and
+    logged by the scheduler itself.
+    """
+
+    def __init__(self, platform, health):
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.health = health
+        self.scheduler = BackgroundScheduler(
+            executors={'default': ThreadPoolExecutor(SCHEDULER_WORKERS)},
+            job_defaults=dict(
+                coalesce=True,
+                max_instances=1,
+                misfire_grace_time=SCHEDULER_MISFIRE_GRACE,
+            ),
+            timezone=TIME_ZONE,
+            logger=self.logger,
+        )
+        self.scheduler.add_listener(
+            self.on_event,
+            EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES,
+        )
+
+    def add(self, function, interval):
+        name = function.__name__
+        self.scheduler.add_job(
+            self.health.track(name, interval, function),
+            'interval',
+            seconds=interval,
+            jitter=SCHEDULER_JITTER,
+            id=name,
+            name=name,
+        )
+
+    def start(self):
+        self.scheduler.start()
+
+    def on_event(self, event):
+        if event.code == EVENT_JOB_ERROR:
+            self.logger.error(Errors.JOB.format(
+                job=event.job_id,
+                error_type=type(event.exception).__name__,
+                error=event.exception,
+            ))
+        elif event.code == EVENT_JOB_MISSED:
+            self.health.count(event.job_id, 'missed')
+        else:
+            self.health.count(event.job_id, 'skipped')
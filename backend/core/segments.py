@@ -0,0 +1,188 @@
+import time
+from threading import Lock
+
+import numpy as np
+
+from core.constants import PLATFORMS, SEGMENTS_REBUILD_INTERVAL
+from core.models import User
+
+PLATFORM_CODES = {
+    platform: code for code, (platform, _) in enumerate(PLATFORMS)
+}
+FIELDS = (
+    'id', 'platform', 'platform_id', 'role_id', 'is_subscribed',
+    'date_subscribed', 'is_blocked', 'updated',
+)
+
+
+def get_columns(rows):
+    (
+        ids, platforms, platform_ids, role_ids, is_subscribed,
+        date_subscribed, is_blocked, _,
+    ) = zip(*rows) if rows else ((),) * len(FIELDS)
+    return dict(
+        id=np.array(ids, dtype=np.int64),
+        platform=np.array(
+            [PLATFORM_CODES[platform] for platform in platforms],
+            dtype=np.int8,
+        ),
+        platform_id=np.array(platform_ids, dtype=np.int64),
+        role_id=np.array(role_ids, dtype=np.int64),
+        is_subscribed=np.array(is_subscribed, dtype=bool),
+        date_subscribed=np.array(date_subscribed, dtype='datetime64[s]'),
+        is_blocked=np.array(is_blocked, dtype=bool),
+    )
+
+
+class Segment:
+    """Users matching all given conditions.
+
+    Segments are combined into set expressions with `&`, `|`, `-` and `~`
+    and evaluated by `SegmentIndex`. `role_id` is a role or a collection of
+    roles, `subscribed_from` and `subscribed_to` bound the subscription
+    date, the latter exclusively.
+    """
+
+    def __init__(
+        self, platform=None, role_id=None, is_subscribed=None,
+        is_blocked=None, subscribed_from=None, subscribed_to=None,
+    ):
+        self.conditions = dict(
+            platform=platform,
+            role_id=role_id,
+            is_subscribed=is_subscribed,
+            is_blocked=is_blocked,
+            subscribed_from=subscribed_from,
+            subscribed_to=subscribed_to,
+        )
+
+    def __and__(self, other):
+        return Expression(np.logical_and, self, other)
+
+    def __or__(self, other):
+        return Expression(np.logical_or, self, other)
+
+    def __sub__(self, other):
+        return Expression(np.logical_and, self, ~other)
+
+    def __invert__(self):
+        return Expression(np.logical_not, self)
+
+    def evaluate(self, columns):
+        mask = np.ones(len(columns['id']), dtype=bool)
+        for name, value in self.conditions.items():
+            if value is None:
+                continue
+            match name:
+                case 'platform':
+                    mask &= columns['platform'] == PLATFORM_CODES[value]
+                case 'role_id' if isinstance(value, int):
+                    mask &= columns['role_id'] == value
+                case 'role_id':
+                    mask &= np.isin(columns['role_id'], list(value))
+                case 'subscribed_from':
+                    mask &= columns['date_subscribed'] >= np.datetime64(
+                        value, 's',
+                    )
+                case 'subscribed_to':
+                    mask &= columns['date_subscribed'] < np.datetime64(
+                        value, 's',
+                    )
+                case _:
+                    mask &= columns[name] == value
+        return mask
+
+
+class Expression(Segment):
+    def __init__(self, operator, *segments):
+        self.operator = operator
+        self.segments = segments
+
+    def evaluate(self, columns):
+        return self.operator(
+            *(segment.evaluate(columns) for segment in self.segments)
+        )
+
+
+class SegmentIndex:
+    """Columns of user attributes indexed by a dense user ordinal.
+
+    Segments are evaluated as NumPy boolean masks over the columns. Users
+    changed since the last refresh are picked up by their update time: known
+    users are overwritten in place, new ones are appended. Deleted users are
+    only noticed by their count, in which case, or once every
+    `SEGMENTS_REBUILD_INTERVAL` seconds, the index is rebuilt.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.columns = get_columns([])
+        self.updated = None
+        self.built = 0
+
+    def refresh(self):
+        if (
+            self.updated is None
+            or time.monotonic() - self.built > SEGMENTS_REBUILD_INTERVAL
+        ):
+            self.rebuild()
+            return
+        rows = list(User.objects.filter(
+            updated__gte=self.updated,
+        ).order_by('id').values_list(*FIELDS))
+        if rows:
+            self.update(rows)
+        if User.objects.count() != len(self.columns['id']):
+            self.rebuild()
+
+    def rebuild(self):
+        rows = list(User.objects.order_by('id').values_list(*FIELDS))
+        self.columns = get_columns(rows)
+        self.updated = max((row[-1] for row in rows), default=None)
+        self.built = time.monotonic()
+
+    def update(self, rows):
+        changes = get_columns(rows)
+        ids = self.columns['id']
+        ordinals = np.searchsorted(ids, changes['id'])
+        known = ordinals < len(ids)
+        known[known] = ids[ordinals[known]] == changes['id'][known]
+        if len(ids) and (changes['id'][~known] < ids[-1]).any():
+            self.rebuild()
+            return
+        for name, column in self.columns.items():
+            column[ordinals[known]] = changes[name][known]
+            if not known.all():
+                self.columns[name] = np.concatenate(
+                    (column, changes[name][~known]),
+                )
+        self.updated = max(self.updated, max(row[-1] for row in rows))
+
+    def evaluate(self, segment):
+        with self.lock:
+            self.refresh()
+            return self.columns, segment.evaluate(self.columns)
+
+    def count(self, segment):
+        """Returns the number of matching users of every platform."""
+        columns, mask = self.evaluate(segment)
+        counts = np.bincount(
+            columns['platform'][mask], minlength=len(PLATFORM_CODES),
+        )
+        return {
+            platform: int(counts[code])
+            for platform, code in PLATFORM_CODES.items()
+        }
+
+    def get_recipients(self, segment):
+        """Returns the platform IDs of matching users of every platform."""
+        columns, mask = self.evaluate(segment)
+        return {
+            platform: columns['platform_id'][
+                mask & (columns['platform'] == code)
+            ].tolist()
+            for platform, code in PLATFORM_CODES.items()
+        }
+
+
+segment_index = SegmentIndex()
@@ -0,0 +1,133 @@
+import os
+from datetime import datetime
+from functools import partial
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from backend.settings import get_logger
+from core import events
+from core.constants import Errors, Events, MENU_PREVIEW_CACHE_KEY, PLATFORMS
+from core.files import preprocess
+from core.models import (
+    AskAdminButton, InfoButton, MenuButton, Reminder, ReminderButton,
+    SubButton,
+)
+
+BUTTON_MODELS = (
+    AskAdminButton, InfoButton, MenuButton, ReminderButton, SubButton,
+)
+
+logger = get_logger('admin')
+
+
+def remember_parent(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance.previous_parent_id = sender.objects.filter(
+            pk=instance.pk,
+        ).values_list('parent_id', flat=True).first()
+
+
+def invalidate_menu_preview(sender, instance, **kwargs):
+    menu_ids = [
+        instance.parent_id, getattr(instance, 'previous_parent_id', None),
+    ]
+    if sender is MenuButton:
+        menu_ids.append(instance.id)
+    cache.delete_many([
+        MENU_PREVIEW_CACHE_KEY.format(menu_id=menu_id)
+        for menu_id in menu_ids
+        if menu_id is not None
+    ])
+
+
+def delete_unreferenced_file(name):
+    if name and not InfoButton.objects.filter(file=name).exists():
+        InfoButton._meta.get_field('file').storage.delete(name)
+
+
+def prepare_file(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance.previous_file = InfoButton.objects.filter(
+            pk=instance.pk,
+        ).values_list('file', flat=True).first()
+    file = instance.file
+    if not file:
+        instance.file_name = ''
+        instance.file_size = None
+        instance.file_metadata = {}
+        instance.checksum = ''
+    elif not file._committed:
+        instance.file_name = os.path.basename(file.name)
+        instance.file_size = file.size
+        instance.file_metadata = {}
+        instance.checksum = ''
+        instance.preprocess_file = True
+
+
+def delete_previous_file(sender, instance, **kwargs):
+    previous_file = getattr(instance, 'previous_file', None)
+    if previous_file and previous_file != instance.file.name:
+        transaction.on_commit(partial(delete_unreferenced_file, previous_file))
+
+
+def delete_file(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(delete_unreferenced_file, instance.file.name)
+    )
+
+
+def preprocess_file(sender, instance, **kwargs):
+    if getattr(instance, 'preprocess_file', False):
+        del instance.preprocess_file
+        transaction.on_commit(partial(start_preprocessing, instance.file.name))
+
+
+def start_preprocessing(name):
+    file = InfoButton(file=name).file
+    preprocess(file).add_done_callback(partial(save_preprocessed, name))
+
+
+def save_preprocessed(name, future):
+    try:
+        new_name, checksum, size, metadata = future.result()
+        InfoButton.objects.filter(file=name).update(
+            file=new_name,
+            file_size=size,
+            file_metadata=metadata,
+            checksum=checksum,
+        )
+        if new_name != name:
+            delete_unreferenced_file(name)
+            delete_unreferenced_file(new_name)
+    except Exception as error:
+        logger.error(Errors.FILE_PREPROCESSING.format(file=name, error=error))
+    finally:
+        connection.close()
+
+
+def publish_reminders(sender, instance, **kwargs):
+    for platform, _ in PLATFORMS:
+        events.publish(Events.REMINDERS, platform)
+
+
+def update_reminders(sender, instance, **kwargs):
+    if instance.reminders.update(
+        text=instance.text, time=instance.time, updated=datetime.now(),
+    ):
+        publish_reminders(sender, instance)
+
+
+pre_save.connect(prepare_file, sender=InfoButton)
+post_save.connect(preprocess_file, sender=InfoButton)
+post_save.connect(delete_previous_file, sender=InfoButton)
+post_delete.connect(delete_file, sender=InfoButton)
+post_save.connect(update_reminders, sender=ReminderButton)
+post_save.connect(publish_reminders, sender=Reminder)
+post_delete.connect(publish_reminders, sender=Reminder)
+
+for model in BUTTON_MODELS:
+    pre_save.connect(remember_parent, sender=model)
+    post_save.connect(invalidate_menu_preview, sender=model)
+    post_delete.connect(invalidate_menu_preview, sender=model)
@@ -0,0 +1,22 @@
+from django.db.backends.sqlite3 import base
+
+from core.constants import SQLITE_PRAGMAS
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend for several processes writing to one database.
+
+    Every connection uses the WAL journal, so readers do not block the
+    writer, and waits for locks instead of failing. Transactions take the
+    write lock when they begin, so a transaction that reads before writing
+    cannot fail with a lock upgrade conflict halfway.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for pragma, value in SQLITE_PRAGMAS.items():
+            connection.execute(f'PRAGMA {pragma} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,96 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from statistics import median, quantiles
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils.timezone import now
+
+from core.constants import STATS_LAG
+from core.models import DailyStats, Question, StatsWatermark, Subscription
+
+ROLLUPS = (
+    ('questions_asked', Question, {}, 'created', 'id', 'question_id'),
+    (
+        'questions_answered', Question, dict(is_auto_answered=False),
+        'answered', 'answered', 'answered',
+    ),
+    (
+        'new_subscribers', Subscription, dict(is_subscribed=True), 'date',
+        'id', 'subscription_id',
+    ),
+    (
+        'unsubscribes', Subscription, dict(is_subscribed=False), 'date',
+        'id', 'unsubscription_id',
+    ),
+)
+
+
+def count_new_rows(
+    watermark, upper, counts, counter, model, filters, field, lookup, mark,
+):
+    queryset = model.objects.filter(**filters, **{f'{field}__lte': upper})
+    if getattr(watermark, mark) is not None:
+        queryset = queryset.filter(
+            **{f'{lookup}__gt': getattr(watermark, mark)}
+        )
+    limit = queryset.aggregate(value=Max(lookup))['value']
+    if limit is None:
+        return
+    rows = queryset.filter(**{f'{lookup}__lte': limit}).annotate(
+        day=TruncDate(field),
+    ).values('day', 'user__platform', 'user__role').annotate(
+        count=Count('id'),
+    )
+    for row in rows:
+        counts[
+            row['day'], row['user__platform'], row['user__role']
+        ][counter] += row['count']
+    setattr(watermark, mark, limit)
+
+
+def get_answer_times(day, platform, role_id):
+    start = datetime.combine(day, time.min)
+    answer_times = [
+        answered - created
+        for created, answered in Question.objects.filter(
+            answered__gte=start,
+            answered__lt=start + timedelta(days=1),
+            is_auto_answered=False,
+            user__platform=platform,
+            user__role=role_id,
+        ).values_list('created', 'answered')
+    ]
+    if not answer_times:
+        return None, None
+    if len(answer_times) == 1:
+        return answer_times[0], answer_times[0]
+    return (
+        median(answer_times),
+        quantiles(answer_times, n=10, method='inclusive')[-1],
+    )
+
+
+def update_daily_stats():
+    """Adds rows created since the previous run to the daily rollups."""
+    upper = now() - timedelta(seconds=STATS_LAG)
+    counts = defaultdict(Counter)
+    with transaction.atomic():
+        watermark, _ = (
+            StatsWatermark.objects.select_for_update().get_or_create(pk=1)
+        )
+        for rollup in ROLLUPS:
+            count_new_rows(watermark, upper, counts, *rollup)
+        for (day, platform, role_id), counters in counts.items():
+            stats, _ = DailyStats.objects.get_or_create(
+                date=day, platform=platform, role_id=role_id,
+            )
+            for counter, value in counters.items():
+                setattr(stats, counter, getattr(stats, counter) + value)
+            if counters['questions_answered']:
+                stats.median_answer_time, stats.p90_answer_time = (
+                    get_answer_times(day, platform, role_id)
+                )
+            stats.save()
+        watermark.save()
@@ -1,27 +1,49 @@
-import time
 from itertools import zip_longest
 
 from telegram import ReplyKeyboardMarkup, Update
-from telegram.ext import CallbackContext, MessageHandler, Updater
+from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+from telegram.ext import CallbackContext, ExtBot, MessageHandler, Updater
 from telegram.ext.filters import Filters
+from telegram.utils.request import Request
 
-from backend.settings import get_logger, settings
+from backend.settings import get_logger, log_context, settings
 from core import core
 from core.constants import (
     BUTTONS_PER_ROW, ButtonTypes, Errors, PLATFORMS_VERBOSE, Platforms,
-    Pooling, SEND_MESSAGE_INTERVAL,
+    Pooling, TELEGRAM_WORKERS,
 )
 from core.localization import ButtonLabels, ChatMessages, MAIN_MENU
+from core.routers import read_from_primary
+from core.tracing import tracer
 
 logger = get_logger(Platforms.TELEGRAM_FULL.lower())
 
 
+class PollingBot(ExtBot):
+    """Reports every long-poll response to the health of the bot."""
+
+    def __init__(self, *args, health, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health = health
+
+    def get_updates(self, *args, **kwargs):
+        updates = super().get_updates(*args, **kwargs)
+        self.health.polled()
+        return updates
+
+
+class Methods:
+    SEND_MESSAGE = 'send_message'
+    SEND_DOCUMENT = 'send_document'
+
+
 class Menus:
     ADMIN_MAIN = 0
     REGISTRATION = -1
     ADMIN_ANSWER = -2
     ADMIN_CONFIRM_BLOCK = -3
     ASK_ADMIN = -4
+    ADMIN_BATCH = -5
 
 
 class Commands:
@@ -32,12 +54,19 @@ class Commands:
     CONFIRM_BLOCK = -5
     CANCEL_BLOCK = -6
     CANCEL = -7
+    ADMIN_ANSWER_BATCH = -8
+    NEXT_BATCH = -9
 
 
+ANSWERING_MENUS = (
+    Menus.ADMIN_ANSWER, Menus.ADMIN_CONFIRM_BLOCK, Menus.ADMIN_BATCH,
+)
+
 STATIC_MENUS = {
     Menus.ASK_ADMIN: [[ButtonLabels.CANCEL]],
-    Menus.ADMIN_MAIN: [[ButtonLabels.ANSWER]],
+    Menus.ADMIN_MAIN: [[ButtonLabels.ANSWER, ButtonLabels.ANSWER_BATCH]],
     Menus.ADMIN_ANSWER: [[ButtonLabels.CANCEL, ButtonLabels.BLOCK]],
+    Menus.ADMIN_BATCH: [[ButtonLabels.CANCEL, ButtonLabels.NEXT_BATCH]],
     Menus.ADMIN_CONFIRM_BLOCK: [
         [ButtonLabels.CANCEL, ButtonLabels.CONFIRM_BLOCK],
     ],
@@ -45,11 +74,18 @@ STATIC_MENUS = {
 
 STATIC_COMMANDS = {
     Menus.ASK_ADMIN: {ButtonLabels.CANCEL: Commands.CANCEL},
-    Menus.ADMIN_MAIN: {ButtonLabels.ANSWER: Commands.ADMIN_ANSWER_QUESTION},
+    Menus.ADMIN_MAIN: {
+        ButtonLabels.ANSWER: Commands.ADMIN_ANSWER_QUESTION,
+        ButtonLabels.ANSWER_BATCH: Commands.ADMIN_ANSWER_BATCH,
+    },
     Menus.ADMIN_ANSWER: {
         ButtonLabels.CANCEL: Commands.ADMIN_CANCEL,
         ButtonLabels.BLOCK: Commands.BLOCK,
     },
+    Menus.ADMIN_BATCH: {
+        ButtonLabels.CANCEL: Commands.ADMIN_CANCEL,
+        ButtonLabels.NEXT_BATCH: Commands.NEXT_BATCH,
+    },
     Menus.ADMIN_CONFIRM_BLOCK: {
         ButtonLabels.CANCEL: Commands.CANCEL_BLOCK,
         ButtonLabels.CONFIRM_BLOCK: Commands.CONFIRM_BLOCK,
@@ -58,21 +94,26 @@ STATIC_COMMANDS = {
 
 
 class TelegramBot(core.GenericBot):
+    STATIC_MENU_LINKS = {core.ADMIN_ROLE_ID: Menus.ADMIN_MAIN}
+
     def __init__(self, platform):
         super().__init__(platform)
         self.menus = {}
         self.commands = {}
         self.ask_admin_button_links = {}
         self.current_questions = {}
-        self.main_menu_links[core.ADMIN_ROLE_ID] = Menus.ADMIN_MAIN
+        self.bot = None
+        self.file_ids = {}
         self.build_menus()
         self.start()
 
     def build_menus(self):
-        self.build_dynamic_menus()
-        self.build_static_menus()
+        self.set_data(self.build_dynamic_menus(self.roles))
 
-    def build_dynamic_menus(self):
+    def build_dynamic_menus(self, roles):
+        menus = {}
+        commands = {}
+        ask_admin_button_links = {}
         for menu_id, menu in core.get_menus().items():
             current_commands = {}
             current_menu = []
@@ -81,7 +122,7 @@ class TelegramBot(core.GenericBot):
                 current_commands[button.name] = button
                 current_row.append(button.name)
                 if button.type == ButtonTypes.ASK_ADMIN:
-                    self.ask_admin_button_links[menu_id] = button.name
+                    ask_admin_button_links[menu_id] = button.name
                 if len(current_row) == BUTTONS_PER_ROW:
                     current_menu.append(current_row)
                     current_row = []
@@ -90,127 +131,149 @@ class TelegramBot(core.GenericBot):
                 current_commands[MAIN_MENU] = Commands.MAIN_MENU
             if current_row:
                 current_menu.append(current_row)
-            self.menus[menu_id] = self.get_keyboard(current_menu)
-            self.commands[menu_id] = current_commands
-        self.menus[Menus.REGISTRATION] = self.get_keyboard(
+            menus[menu_id] = self.get_keyboard(current_menu)
+            commands[menu_id] = current_commands
+        menus[Menus.REGISTRATION] = self.get_keyboard(
             [[role for role in row if role is not None]
              for row in zip_longest(
-                *[iter(self.roles.values())] * BUTTONS_PER_ROW,
+                *[iter(roles.values())] * BUTTONS_PER_ROW,
             )]
         )
-        self.commands[Menus.REGISTRATION] = {
-            value: key for key, value in self.roles.items()
+        commands[Menus.REGISTRATION] = {
+            value: key for key, value in roles.items()
         }
-        self.build_static_menus()
-
-    def build_static_menus(self):
         for menu_id, menu in STATIC_MENUS.items():
-            self.menus[menu_id] = self.get_keyboard(menu)
-        for menu_id, commands in STATIC_COMMANDS.items():
-            self.commands[menu_id] = commands
+            menus[menu_id] = self.get_keyboard(menu)
+        commands |= STATIC_COMMANDS
+        return {
+            'menus': menus,
+            'commands': commands,
+            'ask_admin_button_links': ask_admin_button_links,
+        }
 
+    @read_from_primary
     def check_menu_updates(self, context):
         update_ids = core.check_menu_updates(self.platform)
         if not update_ids:
             return
-        self.get_data()
-        self.build_dynamic_menus()
+        data = self.load_data()
+        self.set_data(data | self.build_dynamic_menus(data['roles']))
         core.complete_menu_updates(self.platform, update_ids)
 
     def update_user_roles(self, context):
-        self.users = core.get_users(self.platform)
-
-    def send_admin_answers(self, context):
-        answered_questions = core.get_answered_questions(self.platform)
-        if not answered_questions:
+        self.refresh_users()
+
+    def send_now(self, method, params):
+        if method == Methods.SEND_DOCUMENT:
+            path = params['document']
+            if path in self.file_ids:
+                self.bot.send_document(
+                    **params | {'document': self.file_ids[path]}
+                )
+                return
+            with open(path, 'rb') as file:
+                message = self.bot.send_document(**params | {'document': file})
+            self.file_ids[path] = message.document.file_id
             return
-        question_ids = set()
-        for answered_question in answered_questions:
-            question_id, user_id, answer = answered_question
-            context.bot.send_message(
-                user_id,
-                ChatMessages.ANSWER.format(answer=answer),
-            )
-            question_ids.add(question_id)
-            time.sleep(SEND_MESSAGE_INTERVAL)
-        core.confirm_answer_sent(question_ids)
+        getattr(self.bot, method)(**params)
 
     @staticmethod
-    def info_button(button, user_id, context):
+    def get_retry_delay(error):
+        match error:
+            case RetryAfter():
+                return error.retry_after, True
+            case BadRequest() | Unauthorized():
+                return None
+            case NetworkError():
+                return None, False
+        return None
+
+    def send_message(self, user_id, message, reply_markup=None, **options):
+        self.outbox.send(
+            user_id,
+            Methods.SEND_MESSAGE,
+            dict(chat_id=user_id, text=message, reply_markup=reply_markup),
+            **options,
+        )
+
+    def info_button(self, button, user_id):
         if not button.file:
-            context.bot.send_message(user_id, button.answer)
+            self.send_message(user_id, button.answer)
             return
-        with button.file.open('rb') as file:
-            context.bot.send_document(
-                user_id,
-                document=file,
+        self.outbox.send(
+            user_id,
+            Methods.SEND_DOCUMENT,
+            dict(
+                chat_id=user_id,
+                document=button.file.path,
+                filename=button.file_name or None,
                 caption=button.answer,
-            )
+            ),
+        )
 
-    def move_to_menu(self, user_id, message, menu_id, context):
-        context.bot.send_message(
+    def move_to_menu(self, user_id, message, menu_id):
+        self.send_message(
             user_id,
             message,
             reply_markup=self.menus[menu_id],
         )
         self.current_menus[user_id] = menu_id
 
-    @staticmethod
-    def reminder_button(user_id, context):
-        context.bot.send_message(user_id, ChatMessages.NOT_IMPLEMENTED)
+    def reminder_button(self, button, user_id):
+        self.send_message(user_id, self.toggle_reminder(user_id, button))
 
-    def ask_admin_button(self, button, user_id, context):
-        self.move_to_menu(user_id, button.answer, Menus.ASK_ADMIN, context)
+    def ask_admin_button(self, button, user_id):
+        self.move_to_menu(user_id, button.answer, Menus.ASK_ADMIN)
 
-    def add_question(self, user_id, role_id, message, context):
+    def add_question(self, user_id, role_id, message):
         menu_id = self.main_menu_links[role_id]
-        core.add_question(self.platform, user_id, message)
-        context.bot.send_message(
-            user_id,
-            self.commands[menu_id][
-                self.ask_admin_button_links[menu_id]
-            ].received_answer,
-        )
-        self.main_menu(user_id, role_id, context)
+        self.flush_writes()
+        answer = core.add_question(self.platform, user_id, message)
+        if answer is None:
+            self.send_message(
+                user_id,
+                self.commands[menu_id][
+                    self.ask_admin_button_links[menu_id]
+                ].received_answer,
+            )
+        else:
+            self.send_message(
+                user_id, ChatMessages.AUTO_ANSWER.format(answer=answer),
+            )
+        self.main_menu(user_id, role_id)
 
-    def subscribe_button(self, button, user_id, role_id, context):
+    def subscribe_button(self, button, user_id, role_id):
         if user_id not in self.subscribers[role_id]:
-            core.subscribe(self.platform, user_id)
+            self.subscribe(user_id)
             self.subscribers[role_id].add(user_id)
-            context.bot.send_message(user_id, button.on_answer)
+            self.send_message(user_id, button.on_answer)
             return
-        core.unsubscribe(self.platform, user_id)
+        self.unsubscribe(user_id)
         self.subscribers[role_id].remove(user_id)
-        context.bot.send_message(user_id, button.off_answer)
+        self.send_message(user_id, button.off_answer)
 
-    def main_menu(self, user_id, role_id, context):
-        self.move_to_menu(
-            user_id, MAIN_MENU, self.main_menu_links[role_id], context,
-        )
+    def main_menu(self, user_id, role_id):
+        self.move_to_menu(user_id, MAIN_MENU, self.main_menu_links[role_id])
 
-    def register(self, user_id, message, context):
+    def register(self, user_id, message):
         try:
             role_id = self.commands[Menus.REGISTRATION][message]
-            core.add_user(
-                platform=self.platform,
-                platform_id=user_id,
-                role_id=role_id,
-            )
+            self.add_user(user_id, role_id)
             self.users[user_id] = role_id
-            self.main_menu(user_id, role_id, context)
+            self.main_menu(user_id, role_id)
         except KeyError:
-            context.bot.send_message(
+            self.send_message(
                 user_id,
                 ChatMessages.REGISTRATION,
                 reply_markup=self.menus[Menus.REGISTRATION],
             )
 
-    def answer_question(self, admin_id, context):
+    def answer_question(self, admin_id):
         self.current_questions[admin_id] = core.get_open_question()
         question = self.current_questions[admin_id]
         if not question:
-            context.bot.send_message(admin_id, ChatMessages.NO_QUESTIONS)
-            self.main_menu(admin_id, core.ADMIN_ROLE_ID, context)
+            self.send_message(admin_id, ChatMessages.NO_QUESTIONS)
+            self.main_menu(admin_id, core.ADMIN_ROLE_ID)
             return
         self.move_to_menu(
             admin_id,
@@ -222,16 +285,34 @@ class TelegramBot(core.GenericBot):
                 question=question['question'],
             ),
             Menus.ADMIN_ANSWER,
-            context,
         )
 
-    def admin_cancel(self, admin_id, context):
+    def answer_batch(self, admin_id):
+        questions = self.question_batches.next(admin_id)
+        if not questions:
+            self.question_batches.discard(admin_id)
+            self.send_message(admin_id, ChatMessages.NO_QUESTIONS)
+            self.main_menu(admin_id, core.ADMIN_ROLE_ID)
+            return
+        message, *question_messages = self.format_question_batch(questions)
+        if self.current_menus[admin_id] == Menus.ADMIN_BATCH:
+            self.send_message(admin_id, message)
+        else:
+            self.move_to_menu(admin_id, message, Menus.ADMIN_BATCH)
+        for message in question_messages:
+            self.send_message(admin_id, message)
+
+    def is_answering(self, admin_id):
+        return self.current_menus.get(admin_id) in ANSWERING_MENUS
+
+    def admin_cancel(self, admin_id):
         if self.current_menus[admin_id] == Menus.ADMIN_CONFIRM_BLOCK:
-            self.answer_question(admin_id, context)
+            self.answer_question(admin_id)
         else:
-            self.main_menu(admin_id, core.ADMIN_ROLE_ID, context)
+            self.question_batches.discard(admin_id)
+            self.main_menu(admin_id, core.ADMIN_ROLE_ID)
 
-    def admin_block(self, admin_id, context):
+    def admin_block(self, admin_id):
         question = self.current_questions[admin_id]
         self.move_to_menu(
             admin_id,
@@ -240,15 +321,14 @@ class TelegramBot(core.GenericBot):
                 id=question['user__platform_id'],
             ),
             Menus.ADMIN_CONFIRM_BLOCK,
-            context,
         )
 
-    def admin_confirm_block(self, admin_id, context):
+    def admin_confirm_block(self, admin_id):
         question = self.current_questions[admin_id]
         user_platform = question['user__platform']
         user_id = question['user__platform_id']
         core.block(user_platform, user_id)
-        context.bot.send_message(
+        self.send_message(
             admin_id,
             ChatMessages.BLOCK_USER.format(
                 platform=PLATFORMS_VERBOSE[user_platform],
@@ -256,63 +336,101 @@ class TelegramBot(core.GenericBot):
                 role=self.roles[question['user__role']],
             ),
         )
-        self.main_menu(admin_id, core.ADMIN_ROLE_ID, context)
+        self.main_menu(admin_id, core.ADMIN_ROLE_ID)
 
-    def admin_answer(self, admin_id, message, context):
+    def admin_answer(self, admin_id, message):
         core.answer_question(self.current_questions[admin_id]['id'], message)
-        context.bot.send_message(admin_id, ChatMessages.ANSWER_ACCEPTED)
-        self.answer_question(admin_id, context)
+        self.send_message(admin_id, ChatMessages.ANSWER_ACCEPTED)
+        self.answer_question(admin_id)
+
+    def admin_batch_answer(self, admin_id, message, quoted=None):
+        self.send_message(
+            admin_id,
+            self.question_batches.answer(admin_id, message, quoted),
+        )
+        if self.question_batches.is_done(admin_id):
+            self.answer_batch(admin_id)
 
     def answer(self, update: Update, context: CallbackContext):
         user_id = update.effective_user.id
+        with log_context(
+            update_id=update.update_id, user_id=user_id,
+        ), tracer.trace(
+            'telegram.answer',
+            user_id=user_id,
+            menu=self.current_menus.get(user_id),
+        ), self.state_lock:
+            self.handle_update(update)
+        self.health.handled(update.message.date.timestamp())
+
+    def handle_update(self, update):
+        user_id = update.effective_user.id
+        if self.recorder:
+            self.recorder.record_message(
+                user_id,
+                update.message.text,
+                any(
+                    update.message.text in commands
+                    for commands in self.commands.values()
+                ),
+            )
+        if not self.throttle.allow(user_id, self.users.get(user_id)):
+            return
         message = update.message.text
         if user_id not in self.users:
-            self.register(user_id, message, context)
+            self.register(user_id, message)
             return
         role_id = self.users[user_id]
         if role_id == core.BLOCKED_USER_ROLE_ID:
             return
         if user_id not in self.current_menus:
-            self.main_menu(user_id, role_id, context)
+            self.main_menu(user_id, role_id)
             return
         try:
             command = self.commands[self.current_menus[user_id]][message]
+            tracer.set_attribute(
+                'button.type',
+                command if isinstance(command, int) else command.type,
+            )
             if isinstance(command, int):
                 match command:
                     case Commands.MAIN_MENU | Commands.CANCEL:
-                        self.main_menu(user_id, role_id, context)
+                        self.main_menu(user_id, role_id)
                     case Commands.ADMIN_ANSWER_QUESTION:
-                        self.answer_question(user_id, context)
+                        self.answer_question(user_id)
+                    case Commands.ADMIN_ANSWER_BATCH | Commands.NEXT_BATCH:
+                        self.answer_batch(user_id)
                     case Commands.ADMIN_CANCEL | Commands.CANCEL_BLOCK:
-                        self.admin_cancel(user_id, context)
+                        self.admin_cancel(user_id)
                     case Commands.BLOCK:
-                        self.admin_block(user_id, context)
+                        self.admin_block(user_id)
                     case Commands.CONFIRM_BLOCK:
-                        self.admin_confirm_block(user_id, context)
+                        self.admin_confirm_block(user_id)
             else:
                 match command.type:
                     case ButtonTypes.INFO:
-                        self.info_button(command, user_id, context)
+                        self.info_button(command, user_id)
                     case ButtonTypes.MENU:
-                        self.move_to_menu(
-                            user_id, command.name, command.id, context,
-                        )
+                        self.move_to_menu(user_id, command.name, command.id)
                     case ButtonTypes.ASK_ADMIN:
-                        self.ask_admin_button(command, user_id, context)
+                        self.ask_admin_button(command, user_id)
                     case ButtonTypes.SUBSCRIBE:
-                        self.subscribe_button(
-                            command, user_id, role_id, context,
-                        )
+                        self.subscribe_button(command, user_id, role_id)
                     case ButtonTypes.REMINDER:
-                        self.reminder_button(user_id, context)
+                        self.reminder_button(command, user_id)
         except KeyError:
             match self.current_menus[user_id]:
                 case Menus.ADMIN_ANSWER:
-                    self.admin_answer(user_id, message, context)
+                    self.admin_answer(user_id, message)
+                case Menus.ADMIN_BATCH:
+                    quoted = update.message.reply_to_message
+                    self.admin_batch_answer(
+                        user_id, message, quoted.text if quoted else None,
+                    )
                 case Menus.ASK_ADMIN:
-                    self.add_question(user_id, role_id, message, context)
+                    self.add_question(user_id, role_id, message)
                 case _:
-                    context.bot.send_message(
+                    self.send_message(
                         user_id,
                         ChatMessages.UNKNOWN_COMMAND,
                         reply_markup=self.menus[self.current_menus[user_id]],
@@ -326,16 +444,35 @@ class TelegramBot(core.GenericBot):
 
     @staticmethod
     def get_keyboard(keyboard):
-        return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+        return ReplyKeyboardMarkup(
+            keyboard=keyboard, resize_keyboard=True,
+        ).to_json()
 
     def start(self):
-        updater = Updater(token=settings.telegram_token)
+        updater = Updater(
+            bot=PollingBot(
+                token=settings.telegram_token,
+                base_url=settings.telegram_api_url or None,
+                request=Request(con_pool_size=TELEGRAM_WORKERS + 4),
+                health=self.health,
+            ),
+            workers=TELEGRAM_WORKERS,
+        )
+        self.bot = updater.bot
+        self.start_outbox()
+        self.start_reminders()
+        self.start_event_listener()
         dispatcher = updater.dispatcher
         dispatcher.add_handler(MessageHandler(Filters.text, self.answer))
         dispatcher.add_error_handler(self.error_handler)
         job_queue = updater.job_queue
-        job_queue.run_repeating(self.check_menu_updates, Pooling.MENU_UPDATE)
-        job_queue.run_repeating(self.update_user_roles, Pooling.USER_ROLES)
-        job_queue.run_repeating(self.send_admin_answers, Pooling.ANSWERS)
+        for job, interval in (
+            (self.check_menu_updates, Pooling.MENU_UPDATE),
+            (self.update_user_roles, Pooling.USER_ROLES),
+        ):
+            job_queue.run_repeating(
+                self.health.track(job.__name__, interval, job), interval,
+            )
         updater.start_polling()
+        self.start_health()
         updater.idle()
@@ -0,0 +1,74 @@
+import time
+from collections import Counter, OrderedDict
+from threading import Lock
+
+from backend.settings import get_logger, settings
+from core.constants import Errors, PLATFORMS_VERBOSE, THROTTLE_BUCKETS
+
+
+class Counters:
+    ALLOWED = 'allowed'
+    DROPPED = 'dropped'
+    EVICTED = 'evicted'
+
+
+class Throttle:
+    """Per-user token buckets of a bot.
+
+    A user may send `burst` updates at once and `rate` updates per second
+    after that, updates above the limit are dropped. Limits are set per
+    role, `None` disables the limit. Only `THROTTLE_BUCKETS` least recently
+    seen users are kept in memory.
+    """
+
+    def __init__(self, platform, limits, default):
+        self.platform = platform
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.limits = limits
+        self.default = default
+        self.lock = Lock()
+        self.buckets = OrderedDict()
+        self.counters = Counter()
+
+    def allow(self, user_id, role_id=None):
+        limit = self.limits.get(role_id, self.default)
+        if limit is None:
+            with self.lock:
+                self.counters[Counters.ALLOWED] += 1
+            return True
+        rate, burst = limit
+        with self.lock:
+            current = time.monotonic()
+            tokens, updated, was_dropping = self.buckets.pop(
+                user_id, (burst, current, False),
+            )
+            tokens = min(burst, tokens + (current - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[user_id] = (tokens, current, not allowed)
+            if len(self.buckets) > THROTTLE_BUCKETS:
+                self.buckets.popitem(last=False)
+                self.counters[Counters.EVICTED] += 1
+            self.counters[
+                Counters.ALLOWED if allowed else Counters.DROPPED
+            ] += 1
+        if not allowed and not was_dropping:
+            self.logger.warning(Errors.THROTTLED.format(
+                platform=PLATFORMS_VERBOSE[self.platform],
+                platform_id=user_id,
+            ))
+        return allowed
+
+    def get_counters(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def get_throttle(platform, unlimited_roles):
+    return Throttle(
+        platform,
+        {role_id: None for role_id in unlimited_roles}
+        | settings.role_rate_limits,
+        (settings.rate_limit, settings.rate_limit_burst),
+    )
@@ -0,0 +1,201 @@
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, local
+
+from django.db import connection
+
+from backend.settings import TRACE_FILENAME, settings
+from core.constants import TRACE_SERVICE_NAME, TRACE_STATEMENT_LENGTH
+
+
+class SpanKinds:
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+class StatusCodes:
+    ERROR = 2
+
+
+def get_id(length):
+    return os.urandom(length).hex()
+
+
+def get_attribute(key, value):
+    match value:
+        case bool():
+            value = dict(boolValue=value)
+        case int():
+            value = dict(intValue=str(value))
+        case float():
+            value = dict(doubleValue=value)
+        case _:
+            value = dict(stringValue=str(value))
+    return dict(key=key, value=value)
+
+
+class Trace:
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.stack = []
+
+
+class Tracer:
+    """Records spans of update handling and exports them as OTLP-JSON.
+
+    Every update starts a trace that is sampled with `TRACE_SAMPLE_RATE`
+    probability. Spans of a trace are kept in memory and written to the
+    trace file when the trace ends, if it was sampled or took longer than
+    `TRACE_SLOW_THRESHOLD` seconds. Outbound API calls made by other
+    threads continue the trace of the update that caused them.
+    """
+
+    def __init__(self):
+        self.platform = None
+        self.local = local()
+        self.lock = Lock()
+        self.file = None
+
+    @property
+    def enabled(self):
+        return self.file is not None
+
+    def start(self, platform):
+        if settings.trace_sample_rate or settings.trace_slow_threshold:
+            self.platform = platform
+            self.file = open(TRACE_FILENAME.format(platform=platform), 'a')
+
+    def get_trace(self):
+        return getattr(self.local, 'trace', None)
+
+    def get_context(self):
+        trace = self.get_trace()
+        if trace is None or not trace.stack:
+            return None
+        return trace.trace_id, trace.stack[-1]['spanId'], trace.sampled
+
+    def set_attribute(self, key, value):
+        trace = self.get_trace()
+        if trace is not None and trace.stack and value is not None:
+            trace.stack[-1]['attributes'].append(get_attribute(key, value))
+
+    @contextmanager
+    def trace(self, name, context=None, kind=SpanKinds.SERVER, **attributes):
+        if not self.enabled or self.get_trace() is not None:
+            yield
+            return
+        if context is None:
+            trace_id, parent_id = get_id(16), None
+            sampled = random.random() < settings.trace_sample_rate
+        else:
+            trace_id, parent_id, sampled = context
+        self.local.trace = trace = Trace(trace_id, sampled)
+        try:
+            with connection.execute_wrapper(self.trace_query):
+                with self.span(name, kind, parent_id, **attributes) as span:
+                    yield span
+        finally:
+            del self.local.trace
+            duration = (
+                int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])
+            ) / 10 ** 9
+            threshold = settings.trace_slow_threshold
+            if trace.sampled or (threshold and duration >= threshold):
+                self.export(trace.spans)
+
+    @contextmanager
+    def span(
+        self, name, kind=SpanKinds.INTERNAL, parent_id=None, **attributes,
+    ):
+        trace = self.get_trace()
+        if trace is None:
+            yield None
+            return
+        span = dict(
+            traceId=trace.trace_id,
+            spanId=get_id(8),
+            name=name,
+            kind=kind,
+            startTimeUnixNano=str(time.time_ns()),
+            attributes=[
+                get_attribute(key, value)
+                for key, value in attributes.items()
+                if value is not None
+            ],
+        )
+        parent_id = parent_id or (
+            trace.stack[-1]['spanId'] if trace.stack else None
+        )
+        if parent_id:
+            span['parentSpanId'] = parent_id
+        trace.spans.append(span)
+        trace.stack.append(span)
+        try:
+            yield span
+        except Exception as error:
+            span['status'] = dict(
+                code=StatusCodes.ERROR,
+                message=f'{type(error).__name__}: {error}',
+            )
+            raise
+        finally:
+            span['endTimeUnixNano'] = str(time.time_ns())
+            trace.stack.pop()
+
+    def trace_query(self, execute, sql, params, many, context):
+        with self.span(
+            'db.query',
+            SpanKinds.CLIENT,
+            **{
+                'db.system': connection.vendor,
+                'db.statement': sql[:TRACE_STATEMENT_LENGTH],
+            },
+        ):
+            return execute(sql, params, many, context)
+
+    def wrap(self, function, name, **attributes):
+        """Runs `function` later, in any thread, as part of this trace."""
+        context = self.get_context()
+        if context is None:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.trace(name, context, SpanKinds.CLIENT, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def export(self, spans):
+        record = dict(resourceSpans=[dict(
+            resource=dict(attributes=[
+                get_attribute('service.name', TRACE_SERVICE_NAME),
+                get_attribute('messaging.system', self.platform),
+            ]),
+            scopeSpans=[dict(scope=dict(name=__name__), spans=spans)],
+        )])
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+
+tracer = Tracer()
+
+
+def traced(function):
+    name = f'{function.__module__}.{function.__qualname__}'
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if tracer.get_trace() is None:
+            return function(*args, **kwargs)
+        with tracer.span(name):
+            return function(*args, **kwargs)
+    return wrapper
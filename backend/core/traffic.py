@@ -0,0 +1,92 @@
+import atexit
+import gzip
+import json
+import re
+import time
+from threading import Lock
+
+from django.utils.timezone import now
+
+from backend.settings import TRAFFIC_FILENAME
+from core.constants import TRAFFIC_FLUSH_RECORDS
+from core.models import User
+
+WORD_CHARACTER = re.compile(r'\w')
+ANONYMOUS_CHARACTER = 'x'
+
+
+class Updates:
+    USER = 'user'
+    MESSAGE = 'message'
+    BUTTON = 'button'
+
+
+def anonymize(text):
+    return WORD_CHARACTER.sub(ANONYMOUS_CHARACTER, text)
+
+
+class TrafficRecorder:
+    """Records inbound updates of a bot to a gzipped JSONL file.
+
+    User ids are replaced with their order of appearance and free text
+    with placeholders of the same shape, so recordings can leave the
+    server. Every record keeps its offset from the start of recording.
+    The recording starts with a snapshot of the users of the platform, so
+    users registered before it are known on replay.
+    """
+
+    def __init__(self, platform):
+        self.lock = Lock()
+        self.users = {}
+        self.records = 0
+        self.started = time.monotonic()
+        self.file = gzip.open(
+            TRAFFIC_FILENAME.format(platform=platform, date=now()), 'wt',
+        )
+        self.record_users(platform)
+        atexit.register(self.close)
+
+    def record_users(self, platform):
+        for platform_id, role, is_subscribed, is_blocked in (
+            User.objects.filter(platform=platform).values_list(
+                'platform_id', 'role__name', 'is_subscribed', 'is_blocked',
+            ).iterator()
+        ):
+            self.write(
+                type=Updates.USER,
+                user_id=platform_id,
+                role=role,
+                is_subscribed=is_subscribed,
+                is_blocked=is_blocked,
+            )
+
+    def get_user(self, user_id):
+        return self.users.setdefault(user_id, len(self.users) + 1)
+
+    def record_message(self, user_id, text, is_command=False):
+        self.write(
+            type=Updates.MESSAGE,
+            user_id=user_id,
+            text=text if is_command else anonymize(text),
+        )
+
+    def record_button(self, user_id, callback_data):
+        self.write(
+            type=Updates.BUTTON, user_id=user_id, callback_data=callback_data,
+        )
+
+    def write(self, user_id, **record):
+        with self.lock:
+            record = dict(
+                time=round(time.monotonic() - self.started, 3),
+                user_id=self.get_user(user_id),
+                **record,
+            )
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.records += 1
+            if self.records % TRAFFIC_FLUSH_RECORDS == 0:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -1,24 +1,65 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
 
 from django.core.exceptions import ObjectDoesNotExist
-from schedule import every, run_pending
-from vk_api import VkApi
+from requests import RequestException, Session
+from vk_api.vk_api import VkApiGroup
 from vk_api.bot_longpoll import VkBotEventType, VkBotLongPoll
 from vk_api.exceptions import ApiError
 from vk_api.keyboard import VkKeyboard
 from vk_api.upload import VkUpload
 from vk_api.utils import get_random_id
 
-from backend.settings import BASE_DIR, get_logger, settings
+from backend.settings import BASE_DIR, get_logger, log_context, settings
 from core import core
 from core.constants import (
     BUTTONS_PER_ROW, ButtonTypes, Errors, PLATFORMS_VERBOSE, Platforms,
-    Pooling,
+    Pooling, VK_UPLOAD_WORKERS,
 )
 from core.localization import ButtonLabels, ChatMessages, MAIN_MENU
+from core.routers import read_from_primary
+from core.scheduler import Scheduler
+from core.tracing import tracer
 
 logger = get_logger(Platforms.VK_FULL.lower())
 
+VK_API_URL = 'https://api.vk.com/method/'
+FLOOD_ERROR_CODES = (6, 9)
+RETRY_ERROR_CODES = (1, 10)
+
+
+class Methods:
+    SEND_MESSAGE = 'messages.send'
+    SEND_MESSAGE_EVENT_ANSWER = 'messages.sendMessageEventAnswer'
+
+
+class ApiSession(Session):
+    """Sends VK API method calls to `api_url` instead of the VK API."""
+
+    def __init__(self, api_url):
+        super().__init__()
+        self.api_url = api_url
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(VK_API_URL):
+            url = self.api_url + url[len(VK_API_URL):]
+        return super().request(method, url, *args, **kwargs)
+
+
+class LongPoll(VkBotLongPoll):
+    """Reports every long-poll response to the health of the bot."""
+
+    def __init__(self, *args, health, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health = health
+
+    def check(self):
+        events = super().check()
+        self.health.polled()
+        return events
+
 
 class MenuTypes:
     ADMIN = 0
@@ -26,6 +67,15 @@ class MenuTypes:
     ASK_ADMIN = -2
     ADMIN_ANSWER_QUESTIONS = -3
     ADMIN_BLOCK_USER = -4
+    ADMIN_BATCH = -5
+    BLOCKED = -6
+
+
+ANSWERING_MENUS = (
+    MenuTypes.ADMIN_ANSWER_QUESTIONS,
+    MenuTypes.ADMIN_BLOCK_USER,
+    MenuTypes.ADMIN_BATCH,
+)
 
 
 class Callbacks:
@@ -35,42 +85,82 @@ class Callbacks:
     SUBSCRIBE = 'sub'
     UNSUBSCRIBE = 'unsub'
     GET_QUESTION = 'questions'
+    GET_BATCH = 'batch'
     BLOCK_USER = 'block'
     CONFIRM_BLOCK = 'confirm_block'
 
 
 class VKBot(core.GenericBot):
+    STATIC_MENU_LINKS = {
+        core.ADMIN_ROLE_ID: MenuTypes.ADMIN,
+        core.BLOCKED_USER_ROLE_ID: MenuTypes.BLOCKED,
+    }
+
     def __init__(self, platform):
         super().__init__(platform)
         self.menus = {}
         self.ask_admin_answers = {}
         self.subscription_submenus = {}
         self.current_questions = {}
-        self.vk = VkApi(token=settings.vk_token)
+        self.uploads = {}
+        self.uploads_lock = Lock()
+        self.deferred_uploads = []
+        self.upload_pool = ThreadPoolExecutor(VK_UPLOAD_WORKERS)
+        self.vk = VkApiGroup(
+            token=settings.vk_token,
+            session=(
+                ApiSession(settings.vk_api_url) if settings.vk_api_url
+                else None
+            ),
+        )
+        self.start_outbox()
         self.create_static_menus()
-        self.callbacks = self.create_dynamic_menus()
-        self.main_menu_links[core.ADMIN_ROLE_ID] = MenuTypes.ADMIN
-        self.main_menu_links[
-            core.BLOCKED_USER_ROLE_ID
-        ] = VkKeyboard.get_empty_keyboard()
+        self.set_data(self.create_dynamic_menus(self.roles))
         self.schedule_updates()
+        self.start_reminders()
+        self.start_event_listener()
+        self.start_health()
         self.vk_bot()
 
-    def send_message(self, user_id, message, keyboard=None, attachment=None):
-        self.vk.method(
-            'messages.send',
-            {
-                'user_id': user_id,
-                'random_id': get_random_id(),
-                'message': message,
-                'keyboard': keyboard,
-                'attachment': attachment,
-            },
+    def send_now(self, method, params):
+        self.vk.method(method, params)
+
+    @staticmethod
+    def get_retry_delay(error):
+        if isinstance(error, ApiError):
+            if error.code in FLOOD_ERROR_CODES:
+                return None, True
+            if error.code in RETRY_ERROR_CODES:
+                return None, False
+            return None
+        if isinstance(error, RequestException):
+            return None, False
+        return None
+
+    @staticmethod
+    def get_message_params(user_id, message, keyboard=None, attachment=None):
+        return {
+            'user_id': user_id,
+            'random_id': get_random_id(),
+            'message': message,
+            'keyboard': keyboard,
+            'attachment': attachment,
+        }
+
+    def send_message(
+        self, user_id, message, keyboard=None, attachment=None, **options,
+    ):
+        self.outbox.send(
+            user_id,
+            Methods.SEND_MESSAGE,
+            self.get_message_params(user_id, message, keyboard, attachment),
+            **options,
         )
 
     def send_message_event_answer(self, event):
-        self.vk.method(
-            'messages.sendMessageEventAnswer',
+        self.outbox.send(
+            event.object.user_id,
+            Methods.SEND_MESSAGE_EVENT_ANSWER,
             {
                 'user_id': event.object.user_id,
                 'event_id': event.object.event_id,
@@ -92,7 +182,7 @@ class VKBot(core.GenericBot):
             },
         )
 
-    def create_subscription_submenus(self, button, menu_id):
+    def create_subscription_submenus(self, button, menu_id, submenus):
         names = (button.on_name, button.off_name)
         callbacks = (Callbacks.SUBSCRIBE, Callbacks.UNSUBSCRIBE)
         for (name, callback) in zip(names, callbacks):
@@ -107,7 +197,7 @@ class VKBot(core.GenericBot):
             )
             keyboard.add_line()
             self.create_standard_button(keyboard)
-            self.subscription_submenus[menu_id] = keyboard.get_keyboard()
+            submenus[menu_id] = keyboard.get_keyboard()
             menu_id = -menu_id
 
     def create_static_menus(self):
@@ -120,6 +210,11 @@ class VKBot(core.GenericBot):
             ButtonLabels.ANSWER,
             Callbacks.GET_QUESTION,
         )
+        self.create_standard_button(
+            keyboard,
+            ButtonLabels.ANSWER_BATCH,
+            Callbacks.GET_BATCH,
+        )
         self.menus[MenuTypes.ADMIN] = keyboard.get_keyboard()
         keyboard = VkKeyboard()
         self.create_standard_button(
@@ -137,9 +232,22 @@ class VKBot(core.GenericBot):
         )
         self.create_standard_button(keyboard)
         self.menus[MenuTypes.ADMIN_BLOCK_USER] = keyboard.get_keyboard()
+        keyboard = VkKeyboard()
+        self.create_standard_button(
+            keyboard,
+            ButtonLabels.NEXT_BATCH,
+            Callbacks.GET_BATCH,
+        )
+        self.create_standard_button(keyboard)
+        self.menus[MenuTypes.ADMIN_BATCH] = keyboard.get_keyboard()
+        self.menus[MenuTypes.BLOCKED] = VkKeyboard.get_empty_keyboard()
 
-    def create_dynamic_menus(self):
+    def create_dynamic_menus(self, roles):
+        menus = self.menus.copy()
+        subscription_submenus = {}
+        ask_admin_answers = {}
         callbacks = {}
+        files = []
         for menu_id, menu in core.get_menus().items():
             keyboard = VkKeyboard()
             buttons_in_line = 0
@@ -157,17 +265,21 @@ class VKBot(core.GenericBot):
                 )
                 buttons_in_line += 1
                 match button.type:
+                    case ButtonTypes.INFO if button.file:
+                        files.append(button)
                     case ButtonTypes.SUBSCRIBE:
-                        self.create_subscription_submenus(button, menu_id)
+                        self.create_subscription_submenus(
+                            button, menu_id, subscription_submenus,
+                        )
                     case ButtonTypes.ASK_ADMIN:
-                        self.ask_admin_answers[menu_id] = button.id
+                        ask_admin_answers[menu_id] = button.id
             if not menu.main_menu:
                 if buttons_in_line >= BUTTONS_PER_ROW:
                     keyboard.add_line()
                 self.create_standard_button(keyboard, MAIN_MENU)
-            self.menus[menu_id] = keyboard.get_keyboard()
+            menus[menu_id] = keyboard.get_keyboard()
         keyboard = VkKeyboard(one_time=True)
-        for role_id, role in self.roles.items():
+        for role_id, role in roles.items():
             keyboard.add_callback_button(
                 role,
                 payload={
@@ -176,22 +288,72 @@ class VKBot(core.GenericBot):
                     )
                 },
             )
-        self.menus[MenuTypes.REGISTRATION] = keyboard.get_keyboard()
-        return callbacks
+        menus[MenuTypes.REGISTRATION] = keyboard.get_keyboard()
+        self.preupload_files(files)
+        return {
+            'menus': menus,
+            'subscription_submenus': subscription_submenus,
+            'ask_admin_answers': ask_admin_answers,
+            'callbacks': callbacks,
+        }
+
+    def get_upload_peer(self):
+        """Returns an admin to upload files for, or any user without one."""
+        peers = sorted(
+            (role_id != core.ADMIN_ROLE_ID, user_id)
+            for user_id, role_id in self.users.items()
+            if role_id != core.BLOCKED_USER_ROLE_ID
+        )
+        return peers[0][1] if peers else None
+
+    def preupload_files(self, buttons, peer_id=None):
+        """Uploads files in the background before anyone asks for them.
+
+        Without any known user to upload for, the files are uploaded for
+        the first user to write to the bot.
+        """
+        peer_id = peer_id or self.get_upload_peer()
+        if peer_id is None:
+            self.deferred_uploads = buttons
+            return
+        for button in buttons:
+            self.get_attachment(button, peer_id)
+
+    def get_attachment(self, button, peer_id):
+        key = button.checksum or button.file.name
+        with self.uploads_lock:
+            if key not in self.uploads:
+                self.uploads[key] = self.upload_pool.submit(
+                    tracer.wrap(self.upload_file, 'vk.upload', file=key),
+                    button,
+                    peer_id,
+                )
+            return self.uploads[key]
 
+    def upload_file(self, button, peer_id):
+        upload = VkUpload(self.vk).document_message(
+            os.path.join(BASE_DIR, button.file.name),
+            button.file_name or os.path.basename(button.file.name),
+            peer_id=peer_id,
+        )
+        return f'doc{upload["doc"]["owner_id"]}_{upload["doc"]["id"]}'
+
+    @read_from_primary
     def check_menu_updates(self):
         update_ids = core.check_menu_updates(self.platform)
         if update_ids:
-            self.get_data()
-            self.callbacks = self.create_dynamic_menus()
+            data = self.load_data()
+            self.set_data(data | self.create_dynamic_menus(data['roles']))
             core.complete_menu_updates(self.platform, update_ids)
 
     def update_user_roles(self):
-        self.users = core.get_users(self.platform)
+        self.refresh_users()
 
     def schedule_updates(self):
-        every(Pooling.MENU_UPDATE).seconds.do(self.check_menu_updates)
-        every(Pooling.USER_ROLES).seconds.do(self.update_user_roles)
+        scheduler = Scheduler(self.platform, self.health)
+        scheduler.add(self.check_menu_updates, Pooling.MENU_UPDATE)
+        scheduler.add(self.update_user_roles, Pooling.USER_ROLES)
+        scheduler.start()
 
     def get_menu(
         self,
@@ -204,13 +366,13 @@ class VKBot(core.GenericBot):
             menu = self.subscription_submenus[menu_id]
         else:
             menu = self.menus[menu_id]
-        try:
-            self.send_message(user_id, message, menu)
-        except ApiError:
-            logger.error(
-                Errors.MENU_NO_BUTTONS.format(role=self.users[user_id])
-            )
-            self.send_message(user_id, ChatMessages.NO_BUTTONS)
+        self.send_message(
+            user_id,
+            message,
+            menu,
+            fallback=self.get_message_params(user_id, ChatMessages.NO_BUTTONS),
+            error=Errors.MENU_NO_BUTTONS.format(role=self.users.get(user_id)),
+        )
         self.current_menus[user_id] = menu_id
 
     def get_current_menu(self, user_id):
@@ -227,32 +389,31 @@ class VKBot(core.GenericBot):
                 )
 
     def answer_info_button(self, user_id, peer_id, button):
-        file = button.file.name
-        if file:
-            try:
-                upload = VkUpload(self.vk).document_message(
-                    os.path.join(BASE_DIR, file),
-                    file.split('.')[0].split('/')[1:],
-                    peer_id=peer_id,
-                )
-                self.send_message(
-                    user_id,
-                    button.answer,
-                    attachment=(
-                        f'doc{upload["doc"]["owner_id"]}_'
-                        f'{upload["doc"]["id"]}'
-                    ),
-                )
-            except (ApiError, ObjectDoesNotExist) as error:
-                logger.error(
-                    Errors.CANNOT_UPLOAD_FILE.format(file=file, error=error)
-                )
-                self.send_message(user_id, button.answer)
-        else:
+        if not button.file:
             self.send_message(user_id, button.answer)
+            return
+        self.get_attachment(button, peer_id).add_done_callback(
+            partial(self.send_file, user_id, button),
+        )
+
+    def send_file(self, user_id, button, upload):
+        try:
+            attachment = upload.result()
+        except (
+            ApiError, ObjectDoesNotExist, OSError, RequestException,
+        ) as error:
+            logger.error(Errors.CANNOT_UPLOAD_FILE.format(
+                file=button.file.name, error=error,
+            ))
+            with self.uploads_lock:
+                key = button.checksum or button.file.name
+                if self.uploads.get(key) is upload:
+                    del self.uploads[key]
+            attachment = None
+        self.send_message(user_id, button.answer, attachment=attachment)
 
-    def answer_remainder_button(self, user_id):
-        self.send_message(user_id, ChatMessages.NOT_IMPLEMENTED)
+    def answer_reminder_button(self, user_id, button):
+        self.send_message(user_id, self.toggle_reminder(user_id, button))
 
     def answer_subscribe_button(self, user_id, button_id):
         button = self.callbacks[
@@ -260,7 +421,7 @@ class VKBot(core.GenericBot):
         ]
         role_id = self.users[user_id]
         try:
-            core.subscribe(self.platform, user_id)
+            self.subscribe(user_id)
         except ValueError as error:
             logger.error(Errors.SUBSCRIBE.format(error=error))
         self.subscribers[role_id].add(user_id)
@@ -272,7 +433,7 @@ class VKBot(core.GenericBot):
         ]
         role_id = self.users[user_id]
         try:
-            core.unsubscribe(self.platform, user_id)
+            self.unsubscribe(user_id)
         except ValueError as error:
             logger.error(Errors.UNSUBSCRIBE.format(error=error))
         self.subscribers[role_id].remove(user_id)
@@ -283,12 +444,12 @@ class VKBot(core.GenericBot):
     def answer_role_menu(self, user_id, role_id):
         if user_id in self.users:
             old_role = self.users[user_id]
-            core.change_role(self.platform, user_id, role_id)
+            self.change_role(user_id, role_id)
             if user_id in self.subscribers[old_role]:
                 self.subscribers[old_role].remove(user_id)
                 self.subscribers[role_id].add(user_id)
         else:
-            core.add_user(self.platform, user_id, role_id)
+            self.add_user(user_id, role_id)
         self.users[user_id] = role_id
         self.get_menu(
             user_id,
@@ -314,6 +475,23 @@ class VKBot(core.GenericBot):
             ),
         )
 
+    def answer_get_batch(self, admin_id):
+        questions = self.question_batches.next(admin_id)
+        if not questions:
+            self.question_batches.discard(admin_id)
+            self.get_menu(admin_id, MenuTypes.ADMIN, ChatMessages.NO_QUESTIONS)
+            return
+        message, *question_messages = self.format_question_batch(questions)
+        if self.current_menus.get(admin_id) == MenuTypes.ADMIN_BATCH:
+            self.send_message(admin_id, message)
+        else:
+            self.get_menu(admin_id, MenuTypes.ADMIN_BATCH, message)
+        for message in question_messages:
+            self.send_message(admin_id, message)
+
+    def is_answering(self, admin_id):
+        return self.current_menus.get(admin_id) in ANSWERING_MENUS
+
     def admin_block(self, admin_id):
         question = self.current_questions[admin_id]
         self.get_menu(
@@ -341,22 +519,33 @@ class VKBot(core.GenericBot):
         )
 
     def answer_ask_admin(self, user_id, message, menu_id):
-        core.add_question(self.platform, user_id, message)
-        self.get_menu(
-            user_id,
-            menu_id,
-            self.callbacks[
+        self.flush_writes()
+        answer = core.add_question(self.platform, user_id, message)
+        if answer is None:
+            message = self.callbacks[
                 f'{ButtonTypes.ASK_ADMIN}{Callbacks.DELIMITER}'
                 f'{self.ask_admin_answers[menu_id]}'
-            ].received_answer,
-        )
+            ].received_answer
+        else:
+            message = ChatMessages.AUTO_ANSWER.format(answer=answer)
+        self.get_menu(user_id, menu_id, message)
 
     def admin_answer_questions(self, admin_id, message):
         core.answer_question(self.current_questions[admin_id]['id'], message)
         self.send_message(admin_id, ChatMessages.ANSWER_ACCEPTED)
         self.answer_get_question(admin_id)
 
-    def answer_message(self, user_id, message):
+    def admin_answer_batch(self, admin_id, message, quoted=None):
+        self.send_message(
+            admin_id,
+            self.question_batches.answer(admin_id, message, quoted),
+        )
+        if self.question_batches.is_done(admin_id):
+            self.answer_get_batch(admin_id)
+
+    def answer_message(self, user_id, message, quoted=None):
+        if not self.throttle.allow(user_id, self.users.get(user_id)):
+            return
         if (
             user_id in self.users and
             message != ChatMessages.CHANGE_ROLE_COMMAND
@@ -370,6 +559,8 @@ class VKBot(core.GenericBot):
                     self.answer_ask_admin(user_id, message, menu_id)
                 case MenuTypes.ADMIN_ANSWER_QUESTIONS:
                     self.admin_answer_questions(user_id, message)
+                case MenuTypes.ADMIN_BATCH:
+                    self.admin_answer_batch(user_id, message, quoted)
                 case _:
                     self.get_menu(user_id, menu_id)
         else:
@@ -381,10 +572,20 @@ class VKBot(core.GenericBot):
 
     def answer_button(self, event, user_id, callback_data):
         role_id = self.users.get(user_id)
+        if not self.throttle.allow(user_id, role_id):
+            return
         if role_id == core.BLOCKED_USER_ROLE_ID:
-            self.get_menu(user_id, self.main_menu_links(role_id))
+            self.get_menu(user_id, self.main_menu_links[role_id])
             return
         button_type, button_id = callback_data.split(Callbacks.DELIMITER)
+        if role_id is None and button_type != Callbacks.REGISTER:
+            self.get_menu(
+                user_id,
+                MenuTypes.REGISTRATION,
+                ChatMessages.REGISTRATION,
+            )
+            return
+        tracer.set_attribute('button.type', button_type)
         match button_type:
             case ButtonTypes.INFO:
                 self.answer_info_button(
@@ -393,7 +594,9 @@ class VKBot(core.GenericBot):
                     self.callbacks[callback_data],
                 )
             case ButtonTypes.REMINDER:
-                self.answer_remainder_button(user_id)
+                self.answer_reminder_button(
+                    user_id, self.callbacks[callback_data],
+                )
             case ButtonTypes.SUBSCRIBE:
                 self.get_current_menu(user_id)
                 if user_id in self.subscribers[role_id]:
@@ -419,33 +622,102 @@ class VKBot(core.GenericBot):
                 self.answer_role_menu(user_id, int(button_id))
             case Callbacks.GET_QUESTION:
                 self.answer_get_question(user_id)
+            case Callbacks.GET_BATCH:
+                self.answer_get_batch(user_id)
             case Callbacks.BLOCK_USER:
                 self.admin_block(user_id)
             case Callbacks.CONFIRM_BLOCK:
                 self.answer_confirm_block(user_id)
             case Callbacks.MAIN_MENU:
+                self.question_batches.discard(user_id)
                 self.get_menu(user_id, self.main_menu_links[role_id])
             case _:
                 self.send_message(user_id, ChatMessages.CHOOSE_BUTTON)
         self.send_message_event_answer(event)
 
+    def handle_event(self, event):
+        with self.state_lock:
+            if self.deferred_uploads:
+                self.preupload_deferred(event)
+            self.handle_locked_event(event)
+
+    def preupload_deferred(self, event):
+        match event.type:
+            case VkBotEventType.MESSAGE_NEW:
+                peer_id = event.message.from_id
+            case VkBotEventType.MESSAGE_EVENT:
+                peer_id = event.object.user_id
+            case _:
+                return
+        buttons, self.deferred_uploads = self.deferred_uploads, []
+        self.preupload_files(buttons, peer_id)
+
+    def handle_locked_event(self, event):
+        if event.type == VkBotEventType.MESSAGE_NEW:
+            with log_context(
+                event_id=event.raw.get('event_id'),
+                user_id=event.message.from_id,
+            ), tracer.trace(
+                'vk.answer_message',
+                user_id=event.message.from_id,
+                menu=self.current_menus.get(event.message.from_id),
+            ):
+                self.answer_message(
+                    event.message.from_id,
+                    event.message.text,
+                    self.get_quoted_text(event.message),
+                )
+            self.health.handled(event.message.date)
+        if event.type == VkBotEventType.MESSAGE_EVENT:
+            with log_context(
+                event_id=event.raw.get('event_id'),
+                user_id=event.object.user_id,
+            ), tracer.trace(
+                'vk.answer_button',
+                user_id=event.object.user_id,
+                menu=self.current_menus.get(event.object.user_id),
+            ):
+                self.answer_button(
+                    event,
+                    event.object.user_id,
+                    event.object.payload['callback_data'],
+                )
+            self.health.handled()
+
+    @staticmethod
+    def get_quoted_text(message):
+        quoted = message.reply_message or next(
+            iter(message.fwd_messages or ()), None,
+        )
+        return quoted['text'] if quoted else None
+
+    def record_event(self, event):
+        if event.type == VkBotEventType.MESSAGE_NEW:
+            self.recorder.record_message(
+                event.message.from_id,
+                event.message.text,
+                event.message.text == ChatMessages.CHANGE_ROLE_COMMAND,
+            )
+        if event.type == VkBotEventType.MESSAGE_EVENT:
+            self.recorder.record_button(
+                event.object.user_id, event.object.payload['callback_data'],
+            )
+
     def vk_bot(self):
         try:
-            for event in VkBotLongPoll(
-                self.vk, group_id=settings.vk_group_id,
+            for event in LongPoll(
+                self.vk, group_id=settings.vk_group_id, health=self.health,
             ).listen():
-                run_pending()
-                if event.type == VkBotEventType.MESSAGE_NEW:
-                    self.answer_message(
-                        event.message.from_id,
-                        event.message.text,
-                    )
-                if event.type == VkBotEventType.MESSAGE_EVENT:
-                    self.answer_button(
-                        event,
-                        event.object.user_id,
-                        event.object.payload['callback_data'],
-                    )
+                try:
+                    if self.recorder:
+                        self.record_event(event)
+                    self.handle_event(event)
+                except Exception as error:
+                    logger.error(Errors.VK_EVENT.format(
+                        event=event.raw.get('event_id'),
+                        error_type=type(error).__name__,
+                        error=error,
+                    ))
         except Exception as error:
             logger.error(Errors.RUNTIME.format(
                     error_type=type(error).__name__,
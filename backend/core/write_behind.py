@@ -0,0 +1,260 @@
+import atexit
+import json
+import os
+import time
+from datetime import datetime
+from threading import Lock, Thread
+
+from django.db import DataError, DatabaseError, IntegrityError, transaction
+from django.utils.timezone import now
+
+from backend.settings import JOURNAL_FILENAME, get_logger
+from core.constants import Errors, PLATFORMS_VERBOSE, Pooling
+from core.models import Subscription, User
+
+DEAD_LETTER_SUFFIX = '_dead.jsonl'
+
+
+class Operations:
+    ADD_USER = 'add_user'
+    CHANGE_ROLE = 'change_role'
+    SUBSCRIBE = 'subscribe'
+    UNSUBSCRIBE = 'unsubscribe'
+
+
+def get_records(platform_id, changes):
+    """Returns journal records that apply to the pending `changes`."""
+    records = []
+    if changes.get('created'):
+        records.append(dict(
+            operation=Operations.ADD_USER,
+            platform_id=platform_id,
+            role_id=changes['role_id'],
+        ))
+    elif 'role_id' in changes:
+        records.append(dict(
+            operation=Operations.CHANGE_ROLE,
+            platform_id=platform_id,
+            role_id=changes['role_id'],
+        ))
+    for is_subscribed, date in changes.get('events', ()):
+        records.append(dict(
+            operation=(
+                Operations.SUBSCRIBE if is_subscribed
+                else Operations.UNSUBSCRIBE
+            ),
+            platform_id=platform_id,
+            date=date.isoformat(),
+        ))
+    return records
+
+
+class WriteBehind:
+    """Coalesces user writes of a bot and flushes them in bulk.
+
+    Every operation is appended and synced to a local journal before it is
+    applied to the in-memory pending state, so writes that were not flushed
+    yet are replayed on the next start. Flushes run one at a time, so a
+    flush returns only once the writes pending before it are saved. Writes
+    of a user the database rejects are moved to a dead-letter file instead
+    of blocking the others.
+    """
+
+    def __init__(self, platform, filename=None):
+        self.platform = platform
+        self.logger = get_logger(PLATFORMS_VERBOSE[platform].lower())
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.pending = {}
+        self.filename = filename or JOURNAL_FILENAME.format(platform=platform)
+        self.dead_letters = (
+            os.path.splitext(self.filename)[0] + DEAD_LETTER_SUFFIX
+        )
+        self.journal = open(self.filename, 'a+b')
+        self.replay()
+        atexit.register(self.flush)
+        Thread(target=self.run, daemon=True).start()
+
+    def add_user(self, platform_id, role_id):
+        self.write(Operations.ADD_USER, platform_id, role_id=role_id)
+
+    def change_role(self, platform_id, role_id):
+        self.write(Operations.CHANGE_ROLE, platform_id, role_id=role_id)
+
+    def subscribe(self, platform_id):
+        self.write(
+            Operations.SUBSCRIBE, platform_id, date=now().isoformat(),
+        )
+
+    def unsubscribe(self, platform_id):
+        self.write(
+            Operations.UNSUBSCRIBE, platform_id, date=now().isoformat(),
+        )
+
+    def write(self, operation, platform_id, **data):
+        record = dict(operation=operation, platform_id=platform_id, **data)
+        with self.lock:
+            self.journal.write(json.dumps(record).encode() + b'\n')
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.apply(**record)
+
+    def replay(self):
+        self.journal.seek(0)
+        for line in self.journal:
+            if line.strip():
+                self.apply(**json.loads(line))
+
+    def apply(self, operation, platform_id, role_id=None, date=None):
+        changes = self.pending.setdefault(platform_id, {})
+        match operation:
+            case Operations.ADD_USER:
+                changes['created'] = True
+                changes['role_id'] = role_id
+            case Operations.CHANGE_ROLE:
+                changes['role_id'] = role_id
+            case Operations.SUBSCRIBE | Operations.UNSUBSCRIBE:
+                is_subscribed = operation == Operations.SUBSCRIBE
+                date = datetime.fromisoformat(date) if date else now()
+                changes.setdefault('events', []).append((is_subscribed, date))
+                if changes.get('is_subscribed') is (not is_subscribed):
+                    del changes['is_subscribed']
+                    del changes['date']
+                else:
+                    changes['is_subscribed'] = is_subscribed
+                    changes['date'] = date
+        if not changes:
+            del self.pending[platform_id]
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                pending, self.pending = self.pending, {}
+                offset = self.journal.tell()
+            try:
+                self.save(pending)
+            except DatabaseError as error:
+                self.logger.error(
+                    Errors.WRITE_BEHIND.format(count=len(pending), error=error)
+                )
+                failed = self.save_each(pending)
+            else:
+                failed = {}
+            with self.lock:
+                self.compact(offset, [
+                    record
+                    for platform_id, changes in failed.items()
+                    for record in get_records(platform_id, changes)
+                ])
+                if failed:
+                    self.pending = {}
+                    self.replay()
+
+    def save_each(self, pending):
+        """Saves users one by one and returns the writes left pending.
+
+        Writes rejected by the database are moved to the dead-letter file,
+        on any other error all unsaved writes stay pending.
+        """
+        items = list(pending.items())
+        for index, (platform_id, changes) in enumerate(items):
+            try:
+                self.save({platform_id: changes})
+            except (DataError, IntegrityError) as error:
+                self.logger.error(Errors.WRITE_BEHIND_DROPPED.format(
+                    platform_id=platform_id, error=error,
+                ))
+                with open(self.dead_letters, 'a') as file:
+                    file.write(json.dumps(
+                        dict(platform_id=platform_id, **changes), default=str,
+                    ) + '\n')
+            except DatabaseError:
+                return dict(items[index:])
+        return {}
+
+    def compact(self, offset, records=()):
+        """Replaces the journal with the records written after `offset`.
+
+        `records` of writes that are still pending are kept before them,
+        so the journal replays to the pending state.
+        """
+        self.journal.seek(offset)
+        tail = self.journal.read()
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'wb') as file:
+            for record in records:
+                file.write(json.dumps(record).encode() + b'\n')
+            file.write(tail)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.filename)
+        self.journal.close()
+        self.journal = open(self.filename, 'a+b')
+
+    def save(self, pending):
+        users = User.objects.filter(platform=self.platform)
+        roles = {}
+        subscriptions = {}
+        events = {}
+        for platform_id, changes in pending.items():
+            if 'role_id' in changes:
+                roles.setdefault(changes['role_id'], []).append(platform_id)
+            if 'is_subscribed' in changes:
+                subscriptions[platform_id] = changes
+            if 'events' in changes:
+                events[platform_id] = changes['events']
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [
+                    User(
+                        platform=self.platform,
+                        platform_id=platform_id,
+                        role_id=changes['role_id'],
+                    )
+                    for platform_id, changes in pending.items()
+                    if changes.get('created')
+                ],
+                ignore_conflicts=True,
+            )
+            for role_id, platform_ids in roles.items():
+                users.filter(platform_id__in=platform_ids).update(
+                    role_id=role_id, updated=now(),
+                )
+            if subscriptions:
+                objects = list(users.filter(platform_id__in=subscriptions))
+                updated = now()
+                for user in objects:
+                    user.updated = updated
+                    changes = subscriptions[user.platform_id]
+                    user.is_subscribed = changes['is_subscribed']
+                    if user.is_subscribed:
+                        user.date_subscribed = changes['date']
+                    else:
+                        user.date_subscribed = None
+                        user.date_unsubscribed = changes['date']
+                User.objects.bulk_update(
+                    objects,
+                    (
+                        'is_subscribed', 'date_subscribed',
+                        'date_unsubscribed', 'updated',
+                    ),
+                )
+            if events:
+                Subscription.objects.bulk_create(
+                    Subscription(
+                        user_id=user_id,
+                        is_subscribed=is_subscribed,
+                        date=date,
+                    )
+                    for platform_id, user_id in users.filter(
+                        platform_id__in=events,
+                    ).values_list('platform_id', 'id')
+                    for is_subscribed, date in events[platform_id]
+                )
+
+    def run(self):
+        while True:
+            time.sleep(Pooling.WRITE_BEHIND)
+            self.flush()
@@ -0,0 +1,111 @@
+from concurrent.futures import Future
+from functools import wraps
+from queue import Empty, SimpleQueue
+from threading import Thread, current_thread
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+from backend.settings import settings
+from core.constants import WRITER_BATCH
+from core.tracing import tracer
+
+
+class Writer:
+    """Runs the database writes of a process on a single thread.
+
+    Only used with the WAL mode of SQLite, where the database has a single
+    writer anyway: threads of the process queue their writes instead of
+    competing for the lock. Queued writes are committed in batches of up
+    to `WRITER_BATCH`, each in its own savepoint, so a failing write does
+    not undo the others. SQLite checks foreign keys only at the commit, so
+    a batch failing there is committed again write by write. A caller gets
+    the result or the exception of its write once it is committed.
+    """
+
+    def __init__(self):
+        self.queue = SimpleQueue()
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return self.thread is not None and current_thread() is not self.thread
+
+    def start(self):
+        if (
+            self.thread is None
+            and connection.vendor == 'sqlite'
+            and settings.sqlite_wal
+        ):
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def submit(self, function, *args, **kwargs):
+        future = Future()
+        self.queue.put((
+            future,
+            tracer.wrap(function, 'writer.' + function.__name__),
+            args,
+            kwargs,
+        ))
+        return future.result()
+
+    def take(self):
+        batch = [self.queue.get()]
+        while len(batch) < WRITER_BATCH:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    @staticmethod
+    def commit(batch):
+        outcomes = []
+        with transaction.atomic():
+            for future, function, args, kwargs in batch:
+                try:
+                    with transaction.atomic():
+                        outcomes.append(
+                            (future.set_result, function(*args, **kwargs))
+                        )
+                except Exception as error:
+                    outcomes.append((future.set_exception, error))
+        for set_outcome, value in outcomes:
+            set_outcome(value)
+
+    def commit_each(self, batch):
+        for write in batch:
+            try:
+                self.commit([write])
+            except IntegrityError as error:
+                write[0].set_exception(error)
+
+    def run(self):
+        while True:
+            batch = self.take()
+            try:
+                try:
+                    self.commit(batch)
+                except IntegrityError:
+                    if len(batch) == 1:
+                        raise
+                    self.commit_each(batch)
+            except DatabaseError as error:
+                connection.close()
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+
+writer = Writer()
+
+
+def serialized(function):
+    """Queues calls of `function` to the writer of the process."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if writer.enabled:
+            return writer.submit(function, *args, **kwargs)
+        return function(*args, **kwargs)
+    return wrapper